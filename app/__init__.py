@@ -1,14 +1,13 @@
 # --- __init__.py (Final Stable Version with Jinja Filters) ---
 
 import os
-import time
-import threading
 from datetime import datetime
-from flask import Flask, g, render_template
+from flask import Flask, g, render_template, request
 from flask_login import LoginManager, current_user
 from flask_bcrypt import Bcrypt
 from flask_caching import Cache
 from flask_assets import Environment, Bundle
+from werkzeug.middleware.proxy_fix import ProxyFix
 from supabase import create_client, Client
 from dotenv import load_dotenv
 from .models import User
@@ -25,63 +24,23 @@ supabase: Client = None
 def get_high_privilege_key():
     return os.environ.get("SUPABASE_SERVICE_ROLE_KEY") or os.environ.get("SUPABASE_KEY")
 
-def update_public_stats(app):
-    """Recalculates and updates the public_stats table periodically."""
-    with app.app_context():
-        print("Scheduler: Waiting 10s for server startup...")
-        time.sleep(10)
-        
-        run_update(app)
-        
-        while True:
-            time.sleep(3600) 
-            run_update(app)
-
-def run_update(app):
-    """Creates a fresh connection and performs update with retries."""
-    
-    url = os.environ.get("SUPABASE_URL")
-    key = get_high_privilege_key() 
-    
-    if not url or not key:
-        print("KPI Scheduler: Missing Supabase credentials.")
-        return
-
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            local_supabase = create_client(url, key)
-            
-            patients_res = local_supabase.table('patients').select('id', count='exact').execute()
-            appointments_res = local_supabase.table('master_appointments').select('appointment_id', count='exact').eq('status', 'confirmed').execute()
-            states_res = local_supabase.table('states').select('id', count='exact').execute()
-            
-            stats_to_update = [
-                ('patients_registered', patients_res.count or 0),
-                ('appointments_confirmed', appointments_res.count or 0),
-                ('states_covered', states_res.count or 0)
-            ]
-            
-            for k, v in stats_to_update:
-                local_supabase.table('public_stats').update({'stat_value': v}).eq('stat_key', k).execute()
-            
-            print(f"KPIs updated: Patients={stats_to_update[0][1]}, Confirmed={stats_to_update[1][1]}, States={stats_to_update[2][1]}")
-            return 
-
-        except Exception as e:
-            print(f"KPI Scheduler Warning (Attempt {attempt+1}/{max_retries}): {e}")
-            time.sleep(5)
-    
-    print("!!! ERROR in KPI Scheduler: Failed to update stats after multiple attempts. !!!")
-
 
 def create_app():
     load_dotenv() 
     app = Flask(__name__)
     app.config['SECRET_KEY'] = os.environ.get('FLASK_SECRET_KEY')
 
+    # Behind a reverse proxy, set TRUSTED_PROXY_HOPS to the number of proxies that
+    # append to X-Forwarded-For; request.remote_addr then is the real client (rate limits)
+    proxy_hops = int(os.environ.get('TRUSTED_PROXY_HOPS', 0))
+    if proxy_hops:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxy_hops, x_proto=proxy_hops)
+
     # --- Configuration ---
-    app.config['CACHE_TYPE'] = 'SimpleCache'
+    # Shared across gunicorn workers (SQLite file under instance/), LRU-bounded
+    app.config['CACHE_TYPE'] = os.environ.get('CACHE_TYPE', 'app.cache_backend.SQLiteCache')
+    app.config['CACHE_DIR'] = os.environ.get('CACHE_DIR', os.path.join(app.instance_path, 'cache'))
+    app.config['CACHE_THRESHOLD'] = int(os.environ.get('CACHE_THRESHOLD', 5000))
     cache.init_app(app)
     assets.init_app(app)
     
@@ -118,11 +77,50 @@ def create_app():
         print("Gemini configured successfully.")
     except Exception as e:
         print(f"!!! ERROR CONFIGURING SERVICES: {e} !!!")
-        
-    # START KPI SCHEDULER THREAD
-    scheduler_thread = threading.Thread(target=update_public_stats, args=(app,))
-    scheduler_thread.daemon = True
-    scheduler_thread.start()
+
+    # APP SETTINGS: versioned snapshot of app_settings, reloaded in every worker after a save
+    from .settings import app_settings, CHECK_INTERVAL as SETTINGS_CHECK_INTERVAL
+    app_settings.init_app(app)
+
+    @app_settings.on_change
+    def apply_settings(old, new):
+        for key, value in new.values.items():
+            if value and old.get(key) != value:
+                app.config[key] = value
+        if new.get('GEMINI_API_KEY') and new.get('GEMINI_API_KEY') != old.get('GEMINI_API_KEY'):
+            genai.configure(api_key=new.get('GEMINI_API_KEY'))
+            print("Gemini reconfigured from app settings.")
+
+    # Reloads (and the listeners above) happen inside current(): one stat() of
+    # settings.version per request; the DB version check runs as a scheduler job
+    @app.before_request
+    def refresh_settings():
+        if request.endpoint != 'static':
+            app_settings.current()
+
+    # Count and time every Supabase query (Server-Timing header, slow-query log)
+    # and collect Prometheus metrics across workers (served at /metrics)
+    from . import instrumentation, metrics, profiling
+    instrumentation.init_app(app)
+    metrics.init_app(app)
+    # Opt-in cProfile capture (signed X-Profile header or sampling); no hooks when off
+    profiling.init_app(app)
+
+    # START JOB SCHEDULER (one leader per host runs the jobs)
+    from .scheduler import register_job, start_scheduler
+    from .kpis import reconcile_stats, RECONCILE_INTERVAL
+    from .reminders import reminder_dispatcher
+    from .assignment import assignment_index, ASSIGN_INTERVAL
+    from . import replica
+    register_job('kpi_reconcile', reconcile_stats, interval=RECONCILE_INTERVAL, initial_delay=10)
+    register_job('reminder_sync', reminder_dispatcher.sync, interval=60, initial_delay=10)
+    register_job('case_assignment', assignment_index.assign_pending, interval=ASSIGN_INTERVAL, initial_delay=15)
+    register_job('settings_version', app_settings.check_version, interval=SETTINGS_CHECK_INTERVAL, initial_delay=SETTINGS_CHECK_INTERVAL)
+    # Optional local read replica for the analytics views (READ_REPLICA=1)
+    if replica.ENABLED:
+        replica.read_replica.init_app(app)
+        register_job('replica_sync', replica.read_replica.sync, interval=replica.SYNC_INTERVAL, initial_delay=5)
+    start_scheduler(app)
     
     # Initialize Flask extensions
     login_manager.init_app(app)
@@ -130,6 +128,8 @@ def create_app():
     login_manager.login_view = 'auth.login'
     login_manager.login_message_category = 'error'
     
+    from .repository import get_volunteer
+
     @login_manager.user_loader
     def load_user(user_id):
         # FIX: Create a FRESH, high-privilege connection for the user loader
@@ -138,10 +138,9 @@ def create_app():
             key = get_high_privilege_key() 
             local_supabase = create_client(url, key) 
             
-            res = local_supabase.table('volunteers').select('*').eq('id', user_id).single().execute()
-            if res.data:
-                user_data = res.data
-                return User(id=user_data['id'], full_name=user_data['full_name'], email=user_data['email'], role=user_data['role'])
+            profile = get_volunteer(user_id, client=local_supabase)
+            if profile:
+                return User(id=profile.id, full_name=profile.full_name, email=profile.email, role=profile.role)
         except Exception as e:
             print(f"User Loader Error: {e}") 
         return None
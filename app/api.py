@@ -1,11 +1,24 @@
 import os
+import json
+import zlib
 import requests
+import itertools
 import pandas as pd
-from io import StringIO
+from datetime import datetime, timedelta, timezone
 import google.generativeai as genai
-from flask import Blueprint, jsonify, request, Response, flash, redirect, url_for
+from flask import Blueprint, jsonify, request, Response, flash, redirect, url_for, current_app, abort, stream_with_context, send_file
 from flask_login import login_required, current_user
-from .utils import role_required
+from .utils import role_required, keyset_after, cursor_timestamp, cursor_id
+from .scheduler import get_job_status
+from .caching import cache_stats, tagged, path_key, invalidate, APPOINTMENTS, PATIENTS, REPLICA
+from .reference import reference_data
+from .concurrency import fan_out
+from .kpis import kpi_snapshot, SNAPSHOT_TTL
+from .throttle import admission_control, chatbot_bucket, chatbot_limiter
+from .metrics import external_call, render_latest
+from .reports import REPORT_FORMATS, parse_filters, iter_report_pages, stream_csv, write_xlsx, write_parquet
+from .replica import read_replica
+from .queue_feed import queue_feed, ENABLED as LIVE_QUEUE
 from . import supabase, cache
 
 api_bp = Blueprint('api', __name__)
@@ -35,8 +48,9 @@ def perform_google_search(query):
             'num': 3  # Fetch top 3 results
         }
         
-        response = requests.get(url, params=params)
-        response.raise_for_status()
+        with external_call('google', 'search'):
+            response = requests.get(url, params=params)
+            response.raise_for_status()
         return response.json().get('items', [])
     except Exception as e:
         print(f"Google Search Error: {e}")
@@ -48,7 +62,8 @@ def perform_google_search(query):
 
 @api_bp.route('/dashboard-data')
 @login_required
-@cache.cached(timeout=60, query_string=True)
+# Status counts include escalations written by the AI caller outside the app: keep the TTL short
+@cache.cached(timeout=60, make_cache_key=tagged(path_key, APPOINTMENTS, PATIENTS, REPLICA))
 def dashboard_data():
     """
     Fetches data for Dashboard Charts & Map.
@@ -61,15 +76,27 @@ def dashboard_data():
 
         # 2. Build Query
         # Fetching raw data to process in Python (Replaces missing SQL RPC)
-        query = supabase.table('master_appointments').select('service_type, status, appointment_datetime')
-        
-        if start_date:
-            query = query.gte('appointment_datetime', start_date)
-        if end_date:
-            query = query.lte('appointment_datetime', end_date)
-            
-        res = query.execute()
-        appointments = res.data
+        replica_map = None
+        if read_replica.use_for():
+            appointments = read_replica.appointments(start_date, end_date)
+            replica_map = read_replica.patients_by_state()
+        else:
+            query = supabase.table('master_appointments').select('service_type, status, appointment_datetime')
+
+            if start_date:
+                query = query.gte('appointment_datetime', start_date)
+            if end_date:
+                query = query.lte('appointment_datetime', end_date)
+
+            # The map query is independent of the filters: run both round trips in parallel
+            results = fan_out(
+                return_exceptions=True,
+                appointments=query.execute,
+                map=supabase.table('patients').select('lgas!inner(states!inner(name))').execute,
+            )
+            if isinstance(results['appointments'], Exception):
+                raise results['appointments']
+            appointments = results['appointments'].data
         
         # 3. Initialize Response Structures (Empty defaults)
         bar_chart = {'labels': [], 'data': []}
@@ -98,7 +125,7 @@ def dashboard_data():
 
             # --- C. Line Chart (Traffic Trends - Daily) ---
             if 'appointment_datetime' in df.columns:
-                df['date'] = pd.to_datetime(df['appointment_datetime']).dt.date
+                df['date'] = pd.to_datetime(df['appointment_datetime'], format='ISO8601').dt.date
                 # Group by date and count
                 daily_counts = df['date'].value_counts().sort_index()
                 # If filtered, show range. If not, show last 7 days for readability.
@@ -111,16 +138,21 @@ def dashboard_data():
                 }
 
         # --- 4. Map Data (Patients by State) ---
-        # Fetch separately to ensure map is populated even if appointments are empty
+        # Fetched alongside the appointments; a failure here only empties the map
         try:
-            map_query = supabase.table('patients').select('lgas!inner(states!inner(name))').execute()
-            if map_query.data:
-                df_map = pd.DataFrame(map_query.data)
-                if not df_map.empty:
-                    # Flatten nested JSON: lgas -> states -> name
-                    df_map['state'] = df_map['lgas'].apply(lambda x: x['states']['name'] if x and 'states' in x else 'Unknown')
-                    # Convert to dictionary { 'Lagos': 10, 'Kano': 5 }
-                    map_data = df_map['state'].value_counts().to_dict()
+            if replica_map is not None:
+                map_data = replica_map
+            else:
+                map_query = results['map']
+                if isinstance(map_query, Exception):
+                    raise map_query
+                if map_query.data:
+                    df_map = pd.DataFrame(map_query.data)
+                    if not df_map.empty:
+                        # Flatten nested JSON: lgas -> states -> name
+                        df_map['state'] = df_map['lgas'].apply(lambda x: x['states']['name'] if x and 'states' in x else 'Unknown')
+                        # Convert to dictionary { 'Lagos': 10, 'Kano': 5 }
+                        map_data = df_map['state'].value_counts().to_dict()
         except Exception as e:
             print(f"Map Data Error: {e}")
 
@@ -158,6 +190,14 @@ def histogram_data():
         lga_filter = request.args.get('lga_id')
         state_filter = request.args.get('state_id')
 
+        if read_replica.use_for():
+            counts = read_replica.service_counts({
+                'start': start_date, 'end': end_date,
+                **{key: value for key, value in (('service_type', service_filter), ('status', status_filter),
+                                                 ('lga_id', lga_filter), ('state_id', state_filter)) if value and value != 'all'},
+            })
+            return jsonify({'labels': [s for s, _ in counts], 'data': [n for _, n in counts]})
+
         # Build Query with joins
         query = supabase.table('master_appointments').select(
             'service_type, appointment_datetime, status, patients!inner(lga_id, lgas!inner(state_id))'
@@ -196,22 +236,26 @@ def histogram_data():
 
 @api_bp.route('/api/public-stats')
 def public_stats():
-    """Fetches live KPI stats for the public homepage."""
-    try:
-        res = supabase.table('public_stats').select('*').execute()
-        stats = {item['stat_key']: item['stat_value'] for item in res.data} if res.data else {}
-        return jsonify(stats)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    """
+    Live KPI stats for the public homepage, from the in-memory snapshot.
+    ETag/Cache-Control let browsers and proxies skip refetching unchanged stats.
+    """
+    stats, etag = kpi_snapshot.get()
+    resp = jsonify(stats)
+    resp.set_etag(etag)
+    resp.headers['Cache-Control'] = f'public, max-age={SNAPSHOT_TTL}, stale-while-revalidate={SNAPSHOT_TTL * 10}'
+    return resp.make_conditional(request)
 
 # ==========================================
 # 4. CHATBOT (RAG + SEARCH)
 # ==========================================
 
 @api_bp.route('/chatbot', methods=['POST'])
+@admission_control(chatbot_bucket, chatbot_limiter)
 def handle_chatbot():
     """
     Chatbot endpoint handling RAG (Retrieval Augmented Generation) and Web Search.
+    Public and expensive, so it is rate limited per client and capped host-wide.
     """
     data = request.get_json()
     user_question = data.get('message', '')
@@ -224,17 +268,19 @@ def handle_chatbot():
         
         # 1. Check Intent
         intent_prompt = f"Is '{user_question}' a greeting? Yes/No"
-        intent_check = model.generate_content(intent_prompt).text.lower()
+        with external_call('gemini', 'generate'):
+            intent_check = model.generate_content(intent_prompt).text.lower()
         if 'yes' in intent_check:
             return jsonify({'response': "Hello! I am Safemama AI. How can I help you today?", 'source': 'Conversational'})
 
         # 2. RAG Search (Internal Documents)
         # Generate embedding for the question
-        embedding_resp = genai.embed_content(
-            model="models/embedding-001", 
-            content=user_question, 
-            task_type="retrieval_query"
-        )
+        with external_call('gemini', 'embed'):
+            embedding_resp = genai.embed_content(
+                model="models/embedding-001", 
+                content=user_question, 
+                task_type="retrieval_query"
+            )
         
         # Search Supabase 'documents' table via RPC
         rpc_params = {
@@ -275,7 +321,8 @@ def handle_chatbot():
         Answer (keep it safe, concise, and empathetic):
         """
         
-        final_response = model.generate_content(final_prompt)
+        with external_call('gemini', 'generate'):
+            final_response = model.generate_content(final_prompt)
         return jsonify({'response': final_response.text, 'source': source})
 
     except Exception as e:
@@ -290,51 +337,108 @@ def handle_chatbot():
 @login_required
 @role_required('national', 'supa_user')
 def download_report():
-    """Generates CSV report with joined patient/location data."""
+    """Appointment report with readable patient/location names, as CSV, XLSX or Parquet."""
+    report_format = request.form.get('format', 'csv')
+    if report_format not in REPORT_FORMATS:
+        report_format = 'csv'
+    mimetype, extension = REPORT_FORMATS[report_format]
     try:
-        # Complex join to get readable names instead of IDs
-        res = supabase.table('master_appointments').select(
-            'appointment_datetime, service_type, status, volunteer_notes, '
-            'patients(full_name, phone_number, gender, age, emergency_contact_name, '
-            'lgas(name, states(name)))'
-        ).execute()
-        
-        if not res.data: 
+        filters = parse_filters(request.form)
+        pages = read_replica.iter_report_pages(filters) if read_replica.use_for() else iter_report_pages(filters)
+        first_page = next(pages, None)
+        if not first_page:
             flash("No data available to export.", "error")
-            return redirect(url_for('views.dashboard'))
-
-        flat_data = []
-        for row in res.data:
-            pt = row.get('patients') or {}
-            loc = pt.get('lgas') or {}
-            state = loc.get('states') or {}
-            
-            flat_data.append({
-                'Date': row.get('appointment_datetime'),
-                'Service': row.get('service_type'),
-                'Status': row.get('status'),
-                'Patient Name': pt.get('full_name', 'N/A'),
-                'Phone': pt.get('phone_number', 'N/A'),
-                'State': state.get('name', 'N/A'),
-                'LGA': loc.get('name', 'N/A'),
-                'Emergency Contact': pt.get('emergency_contact_name', '')
-            })
-
-        df = pd.DataFrame(flat_data)
-        csv_buffer = StringIO()
-        df.to_csv(csv_buffer, index=False)
-        
-        return Response(
-            csv_buffer.getvalue(),
-            mimetype="text/csv",
-            headers={"Content-disposition": "attachment; filename=safemama_report.csv"}
-        )
-
+            return redirect(url_for('views.reports'))
+        pages = itertools.chain([first_page], pages)
+
+        if report_format == 'csv':
+            return Response(stream_with_context(stream_csv(pages)), mimetype=mimetype,
+                            headers={"Content-disposition": f"attachment; filename=safemama_report.{extension}"})
+        writer = write_xlsx if report_format == 'xlsx' else write_parquet
+        return send_file(writer(pages), mimetype=mimetype, as_attachment=True, download_name=f"safemama_report.{extension}")
+
+    except ImportError:
+        flash("Parquet export is not available on this server (pyarrow is not installed).", "error")
+        return redirect(url_for('views.reports'))
     except Exception as e:
         print(f"Export Error: {e}")
         flash("Export failed.", "error")
         return redirect(url_for('views.dashboard'))
 
+# --- Delta export for the analytics warehouse ---
+# Rows changed since a watermark, paged by (updated_at, primary key) and
+# streamed as gzip'd NDJSON, so a nightly sync costs time proportional to
+# the changes. The last line is a cursor for the next call:
+#   {"_cursor": {"since": ..., "after_id": ...}, "rows": N, "has_more": false}
+# Rows touched in the last EXPORT_SETTLE_SECONDS are left for the next sync:
+# a transaction still in flight may commit with an earlier updated_at.
+EXPORT_TABLES = {'patients': 'id', 'master_appointments': 'appointment_id'}
+EXPORT_PAGE_SIZE = int(os.environ.get('EXPORT_PAGE_SIZE', 1000))
+EXPORT_MAX_ROWS = int(os.environ.get('EXPORT_MAX_ROWS', 200000))
+EXPORT_SETTLE_SECONDS = int(os.environ.get('EXPORT_SETTLE_SECONDS', 5))
+
+def iter_delta(table, since=None, after_id=None, max_rows=EXPORT_MAX_ROWS):
+    """Yields changed rows of `table` in (updated_at, pk) order, then a final cursor dict."""
+    pk = EXPORT_TABLES[table]
+    cutoff = (datetime.now(timezone.utc) - timedelta(seconds=EXPORT_SETTLE_SECONDS)).isoformat()
+    sent, has_more = 0, True
+    while has_more and sent < max_rows:
+        page_size = min(EXPORT_PAGE_SIZE, max_rows - sent)
+        query = supabase.table(table).select('*').lt('updated_at', cutoff).order('updated_at').order(pk)
+        if since and after_id:
+            query = keyset_after(query, 'updated_at', pk, since, after_id)
+        elif since:
+            query = query.gte('updated_at', since)
+        rows = query.limit(page_size).execute().data or []
+        for row in rows:
+            yield row
+        sent += len(rows)
+        has_more = len(rows) == page_size
+        if rows:
+            since, after_id = rows[-1]['updated_at'], rows[-1][pk]
+    yield {'_cursor': {'since': since, 'after_id': after_id}, 'rows': sent, 'has_more': has_more}
+
+def _gzip_ndjson(records):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)   # wbits 31: gzip container
+    buffer = []
+    for record in records:
+        buffer.append(json.dumps(record, separators=(',', ':'), default=str))
+        if len(buffer) >= 500:
+            chunk = compressor.compress(('\n'.join(buffer) + '\n').encode())
+            buffer = []
+            if chunk:
+                yield chunk
+    if buffer:
+        yield compressor.compress(('\n'.join(buffer) + '\n').encode())
+    yield compressor.flush()
+
+@api_bp.route('/api/export/<table>')
+@login_required
+@role_required('national', 'supa_user')
+def delta_export(table):
+    """?since=<updated_at>&after_id=<id> from the previous cursor; omit both for a full export."""
+    if table not in EXPORT_TABLES:
+        abort(404)
+    since, after_id = request.args.get('since'), request.args.get('after_id')
+    # Both end up inside a PostgREST or=() filter, so only well-formed values pass
+    try:
+        since = cursor_timestamp(since) if since else None
+    except ValueError:
+        return jsonify({'error': 'since must be an ISO 8601 timestamp'}), 400
+    try:
+        after_id = cursor_id(after_id) if after_id else None
+    except ValueError:
+        return jsonify({'error': 'after_id must be a UUID'}), 400
+    if after_id and not since:
+        return jsonify({'error': 'after_id requires since'}), 400
+    max_rows = min(request.args.get('limit', EXPORT_MAX_ROWS, type=int), EXPORT_MAX_ROWS)
+
+    return Response(
+        stream_with_context(_gzip_ndjson(iter_delta(table, since, after_id, max(max_rows, 1)))),
+        mimetype='application/gzip',
+        headers={'Content-disposition': f'attachment; filename={table}_delta.ndjson.gz'}
+    )
+
 @api_bp.route('/complete-case/<uuid:appointment_id>', methods=['POST'])
 @login_required
 def complete_case(appointment_id):
@@ -345,20 +449,66 @@ def complete_case(appointment_id):
             'status': 'completed', 
             'volunteer_notes': notes,
             'volunteer_id': current_user.id,
-            'updated_at': 'now()'
         }).eq('appointment_id', str(appointment_id)).execute()
+        invalidate(APPOINTMENTS)
+        queue_feed.poke()
         flash('Case marked as completed.', 'success')
     except Exception as e:
         flash(f'Error completing case: {e}', 'error')
     
     return redirect(url_for('views.volunteer_queue'))
 
-@api_bp.route('/api/lgas/<uuid:state_id>')
-@cache.cached(timeout=86400) # Cache static LGA data for 24 hours
-def get_lgas_for_state(state_id):
-    """Fetches LGAs for a selected state."""
+@api_bp.route('/api/volunteer-queue/stream')
+@login_required
+def volunteer_queue_stream():
+    """Server-Sent Events: a queue snapshot, then only the cases entering or leaving it."""
+    if not LIVE_QUEUE:
+        abort(404)      # workers that can't hold streams (see gunicorn.conf.py)
     try:
-        res = supabase.table('lgas').select('id, name').eq('state_id', str(state_id)).order('name').execute()
-        return jsonify(res.data)
+        subscription = queue_feed.subscribe(request.headers.get('Last-Event-ID'))
     except Exception as e:
-        return jsonify([])
\ No newline at end of file
+        print(f"Queue Feed Error: {e}")
+        subscription = None
+    if subscription is None:
+        # At the stream cap (or the queue could not be loaded): the page retries later
+        return Response('Live queue busy, retry shortly.', status=503, headers={'Retry-After': '10'})
+    return Response(
+        stream_with_context(queue_feed.stream(*subscription)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@api_bp.route('/api/lgas/<uuid:state_id>')
+def get_lgas_for_state(state_id):
+    """LGAs for a selected state, served from the in-memory reference data."""
+    lgas = reference_data.locations().lgas_for_state(state_id)
+    return jsonify([{'id': lga.id, 'name': lga.name} for lga in lgas])
+
+@api_bp.route('/api/scheduler-status')
+@login_required
+@role_required('supa_user')
+def scheduler_status():
+    """Last run time, duration and outcome of each background job."""
+    return jsonify(get_job_status(current_app))
+
+@api_bp.route('/api/replica-status')
+@login_required
+@role_required('supa_user')
+def replica_status():
+    """Read replica lag (seconds behind Supabase), last sync times and row counts."""
+    return jsonify(read_replica.status())
+
+@api_bp.route('/api/cache-stats')
+@login_required
+@role_required('supa_user')
+def cache_stats_view():
+    """Cache hit ratio per endpoint, aggregated over all workers."""
+    return jsonify(cache_stats())
+
+@api_bp.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint: supa_user, or a direct (unproxied) request from this host."""
+    is_local = request.remote_addr in ('127.0.0.1', '::1') and 'X-Forwarded-For' not in request.headers
+    if not is_local and not (current_user.is_authenticated and current_user.role == 'supa_user'):
+        abort(403)
+    return Response(render_latest(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,230 @@
+import os
+import time
+import threading
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple
+from .utils import keyset_after
+from .caching import invalidate, APPOINTMENTS
+from . import supabase
+
+# ==========================================
+# CASE ASSIGNMENT (escalations -> volunteers)
+# ==========================================
+# An in-memory inverted index of the volunteers who can take cases:
+# spoken language -> ids, LGA -> ids, state -> ids, plus each volunteer's
+# open-case count. Matching an escalated appointment is a few set
+# intersections and a min() over the survivors, walking down the tiers
+#   language+LGA, language+state, language, LGA, state, anyone
+# and picking the least loaded volunteer in the first non-empty tier.
+#
+# The scheduler leader runs assign_pending: it refreshes the index
+# (volunteer rows changed since the last pass, by updated_at; a full
+# rebuild every ASSIGNMENT_RESYNC_SECONDS catches deleted accounts),
+# recounts open cases, and assigns unassigned escalations in one update
+# per volunteer. Registrations and role changes need no signal: the
+# touch_updated_at trigger stamps the row, so the leader's next pass (at
+# most ASSIGNMENT_INTERVAL_SECONDS later) picks them up.
+
+ESCALATION_STATUSES = ('human_escalation', 'transferred', 'failed_escalation')
+ASSIGNABLE_ROLES = frozenset(r.strip() for r in os.environ.get('ASSIGNMENT_ROLES', 'volunteer,local,state').split(',') if r.strip())
+ASSIGN_INTERVAL = int(os.environ.get('ASSIGNMENT_INTERVAL_SECONDS', 30))
+RESYNC_SECONDS = int(os.environ.get('ASSIGNMENT_RESYNC_SECONDS', 3600))
+SETTLE_SECONDS = 5
+BATCH_SIZE = 200
+PAGE_SIZE = 1000
+
+_VOLUNTEER_COLUMNS = 'id, full_name, role, state_id, lga_id, spoken_languages, updated_at'
+_EMPTY = frozenset()
+
+
+class VolunteerProfile(NamedTuple):
+    id: str
+    full_name: str
+    role: str
+    state_id: str
+    lga_id: str
+    languages: frozenset    # normalised with language_key
+
+
+class Match(NamedTuple):
+    volunteer: VolunteerProfile
+    tier: str
+    open_cases: int
+
+
+def language_key(value):
+    return (value or '').strip().lower()
+
+def _profile(row):
+    return VolunteerProfile(row['id'], row.get('full_name'), row.get('role'), row.get('state_id'), row.get('lga_id'),
+                            frozenset(language_key(lang) for lang in row.get('spoken_languages') or () if lang))
+
+
+class AssignmentIndex:
+    def __init__(self, roles):
+        self.roles = roles
+        self._lock = threading.RLock()
+        self._volunteers = {}
+        self._by_language = defaultdict(set)
+        self._by_lga = defaultdict(set)
+        self._by_state = defaultdict(set)
+        self._open_cases = Counter()
+        self._rebuilt_at = 0
+        self._cursor = None
+
+    # --- Index maintenance (caller holds the lock) ---
+    def _add(self, profile):
+        self._volunteers[profile.id] = profile
+        for lang in profile.languages:
+            self._by_language[lang].add(profile.id)
+        if profile.lga_id:
+            self._by_lga[profile.lga_id].add(profile.id)
+        if profile.state_id:
+            self._by_state[profile.state_id].add(profile.id)
+
+    def _remove(self, volunteer_id):
+        profile = self._volunteers.pop(volunteer_id, None)
+        if not profile:
+            return
+        for index, keys in ((self._by_language, profile.languages), (self._by_lga, (profile.lga_id,)), (self._by_state, (profile.state_id,))):
+            for key in keys:
+                ids = index.get(key)
+                if ids is not None:
+                    ids.discard(volunteer_id)
+                    if not ids:
+                        del index[key]
+
+    def _upsert(self, row):
+        self._remove(row['id'])
+        if row.get('role') in self.roles:
+            self._add(_profile(row))
+
+    # --- Refresh ---
+    def rebuild(self):
+        """Reloads every volunteer and swaps the new index in."""
+        rows, after = [], None
+        while True:
+            query = supabase.table('volunteers').select(_VOLUNTEER_COLUMNS).in_('role', sorted(self.roles))
+            if after:
+                query = query.gt('id', after)
+            page = query.order('id').limit(PAGE_SIZE).execute().data or []
+            rows.extend(page)
+            if len(page) < PAGE_SIZE:
+                break
+            after = page[-1]['id']
+        fresh = AssignmentIndex(self.roles)
+        for row in rows:
+            fresh._add(_profile(row))
+        with self._lock:
+            self._volunteers, self._by_language = fresh._volunteers, fresh._by_language
+            self._by_lga, self._by_state = fresh._by_lga, fresh._by_state
+            self._cursor = datetime.now(timezone.utc)
+            self._rebuilt_at = time.time()
+        print(f"Assignment: Indexed {len(rows)} volunteers.")
+
+    def sync(self):
+        """Applies volunteer rows changed since the last pass (new accounts, profile and role edits)."""
+        if time.time() - self._rebuilt_at > RESYNC_SECONDS:
+            return self.rebuild()
+        since = (self._cursor - timedelta(seconds=SETTLE_SECONDS)).isoformat()
+        started, after, changed = datetime.now(timezone.utc), None, 0
+        while True:
+            query = supabase.table('volunteers').select(_VOLUNTEER_COLUMNS).gte('updated_at', since)
+            if after:
+                query = keyset_after(query, 'updated_at', 'id', *after)
+            rows = query.order('updated_at').order('id').limit(PAGE_SIZE).execute().data or []
+            with self._lock:
+                for row in rows:
+                    self._upsert(row)
+            changed += len(rows)
+            if len(rows) < PAGE_SIZE:
+                break
+            after = (rows[-1]['updated_at'], rows[-1]['id'])
+        self._cursor = started
+        return changed
+
+    def recount(self):
+        """Open escalated cases per volunteer, recounted from the appointments table."""
+        counts, start = Counter(), 0
+        while True:
+            rows = supabase.table('master_appointments').select('volunteer_id')\
+                .in_('status', list(ESCALATION_STATUSES)).not_.is_('volunteer_id', 'null')\
+                .order('appointment_id').range(start, start + PAGE_SIZE - 1).execute().data or []
+            counts.update(row['volunteer_id'] for row in rows)
+            if len(rows) < PAGE_SIZE:
+                break
+            start += PAGE_SIZE
+        with self._lock:
+            self._open_cases = counts
+
+    # --- Matching ---
+    def match(self, language=None, lga_id=None, state_id=None):
+        """The best volunteer for a case, or None when nobody is indexed."""
+        with self._lock:
+            speakers = self._by_language.get(language_key(language), _EMPTY)
+            lga = self._by_lga.get(lga_id, _EMPTY)
+            state = self._by_state.get(state_id, _EMPTY)
+            tiers = (
+                ('language+lga', lambda: speakers & lga),
+                ('language+state', lambda: speakers & state),
+                ('language', lambda: speakers),
+                ('lga', lambda: lga),
+                ('state', lambda: state),
+                ('any', lambda: self._volunteers.keys()),
+            )
+            for tier, candidates in tiers:
+                candidates = candidates()
+                if candidates:
+                    best = min(candidates, key=lambda vid: (self._open_cases[vid], vid))
+                    return Match(self._volunteers[best], tier, self._open_cases[best])
+        return None
+
+    def _take(self, volunteer_id, count=1):
+        with self._lock:
+            self._open_cases[volunteer_id] += count
+
+    # --- Scheduler job ---
+    def assign_pending(self, app):
+        """Assigns unassigned escalated appointments to the best matching volunteers."""
+        if not self._rebuilt_at:
+            self.rebuild()
+        else:
+            self.sync()
+        self.recount()
+
+        rows = supabase.table('master_appointments')\
+            .select('appointment_id, preferred_language, patients!inner(lga_id, lgas(state_id))')\
+            .in_('status', list(ESCALATION_STATUSES)).is_('volunteer_id', 'null')\
+            .order('updated_at').limit(BATCH_SIZE).execute().data or []
+        if not rows:
+            return True
+
+        plan, tiers = defaultdict(list), Counter()
+        for row in rows:
+            patient = row.get('patients') or {}
+            found = self.match(row.get('preferred_language'), patient.get('lga_id'), (patient.get('lgas') or {}).get('state_id'))
+            if not found:
+                print("Assignment Warning: No volunteers available for escalated cases.")
+                break
+            plan[found.volunteer.id].append(row['appointment_id'])
+            tiers[found.tier] += 1
+            self._take(found.volunteer.id)
+
+        assigned = 0
+        for volunteer_id, appointment_ids in plan.items():
+            # Only still-unassigned escalations: a volunteer may have picked one up meanwhile
+            res = supabase.table('master_appointments').update({'volunteer_id': volunteer_id})\
+                .in_('appointment_id', appointment_ids).is_('volunteer_id', 'null')\
+                .in_('status', list(ESCALATION_STATUSES)).execute()
+            taken = len(res.data or [])
+            assigned += taken
+            if taken < len(appointment_ids):
+                self._take(volunteer_id, taken - len(appointment_ids))
+        if assigned:
+            invalidate(APPOINTMENTS)
+            print(f"Assignment: Assigned {assigned} escalated cases ({', '.join(f'{t}: {n}' for t, n in tiers.items())}).")
+        return True
+
+
+assignment_index = AssignmentIndex(ASSIGNABLE_ROLES)
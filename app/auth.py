@@ -4,6 +4,9 @@ from flask_login import login_user, logout_user, login_required
 from supabase import create_client, Client
 from . import supabase as global_supabase_admin  # Rename to clarify this is the ADMIN client
 from .models import User
+from .repository import get_volunteer
+from .caching import invalidate, VOLUNTEERS
+from .reference import reference_data, LANGUAGES
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -44,6 +47,7 @@ def register_user():
                     'state_id': request.form.get('state_id') or None,
                     'lga_id': request.form.get('lga_id') or None
                 }).eq('id', auth_res.user.id).execute()
+                invalidate(VOLUNTEERS)
 
             flash('Account created successfully! Please log in.', 'success')
             return redirect(url_for('auth.login'))
@@ -51,14 +55,8 @@ def register_user():
             flash(f"Error creating account: {e}", 'error')
             return redirect(url_for('auth.register_user'))
 
-    # Load states using the admin client
-    try:
-        states = global_supabase_admin.table('states').select('id, name').order('name').execute().data
-    except:
-        states = []
-    
-    languages = ['English', 'Yoruba', 'Hausa', 'Igbo', 'Pidgin']
-    return render_template('register_user.html', languages=languages, states=states)
+    # States come from the in-memory reference data
+    return render_template('register_user.html', languages=LANGUAGES, states=reference_data.locations().states)
 
 @auth_bp.route('/login', methods=['GET', 'POST'])
 def login():
@@ -76,15 +74,14 @@ def login():
             # 2. FETCH PROFILE with GLOBAL ADMIN CLIENT
             # Since global_supabase_admin still has the Service Role Key, 
             # this query bypasses all RLS and recursion errors.
-            user_profile_res = global_supabase_admin.table('volunteers').select('*').eq('id', auth_res.user.id).single().execute()
+            profile = get_volunteer(auth_res.user.id, client=global_supabase_admin)
             
-            if user_profile_res.data:
-                user_data = user_profile_res.data
+            if profile:
                 user = User(
-                    id=user_data['id'],
-                    full_name=user_data['full_name'],
-                    email=user_data['email'],
-                    role=user_data['role']
+                    id=profile.id,
+                    full_name=profile.full_name,
+                    email=profile.email,
+                    role=profile.role
                 )
                 login_user(user) # Logs the user into Flask
                 return redirect(url_for('views.dashboard'))
@@ -0,0 +1,180 @@
+import os
+import time
+import pickle
+import sqlite3
+import threading
+from flask import has_request_context, request
+from flask_caching.backends.base import BaseCache
+from .metrics import cache_requests
+
+# ==========================================
+# SHARED SQLITE CACHE BACKEND
+# ==========================================
+# One SQLite file (WAL mode) shared by every gunicorn worker on the box, so a
+# page warmed by one worker is a hit for all of them. Entries carry an expiry
+# and a last-access time; when the table grows past `threshold` the least
+# recently used entries are evicted.
+# Hit/miss counts are kept per endpoint in memory and flushed into the same
+# file every few seconds, so the ratio can be read across all workers.
+
+STATS_FLUSH_SECONDS = 10
+ACCESS_TOUCH_SECONDS = 10   # don't rewrite last-access time on every hit
+PRUNE_EVERY_SETS = 100
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, path, threshold=5000, default_timeout=300):
+        super().__init__(default_timeout=default_timeout)
+        self.path = path
+        self.threshold = threshold
+        self._local = threading.local()
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+        self._stats_flushed_at = time.time()
+        self._sets = 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " key TEXT PRIMARY KEY, value BLOB NOT NULL,"
+                " expires REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_accessed ON cache(accessed)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_stats ("
+                " name TEXT PRIMARY KEY, hits INTEGER NOT NULL, misses INTEGER NOT NULL)"
+            )
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        path = os.path.join(config.get('CACHE_DIR') or os.path.join(app.instance_path, 'cache'), 'cache.sqlite3')
+        kwargs.update(threshold=config.get('CACHE_THRESHOLD', 5000))
+        return cls(path, *args, **kwargs)
+
+    # --- Connection handling (one connection per thread, never shared across a fork) ---
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _expiry(self, timeout):
+        timeout = self._normalize_timeout(timeout)
+        return time.time() + timeout if timeout > 0 else 0
+
+    # --- Statistics ---
+    def _record(self, key, hit):
+        if has_request_context() and key.startswith(('view', 'page:')):
+            name = request.endpoint or 'unknown'
+        else:
+            name = key.split(':', 1)[0]
+        cache_requests.inc(cache=name, result='hit' if hit else 'miss')
+        with self._stats_lock:
+            counts = self._stats.setdefault(name, [0, 0])
+            counts[0 if hit else 1] += 1
+            due = time.time() - self._stats_flushed_at > STATS_FLUSH_SECONDS
+        if due:
+            self.flush_stats()
+
+    def flush_stats(self):
+        with self._stats_lock:
+            pending, self._stats = self._stats, {}
+            self._stats_flushed_at = time.time()
+        if not pending:
+            return
+        try:
+            self._connect().executemany(
+                "INSERT INTO cache_stats (name, hits, misses) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET hits = hits + excluded.hits, misses = misses + excluded.misses",
+                [(name, hits, misses) for name, (hits, misses) in pending.items()],
+            )
+        except sqlite3.Error as e:
+            print(f"Cache Warning: Could not flush stats: {e}")
+
+    def get_stats(self):
+        """Hits, misses and hit ratio per endpoint, across all workers."""
+        self.flush_stats()
+        rows = self._connect().execute("SELECT name, hits, misses FROM cache_stats ORDER BY name").fetchall()
+        return {
+            name: {'hits': hits, 'misses': misses, 'hit_ratio': round(hits / (hits + misses), 3) if hits + misses else None}
+            for name, hits, misses in rows
+        }
+
+    # --- Cache API ---
+    def get(self, key):
+        try:
+            row = self._connect().execute("SELECT value, expires, accessed FROM cache WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error as e:
+            print(f"Cache Warning: get failed: {e}")
+            return None
+        now = time.time()
+        if row is None or (row[1] and row[1] <= now):
+            self._record(key, False)
+            return None
+        if now - row[2] > ACCESS_TOUCH_SECONDS:
+            try:
+                self._connect().execute("UPDATE cache SET accessed = ? WHERE key = ?", (now, key))
+            except sqlite3.Error:
+                pass
+        self._record(key, True)
+        return pickle.loads(row[0])
+
+    def set(self, key, value, timeout=None):
+        try:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires, accessed) VALUES (?, ?, ?, ?)",
+                (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), self._expiry(timeout), time.time()),
+            )
+        except sqlite3.Error as e:
+            print(f"Cache Warning: set failed: {e}")
+            return False
+        self._sets += 1
+        if self._sets % PRUNE_EVERY_SETS == 0:
+            self._prune()
+        return True
+
+    def add(self, key, value, timeout=None):
+        """Atomic insert-if-absent (used to agree on cache tag versions across workers)."""
+        try:
+            conn = self._connect()
+            conn.execute("DELETE FROM cache WHERE key = ? AND expires > 0 AND expires <= ?", (key, time.time()))
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO cache (key, value, expires, accessed) VALUES (?, ?, ?, ?)",
+                (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), self._expiry(timeout), time.time()),
+            )
+        except sqlite3.Error as e:
+            print(f"Cache Warning: add failed: {e}")
+            return False
+        return cur.rowcount == 1
+
+    def delete(self, key):
+        try:
+            self._connect().execute("DELETE FROM cache WHERE key = ?", (key,))
+        except sqlite3.Error:
+            return False
+        return True
+
+    def has(self, key):
+        row = self._connect().execute("SELECT expires FROM cache WHERE key = ?", (key,)).fetchone()
+        return row is not None and (not row[0] or row[0] > time.time())
+
+    def clear(self):
+        self._connect().execute("DELETE FROM cache")
+        return True
+
+    def _prune(self):
+        """Drops expired entries, then the least recently used ones above the threshold."""
+        try:
+            conn = self._connect()
+            conn.execute("DELETE FROM cache WHERE expires > 0 AND expires <= ?", (time.time(),))
+            conn.execute(
+                "DELETE FROM cache WHERE key IN ("
+                " SELECT key FROM cache ORDER BY accessed"
+                " LIMIT max(0, (SELECT COUNT(*) FROM cache) - ?))",
+                (self.threshold,),
+            )
+        except sqlite3.Error as e:
+            print(f"Cache Warning: prune failed: {e}")
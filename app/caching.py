@@ -0,0 +1,138 @@
+import os
+import uuid
+import hashlib
+from functools import wraps
+from flask import g, request, session, make_response, Response
+from flask_login import current_user
+from . import cache
+
+# ==========================================
+# CACHE TAGS
+# ==========================================
+# Every cached entry declares the data it depends on. Each tag has a version
+# token stored in the (shared) cache, and the versions of an entry's tags are
+# part of its key. A write calls invalidate(<tags>), which replaces those
+# tokens: every dependent entry stops matching at once, on every worker, and
+# the orphaned rows age out through the backend's LRU eviction.
+# This lets cached views use long TTLs without serving stale data.
+
+APPOINTMENTS = 'appointments'
+PATIENTS = 'patients'
+LOCATIONS = 'locations'
+SETTINGS = 'settings'
+VIDEOS = 'videos'
+DONATIONS = 'donations'
+VOLUNTEERS = 'volunteers'
+REPLICA = 'replica'       # bumped by the read replica's sync (app/replica.py)
+
+def _tag_key(tag):
+    return f"tag:{tag}"
+
+def tag_versions(*tags):
+    """Current version tokens of the given tags, as one string for cache keys."""
+    if not tags:
+        return ''
+    keys = [_tag_key(tag) for tag in tags]
+    versions = cache.get_many(*keys)
+    missing = [key for key, version in zip(keys, versions) if version is None]
+    if missing:
+        for key in missing:
+            # add() so two workers creating the same tag agree on one token
+            cache.add(key, uuid.uuid4().hex[:12], timeout=0)
+        versions = cache.get_many(*keys)
+    return '.'.join(str(version) for version in versions)
+
+def invalidate(*tags):
+    """Publishes a write: every cached entry depending on any of `tags` becomes stale."""
+    try:
+        cache.set_many({_tag_key(tag): uuid.uuid4().hex[:12] for tag in tags}, timeout=0)
+    except Exception as e:
+        print(f"Cache Warning: Could not invalidate {tags}: {e}")
+
+def tagged(key_func, *tags):
+    """Wraps a make_cache_key function so the key follows the versions of `tags`."""
+    def make_cache_key(*args, **kwargs):
+        return f"{key_func(*args, **kwargs)}@{tag_versions(*tags)}"
+    return make_cache_key
+
+# ==========================================
+# VIEW KEYS
+# ==========================================
+
+def _query_hash():
+    return hashlib.md5(request.query_string).hexdigest() if request.query_string else ''
+
+def path_key(*args, **kwargs):
+    """Cache key for views whose output depends only on the URL (path + query string)."""
+    return f"view:{request.path}:{_query_hash()}"
+
+def user_scoped_key(*args, **kwargs):
+    """
+    Cache key for @cache.cached views whose HTML depends on who is looking
+    (role-based filters, the user's name in the sidebar). Includes the query string.
+    """
+    user = f"{current_user.id}:{current_user.role}" if current_user.is_authenticated else 'anon'
+    return f"view:{request.path}:{user}:{_query_hash()}"
+
+def cache_stats():
+    """Per-endpoint hit/miss counts, when the configured backend records them."""
+    backend = cache.cache
+    return backend.get_stats() if hasattr(backend, 'get_stats') else {}
+
+# ==========================================
+# PUBLIC PAGE CACHE
+# ==========================================
+# Anonymous visitors of the public pages get fully rendered HTML from the
+# cache, validated with a content-hash ETag (304 on If-None-Match).
+# Logged-in users, requests with query strings and requests carrying flash
+# messages always render fresh, because their HTML differs per visitor.
+
+PUBLIC_PAGE_TTL = int(os.environ.get('PUBLIC_PAGE_CACHE_TTL', 3600))
+PUBLIC_PAGE_MAX_AGE = int(os.environ.get('PUBLIC_PAGE_MAX_AGE', 60))
+
+def _is_cacheable_request():
+    if request.method != 'GET' or request.args:
+        return False
+    if current_user.is_authenticated:
+        return False
+    return '_flashes' not in session
+
+def public_page(name, tags=(), variant=None, timeout=None):
+    """
+    Caches the rendered page for anonymous visitors under `name`, invalidated
+    through `tags`. `variant` is an optional callable whose result is part of
+    the key, for pages whose content follows a value already cached in memory.
+    `timeout` (default PUBLIC_PAGE_CACHE_TTL) bounds pages whose data is also
+    written outside this app, where no tag gets invalidated.
+    """
+    ttl = timeout or PUBLIC_PAGE_TTL
+    max_age = min(PUBLIC_PAGE_MAX_AGE, ttl)
+    def wrapper(fn):
+        @wraps(fn)
+        def decorated_view(*args, **kwargs):
+            if not _is_cacheable_request():
+                return fn(*args, **kwargs)
+
+            key = f"page:{name}:{variant() if variant else ''}@{tag_versions(*tags)}"
+            entry = cache.get(key)
+            if entry is None:
+                resp = make_response(fn(*args, **kwargs))
+                if resp.status_code != 200 or g.get('skip_page_cache'):
+                    return resp
+                body = resp.get_data()
+                entry = (body, hashlib.sha1(body).hexdigest(), resp.mimetype)
+                cache.set(key, entry, timeout=ttl)
+
+            body, etag, mimetype = entry
+            resp = Response(body, mimetype=mimetype)
+            resp.set_etag(etag)
+            resp.headers['Cache-Control'] = f'public, max-age={max_age}'
+            # The page differs once the visitor logs in (session cookie)
+            resp.vary.add('Cookie')
+            return resp.make_conditional(request)
+        return decorated_view
+    return wrapper
+
+def skip_page_cache():
+    """Marks the page being rendered as not cacheable (e.g. it hit a database error)."""
+    g.skip_page_cache = True
@@ -0,0 +1,53 @@
+import os
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+# ==========================================
+# REQUEST-SCOPED QUERY FAN-OUT
+# ==========================================
+# Runs independent Supabase queries of one request in parallel on a shared
+# thread pool, so page latency approaches the slowest query instead of the
+# sum of all round trips. Each call runs in a copy of the caller's context,
+# so Flask's request context (g, current_app) is visible inside it.
+
+POOL_SIZE = int(os.environ.get('QUERY_POOL_SIZE', 16))
+DEFAULT_TIMEOUT = float(os.environ.get('QUERY_TIMEOUT', 10))
+
+_executor = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix='query')
+
+
+class QueryTimeout(Exception):
+    """Raised (or returned) when a fanned-out query exceeds its timeout."""
+
+
+def fan_out(timeout=None, return_exceptions=False, **calls):
+    """
+    Runs the given zero-argument callables concurrently and returns
+    {name: result}. A value may also be a (callable, timeout) pair for a
+    per-query timeout. With return_exceptions=True, failures are returned in
+    place of results; otherwise the first failure is raised.
+    """
+    default_timeout = timeout or DEFAULT_TIMEOUT
+    started = time.monotonic()
+    futures = {}
+    for name, call in calls.items():
+        func, call_timeout = call if isinstance(call, tuple) else (call, default_timeout)
+        ctx = contextvars.copy_context()
+        futures[name] = (_executor.submit(ctx.run, func), call_timeout)
+
+    results = {}
+    for name, (future, call_timeout) in futures.items():
+        remaining = max(0, call_timeout - (time.monotonic() - started))
+        try:
+            results[name] = future.result(timeout=remaining)
+        except FutureTimeoutError:
+            error = QueryTimeout(f"Query '{name}' timed out after {call_timeout}s")
+            if not return_exceptions:
+                raise error
+            results[name] = error
+        except Exception as e:
+            if not return_exceptions:
+                raise
+            results[name] = e
+    return results
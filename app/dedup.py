@@ -0,0 +1,206 @@
+import os
+import re
+import json
+import time
+import uuid
+from typing import NamedTuple
+from flask import current_app
+from . import supabase
+
+# ==========================================
+# DUPLICATE PATIENT DETECTION (bulk uploads)
+# ==========================================
+# Rows are blocked by hash keys instead of being compared pairwise:
+#   - normalised phone number (the same handset in any format)
+#   - name key (order-insensitive name tokens) within the same LGA
+# Inside the upload both keys are checked through dict indexes. Existing
+# patients are matched on phone_number (indexed) with one batched IN query
+# per LOOKUP_CHUNK rows, covering the formats a number may be stored in.
+#
+# A phone match with the same name is a probable duplicate (skipped by
+# default); a shared phone with another name, or the same name in the same
+# LGA, is only possible (kept by default): families often share one phone.
+
+LOOKUP_CHUNK = 200
+REVIEW_TTL = 3600
+ACTIONS = ('skip', 'merge', 'keep')
+MERGE_FIELDS = ('gender', 'age', 'blood_group', 'genotype', 'lga_id')
+
+
+class DuplicateMatch(NamedTuple):
+    row: int                 # index in the valid uploaded rows (not the file line)
+    probable: bool
+    reason: str
+    existing: dict = None    # matched patient already in the database
+    upload_row: int = None   # or: index of the earlier row in this upload
+
+    @property
+    def default_action(self):
+        return 'skip' if self.probable else 'keep'
+
+
+def normalize_phone(phone):
+    """Canonical 11-digit local form: '+234 803-123-4567', '8031234567' -> '08031234567'."""
+    digits = re.sub(r'\D', '', str(phone or ''))
+    if digits.startswith('234') and len(digits) == 13:
+        digits = '0' + digits[3:]
+    elif len(digits) == 10 and not digits.startswith('0'):
+        digits = '0' + digits
+    return digits
+
+def phone_variants(phone):
+    """Formats the same number may have been stored in."""
+    canonical = normalize_phone(phone)
+    if len(canonical) != 11:
+        return [canonical] if canonical else []
+    return [canonical, canonical[1:], '234' + canonical[1:], '+234' + canonical[1:]]
+
+def _blank(value):
+    return value is None or value == '' or value != value   # NaN from pandas
+
+def name_key(name):
+    """Order- and case-insensitive name tokens: 'MUSA,  Aisha' == 'aisha musa'."""
+    return ' '.join(sorted(re.findall(r'[a-z]+', str(name or '').lower())))
+
+def find_duplicates(rows, client=None):
+    """Probable/possible duplicates among `rows` and against existing patients, one match per row."""
+    client = client or supabase
+    matches = {}
+    by_phone, by_name = {}, {}
+
+    # 1. Within the upload (first occurrence wins)
+    for i, row in enumerate(rows):
+        phone, key = normalize_phone(row.get('phone_number')), name_key(row.get('full_name'))
+        earlier = by_phone.get(phone)
+        if earlier is not None:
+            same_name = name_key(rows[earlier].get('full_name')) == key
+            matches[i] = DuplicateMatch(i, same_name, 'Same phone and name earlier in this file' if same_name else 'Same phone as an earlier row in this file', upload_row=earlier)
+        elif (key, row.get('lga_id')) in by_name:
+            matches[i] = DuplicateMatch(i, False, 'Same name and LGA as an earlier row in this file', upload_row=by_name[(key, row.get('lga_id'))])
+        by_phone.setdefault(phone, i)
+        by_name.setdefault((key, row.get('lga_id')), i)
+
+    # 2. Against existing patients: one batched lookup per chunk of distinct phones
+    phones = [phone for phone in by_phone if phone]
+    existing_by_phone = {}
+    for start in range(0, len(phones), LOOKUP_CHUNK):
+        variants = [v for phone in phones[start:start + LOOKUP_CHUNK] for v in phone_variants(phone)]
+        res = client.table('patients').select('id, full_name, phone_number, created_at, ' + ', '.join(MERGE_FIELDS)).in_('phone_number', variants).execute()
+        for patient in res.data or []:
+            existing_by_phone.setdefault(normalize_phone(patient['phone_number']), []).append(patient)
+
+    for i, row in enumerate(rows):
+        candidates = existing_by_phone.get(normalize_phone(row.get('phone_number')))
+        if not candidates or (i in matches and matches[i].probable):
+            continue
+        key = name_key(row.get('full_name'))
+        same_name = next((p for p in candidates if name_key(p['full_name']) == key), None)
+        if same_name:
+            matches[i] = DuplicateMatch(i, True, 'Already registered with this phone and name', existing=same_name)
+        elif i not in matches:
+            matches[i] = DuplicateMatch(i, False, 'Phone already registered to another patient', existing=candidates[0])
+
+    return [matches[i] for i in sorted(matches)]
+
+# ==========================================
+# REVIEW STAGING
+# ==========================================
+# The parsed upload waits in instance/bulk_review/<user>/<token>.json while
+# the user reviews the duplicates, so the review can be submitted to any
+# worker and can't be evicted from a cache in between. Files older than
+# REVIEW_TTL count as expired and are removed on the next upload.
+
+_TOKEN = re.compile(r'^[0-9a-f]{32}$')
+
+
+def _review_dir(user_id):
+    return os.path.join(current_app.instance_path, 'bulk_review', re.sub(r'[^0-9A-Za-z-]', '', str(user_id)))
+
+def _review_path(token, user_id):
+    if not _TOKEN.match(token or ''):
+        return None
+    return os.path.join(_review_dir(user_id), f"{token}.json")
+
+def _json_default(value):
+    # numpy scalars from pandas
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+def _prune_expired(directory):
+    cutoff = time.time() - REVIEW_TTL
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+def stage_upload(rows, lines, matches, failed_rows, user_id):
+    """Stages a parsed upload; `lines` holds each row's line number in the uploaded file."""
+    token = uuid.uuid4().hex
+    directory = _review_dir(user_id)
+    os.makedirs(directory, exist_ok=True)
+    _prune_expired(directory)
+    path = _review_path(token, user_id)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({'rows': rows, 'lines': lines, 'matches': [m._asdict() for m in matches], 'failed_rows': failed_rows}, f, default=_json_default)
+    os.replace(tmp_path, path)
+    return token
+
+def load_staged(token, user_id):
+    """(rows, lines, matches, failed_rows) of a staged upload, or None when unknown or expired."""
+    path = _review_path(token, user_id)
+    try:
+        if not path or os.path.getmtime(path) < time.time() - REVIEW_TTL:
+            return None
+        with open(path) as f:
+            staged = json.load(f)
+        return staged['rows'], staged['lines'], [DuplicateMatch(**m) for m in staged['matches']], staged['failed_rows']
+    except (OSError, ValueError, KeyError):
+        return None
+
+def discard_staged(token, user_id):
+    path = _review_path(token, user_id)
+    if path and os.path.exists(path):
+        os.remove(path)
+
+def apply_decisions(rows, matches, decisions, lines=None):
+    """
+    Returns (rows to insert, partial updates of existing patients).
+    `decisions` maps row index -> 'skip' | 'merge' | 'keep'; missing entries use the default.
+    `lines` (file line number per row) is only used in error messages.
+    Merging fills the empty fields of the matched record with the uploaded values.
+    Raises ValueError for an unknown action, or a merge into an upload row that
+    is itself skipped or merged (its values would be lost).
+    """
+    rows = [dict(row) for row in rows]
+    line = (lambda i: lines[i]) if lines else (lambda i: i + 1)
+    actions = {match.row: decisions.get(match.row, match.default_action) for match in matches}
+    unknown = sorted(row for row, action in actions.items() if action not in ACTIONS)
+    if unknown:
+        raise ValueError(f"Unknown action for row(s) {', '.join(str(line(row)) for row in unknown)}.")
+    dropped = {row for row, action in actions.items() if action != 'keep'}
+    orphaned = [match for match in matches if actions[match.row] == 'merge' and match.upload_row is not None and match.upload_row in dropped]
+    if orphaned:
+        raise ValueError('Rows ' + ', '.join(f"{line(m.row)} (into row {line(m.upload_row)})" for m in orphaned) +
+                         ' merge into a row that is not being added. Keep that row or choose another action.')
+
+    merges = []
+    for match in matches:
+        if actions[match.row] != 'merge':
+            continue
+        uploaded = rows[match.row]
+        if match.upload_row is not None:
+            target = rows[match.upload_row]
+            for field in MERGE_FIELDS:
+                if _blank(target.get(field)) and not _blank(uploaded.get(field)):
+                    target[field] = uploaded[field]
+        elif match.existing:
+            existing = match.existing
+            update = {field: uploaded[field] for field in MERGE_FIELDS if _blank(existing.get(field)) and not _blank(uploaded.get(field))}
+            if update:
+                merges.append((match.existing['id'], update))
+    return [row for i, row in enumerate(rows) if i not in dropped], merges
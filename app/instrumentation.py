@@ -0,0 +1,143 @@
+import os
+import time
+import logging
+import threading
+import contextvars
+from urllib.parse import unquote
+from flask import g, request, has_request_context
+from postgrest._sync.request_builder import SyncQueryRequestBuilder, SyncSingleRequestBuilder
+
+# ==========================================
+# SUPABASE QUERY INSTRUMENTATION
+# ==========================================
+# Every PostgREST round trip (table queries and rpc() calls, on the global
+# client and on the fresh per-call clients alike) goes through execute() on
+# the query builders, which are wrapped here to count and time them.
+# Per request the queries are tallied by target ("patients", "rpc/...") and
+# summarised in a Server-Timing response header, so N+1 patterns show up in
+# the browser's network panel. Queries slower than SLOW_QUERY_MS are logged
+# with their filter chain, inside or outside a request.
+
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 500))
+REPEATED_QUERY_WARN = int(os.environ.get('REPEATED_QUERY_WARN', 10))
+
+logger = logging.getLogger(__name__)
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+_current_stats = contextvars.ContextVar('query_stats', default=None)
+_observers = []
+
+
+class QueryStats:
+    """Queries of one request. Shared with fan_out() threads through the copied context."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.by_target = {}   # target -> [count, total_ms]
+
+    def add(self, target, elapsed_ms):
+        with self._lock:
+            entry = self.by_target.setdefault(target, [0, 0.0])
+            entry[0] += 1
+            entry[1] += elapsed_ms
+
+    @property
+    def count(self):
+        return sum(count for count, _ in self.by_target.values())
+
+    @property
+    def total_ms(self):
+        return sum(ms for _, ms in self.by_target.values())
+
+
+def add_query_observer(func):
+    """Registers func(target, method, elapsed_seconds, ok), called after every query."""
+    _observers.append(func)
+
+def current_query_stats():
+    return _current_stats.get()
+
+def _describe(builder):
+    """('patients', 'GET', 'select=id,full_name&lga_id=eq.12') for a builder."""
+    target = builder.path.lstrip('/')
+    filters = unquote(str(builder.params)) if builder.params else ''
+    return target, builder.http_method, filters
+
+def _instrument(execute):
+    def instrumented_execute(self):
+        started = time.perf_counter()
+        ok = False
+        try:
+            result = execute(self)
+            ok = True
+            return result
+        finally:
+            elapsed = time.perf_counter() - started
+            target, method, filters = _describe(self)
+            stats = _current_stats.get()
+            if stats is not None:
+                stats.add(target, elapsed * 1000)
+            if elapsed * 1000 >= SLOW_QUERY_MS:
+                endpoint = request.endpoint if has_request_context() else 'background'
+                logger.warning("Slow query %.0fms [%s] %s /%s?%s%s", elapsed * 1000, endpoint, method, target, filters, '' if ok else ' (failed)')
+            for observer in _observers:
+                try:
+                    observer(target, method, elapsed, ok)
+                except Exception as e:
+                    logger.error("Query observer failed: %s", e)
+    instrumented_execute.__wrapped__ = execute
+    return instrumented_execute
+
+def install():
+    """Wraps the PostgREST builders once per process (MaybeSingle goes through Single)."""
+    for builder in (SyncQueryRequestBuilder, SyncSingleRequestBuilder):
+        if not hasattr(builder.execute, '__wrapped__'):
+            builder.execute = _instrument(builder.execute)
+
+# ==========================================
+# FLASK HOOKS
+# ==========================================
+
+def _server_timing(stats, detailed):
+    parts = [f'db;dur={stats.total_ms:.1f};desc="{stats.count} queries"']
+    if detailed:
+        for target, (count, ms) in sorted(stats.by_target.items(), key=lambda item: -item[1][1]):
+            name = target.replace('/', '.')
+            parts.append(f'db.{name};dur={ms:.1f};desc="{count}x"')
+    parts.append(f'app;dur={(time.perf_counter() - g.request_started) * 1000:.1f}')
+    return ', '.join(parts)
+
+def init_app(app):
+    install()
+
+    @app.before_request
+    def start_query_stats():
+        g.request_started = time.perf_counter()
+        g.query_stats_token = _current_stats.set(QueryStats())
+
+    @app.after_request
+    def add_server_timing(response):
+        stats = _current_stats.get()
+        if stats is None or 'request_started' not in g:
+            return response
+        # Per-table detail only for admins; everyone else sees the totals
+        user = g.get('user')
+        detailed = bool(user is not None and user.is_authenticated and user.role == 'supa_user')
+        response.headers.add('Server-Timing', _server_timing(stats, detailed))
+        for target, (count, ms) in stats.by_target.items():
+            if count >= REPEATED_QUERY_WARN:
+                logger.warning("Repeated query: %s ran %d times (%.0fms) in %s %s", target, count, ms, request.method, request.path)
+        return response
+
+    @app.teardown_request
+    def end_query_stats(exc=None):
+        token = g.pop('query_stats_token', None)
+        if token is not None:
+            try:
+                _current_stats.reset(token)
+            except ValueError:
+                _current_stats.set(None)
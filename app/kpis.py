@@ -0,0 +1,137 @@
+import os
+import time
+import json
+import hashlib
+import threading
+from supabase import create_client
+from . import supabase, get_high_privilege_key
+
+# ==========================================
+# PUBLIC KPI COUNTERS
+# ==========================================
+# The public_stats counters are maintained incrementally. Confirmed
+# appointments are counted by a trigger on master_appointments.status
+# (schema.sql), so status changes written outside this app (the call
+# outcomes, the Supabase dashboard) move it too. The app sends the other
+# deltas through the `increment_public_stat` RPC (an atomic UPDATE ...
+# SET stat_value = stat_value + delta). A cheap, infrequent reconciliation
+# job corrects any drift.
+#
+# Public pages read the counters from an in-process snapshot that is
+# refreshed in the background (stale-while-revalidate) and keeps serving
+# the last good value while Supabase is slow or unreachable.
+
+PATIENTS_REGISTERED = 'patients_registered'
+APPOINTMENTS_CONFIRMED = 'appointments_confirmed'
+STATES_COVERED = 'states_covered'
+
+RECONCILE_INTERVAL = int(os.environ.get('KPI_RECONCILE_SECONDS', 6 * 3600))
+SNAPSHOT_TTL = int(os.environ.get('KPI_SNAPSHOT_TTL', 30))
+DEFAULT_KPIS = {PATIENTS_REGISTERED: 0, APPOINTMENTS_CONFIRMED: 0, STATES_COVERED: 0}
+
+
+class KpiSnapshot:
+    """Process-wide copy of public_stats, served from memory and revalidated in the background."""
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._value = None
+        self._etag = None
+        self._fetched_at = 0
+        self._refreshing = False
+
+    def get(self):
+        """Returns (kpis, etag). Only the very first call in a process waits on Supabase."""
+        if self._value is None and self._fetched_at == 0:
+            self._refresh()
+        elif time.time() - self._fetched_at > self.ttl:
+            with self._lock:
+                start = not self._refreshing
+                self._refreshing = True
+            if start:
+                threading.Thread(target=self._refresh, daemon=True).start()
+        value = self._value if self._value is not None else dict(DEFAULT_KPIS)
+        return value, self._etag or self._make_etag(value)
+
+    def set_stat(self, stat_key, stat_value):
+        """Applies a known new counter value locally (after a successful delta)."""
+        with self._lock:
+            if self._value is not None:
+                value = dict(self._value)
+                value[stat_key] = stat_value
+                self._value, self._etag = value, self._make_etag(value)
+
+    def _refresh(self):
+        try:
+            url = os.environ.get("SUPABASE_URL")
+            key = get_high_privilege_key()
+            if not url or not key:
+                print("Error: KPIs missing Supabase credentials.")
+                return
+            # Fresh, dedicated connection (avoids WinError 10054 on the shared client)
+            local_supabase = create_client(url, key)
+            res = local_supabase.table('public_stats').select('stat_key, stat_value').execute()
+            value = dict(DEFAULT_KPIS)
+            value.update({item['stat_key']: item['stat_value'] for item in res.data or []})
+            with self._lock:
+                self._value, self._etag = value, self._make_etag(value)
+        except Exception as e:
+            print(f"Error refreshing KPI snapshot (serving last good value): {e}")
+        finally:
+            with self._lock:
+                self._fetched_at = time.time()
+                self._refreshing = False
+
+    @staticmethod
+    def _make_etag(value):
+        return hashlib.md5(json.dumps(value, sort_keys=True).encode()).hexdigest()
+
+
+kpi_snapshot = KpiSnapshot(SNAPSHOT_TTL)
+
+def adjust_stat(stat_key, delta, client=None):
+    """Applies a delta to one counter. Failures are logged and left to reconciliation."""
+    if not delta:
+        return
+    try:
+        res = (client or supabase).rpc('increment_public_stat', {'p_stat_key': stat_key, 'p_delta': delta}).execute()
+        if isinstance(res.data, int):
+            kpi_snapshot.set_stat(stat_key, res.data)
+    except Exception as e:
+        print(f"KPI Warning: Could not adjust {stat_key} by {delta}: {e}")
+
+def reconcile_stats(app):
+    """Recounts every KPI (head-only counts, no rows transferred) and writes them in one upsert."""
+
+    url = os.environ.get("SUPABASE_URL")
+    key = get_high_privilege_key()
+
+    if not url or not key:
+        print("KPI Scheduler: Missing Supabase credentials.")
+        return False
+
+    max_retries = 3
+    for attempt in range(max_retries):
+        try:
+            local_supabase = create_client(url, key)
+
+            patients_res = local_supabase.table('patients').select('id', count='exact', head=True).execute()
+            appointments_res = local_supabase.table('master_appointments').select('appointment_id', count='exact', head=True).eq('status', 'confirmed').execute()
+            states_res = local_supabase.table('states').select('id', count='exact', head=True).execute()
+
+            stats_to_update = [
+                {'stat_key': PATIENTS_REGISTERED, 'stat_value': patients_res.count or 0},
+                {'stat_key': APPOINTMENTS_CONFIRMED, 'stat_value': appointments_res.count or 0},
+                {'stat_key': STATES_COVERED, 'stat_value': states_res.count or 0}
+            ]
+            local_supabase.table('public_stats').upsert(stats_to_update).execute()
+
+            print(f"KPIs reconciled: Patients={stats_to_update[0]['stat_value']}, Confirmed={stats_to_update[1]['stat_value']}, States={stats_to_update[2]['stat_value']}")
+            return True
+
+        except Exception as e:
+            print(f"KPI Scheduler Warning (Attempt {attempt+1}/{max_retries}): {e}")
+            time.sleep(5)
+
+    print("!!! ERROR in KPI Scheduler: Failed to reconcile stats after multiple attempts. !!!")
+    return False
@@ -0,0 +1,317 @@
+import os
+import json
+import time
+import glob
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines
+    fcntl = None
+
+# ==========================================
+# PROMETHEUS METRICS
+# ==========================================
+# A small in-process registry of counters and fixed-bucket histograms.
+# Each gunicorn worker keeps its own values and a background thread writes
+# them every few seconds to instance/metrics/<pid>-<start ns>.json (atomic
+# replace; the start time keeps a reused PID from overwriting an old
+# worker's totals). /metrics flushes the serving worker, then sums the
+# files of all workers, so a scrape sees the whole host no matter which
+# worker answers it.
+# Every worker holds an flock on its own .lock file while alive. When a
+# worker starts, it folds the files of dead workers (lock no longer held)
+# into aggregate.json and deletes them, so counters never go backwards and
+# the directory doesn't grow with restarts. Scrapes take compact.lock
+# shared, compaction exclusive, so nothing is counted twice.
+
+FLUSH_SECONDS = 5
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+THROUGHPUT_BUCKETS = (1, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+_metrics = {}
+_values = {}         # (metric name, label tuple) -> float (counter) or [buckets..., sum, count]
+_lock = threading.Lock()
+_store_dir = None
+_dirty = False
+_flusher_pid = None
+_process_name = None  # <pid>-<start ns> of the current process
+_owner_fd = None      # flock held on <process name>.lock while this process lives
+AGGREGATE_FILE = 'aggregate.json'
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        _metrics[name] = self
+
+    def inc(self, amount=1, **labels):
+        key = (self.name, _label_values(self, labels))
+        with _lock:
+            _values[key] = _values.get(key, 0) + amount
+        _mark_dirty()
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        _metrics[name] = self
+
+    def observe(self, value, **labels):
+        key = (self.name, _label_values(self, labels))
+        with _lock:
+            entry = _values.get(key)
+            if entry is None:
+                entry = _values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+                    break
+            entry[-2] += value
+            entry[-1] += 1
+        _mark_dirty()
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+
+def _label_values(metric, labels):
+    return tuple(str(labels.get(name, '')) for name in metric.labelnames)
+
+# ==========================================
+# MULTIPROCESS STORE
+# ==========================================
+
+def _mark_dirty():
+    global _dirty, _flusher_pid
+    _dirty = True
+    if _store_dir and _flusher_pid != os.getpid():
+        # One flusher per process, restarted in each forked worker
+        _flusher_pid = os.getpid()
+        threading.Thread(target=_flush_loop, daemon=True).start()
+
+def _ensure_process():
+    """Names this process's file and takes its liveness lock (once per forked worker)."""
+    global _process_name, _owner_fd
+    if _process_name and _process_name.startswith(f"{os.getpid()}-"):
+        return _process_name
+    _process_name = f"{os.getpid()}-{time.time_ns()}"
+    if fcntl is not None:
+        _owner_fd = os.open(os.path.join(_store_dir, f"{_process_name}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(_owner_fd, fcntl.LOCK_EX)
+        compact()
+    return _process_name
+
+@contextmanager
+def _store_lock(mode):
+    if fcntl is None:
+        yield
+        return
+    fd = os.open(os.path.join(_store_dir, 'compact.lock'), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, mode)
+        yield
+    finally:
+        os.close(fd)
+
+def _read_rows(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+def _add_rows(totals, rows):
+    for name, labels, value in rows:
+        metric = _metrics.get(name)
+        if metric is None:
+            continue
+        key = (name, tuple(labels))
+        if metric.kind == 'counter':
+            totals[key] = totals.get(key, 0) + value
+        elif len(value) == len(metric.buckets) + 2:
+            current = totals.setdefault(key, [0] * len(value))
+            for i, v in enumerate(value):
+                current[i] += v
+    return totals
+
+def _write_rows(path, rows):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(rows, f)
+    os.replace(tmp_path, path)
+
+def compact():
+    """Folds the files of exited workers into aggregate.json and removes them."""
+    if not _store_dir or fcntl is None:
+        return
+    with _store_lock(fcntl.LOCK_EX):
+        dead = []
+        for lock_path in glob.glob(os.path.join(_store_dir, '*-*.lock')):
+            fd = os.open(lock_path, os.O_RDWR)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                dead.append(lock_path[:-len('.lock')])
+            except OSError:
+                pass  # still alive
+            finally:
+                os.close(fd)
+        # Files from before liveness locks existed (<pid>.json) are folded too
+        dead += [path[:-len('.json')] for path in glob.glob(os.path.join(_store_dir, '*.json'))
+                 if os.path.basename(path) != AGGREGATE_FILE and not os.path.exists(path[:-len('.json')] + '.lock')]
+        if not dead:
+            return
+        aggregate_path = os.path.join(_store_dir, AGGREGATE_FILE)
+        totals = _add_rows({}, _read_rows(aggregate_path))
+        for base in dead:
+            _add_rows(totals, _read_rows(f"{base}.json"))
+        try:
+            _write_rows(aggregate_path, [[name, list(labels), value] for (name, labels), value in totals.items()])
+            for base in dead:
+                for path in (f"{base}.json", f"{base}.lock"):
+                    if os.path.exists(path):
+                        os.remove(path)
+        except OSError as e:
+            print(f"Metrics Warning: Could not compact {_store_dir}: {e}")
+            return
+        print(f"Metrics: Folded {len(dead)} exited worker files into {AGGREGATE_FILE}.")
+
+def _flush_loop():
+    while True:
+        time.sleep(FLUSH_SECONDS)
+        if _dirty:
+            flush()
+
+def flush():
+    """Writes this process's values to its file in the shared store."""
+    global _dirty
+    if not _store_dir:
+        return
+    process_name = _ensure_process()
+    with _lock:
+        rows = [[name, list(labels), value] for (name, labels), value in _values.items()]
+        _dirty = False
+    path = os.path.join(_store_dir, f"{process_name}.json")
+    try:
+        _write_rows(path, rows)
+    except OSError as e:
+        print(f"Metrics Warning: Could not write {path}: {e}")
+
+def _collect():
+    """Values summed over every process file (or just this process without a store)."""
+    if not _store_dir:
+        with _lock:
+            return {key: (list(value) if isinstance(value, list) else value) for key, value in _values.items()}
+    flush()
+    totals = {}
+    with _store_lock(fcntl.LOCK_SH if fcntl else None):
+        for path in glob.glob(os.path.join(_store_dir, '*.json')):
+            _add_rows(totals, _read_rows(path))
+    return totals
+
+# ==========================================
+# EXPOSITION
+# ==========================================
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(str(value))}"' for name, value in pairs) + '}'
+
+def _format_number(value):
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+def render_latest():
+    """All metrics in the Prometheus text exposition format (0.0.4)."""
+    values = _collect()
+    lines = []
+    for name, metric in sorted(_metrics.items()):
+        lines.append(f"# HELP {name} {metric.documentation}")
+        lines.append(f"# TYPE {name} {metric.kind}")
+        for (metric_name, labels), value in sorted(values.items()):
+            if metric_name != name:
+                continue
+            if metric.kind == 'counter':
+                lines.append(f"{name}{_format_labels(metric.labelnames, labels)} {_format_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(metric.buckets, value):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(metric.labelnames, labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(metric.labelnames, labels, [('le', '+Inf')])} {value[-1]}")
+            lines.append(f"{name}_sum{_format_labels(metric.labelnames, labels)} {_format_number(value[-2])}")
+            lines.append(f"{name}_count{_format_labels(metric.labelnames, labels)} {value[-1]}")
+    return '\n'.join(lines) + '\n'
+
+# ==========================================
+# APPLICATION METRICS
+# ==========================================
+
+http_requests = Counter('http_requests_total', 'HTTP requests by endpoint, method and status.', ('endpoint', 'method', 'status'))
+http_latency = Histogram('http_request_duration_seconds', 'HTTP request latency by endpoint.', ('endpoint', 'method'))
+supabase_queries = Counter('supabase_queries_total', 'Supabase (PostgREST) queries by target and outcome.', ('target', 'method', 'outcome'))
+supabase_latency = Histogram('supabase_query_duration_seconds', 'Supabase (PostgREST) query latency by target.', ('target', 'method'))
+external_calls = Counter('external_calls_total', 'Calls to external services by operation and outcome.', ('service', 'operation', 'outcome'))
+external_latency = Histogram('external_call_duration_seconds', 'External service latency by operation.', ('service', 'operation'))
+cache_requests = Counter('cache_requests_total', 'Cache lookups by cache (endpoint or key prefix) and result.', ('cache', 'result'))
+job_runs = Counter('scheduler_job_runs_total', 'Scheduler job runs by outcome.', ('job', 'outcome'))
+job_duration = Histogram('scheduler_job_duration_seconds', 'Scheduler job duration.', ('job',), buckets=(0.1, 0.5, 1, 5, 15, 30, 60, 300, 900))
+bulk_upload_rows = Counter('bulk_upload_rows_total', 'Bulk upload rows by outcome.', ('outcome',))
+bulk_upload_throughput = Histogram('bulk_upload_rows_per_second', 'Bulk upload throughput per file.', buckets=THROUGHPUT_BUCKETS)
+
+@contextmanager
+def external_call(service, operation):
+    """Times one call to an external service (Gemini, Google search, ...)."""
+    started = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield
+        outcome = 'success'
+    finally:
+        external_latency.observe(time.perf_counter() - started, service=service, operation=operation)
+        external_calls.inc(service=service, operation=operation, outcome=outcome)
+
+def _observe_query(target, method, elapsed, ok):
+    # rpc names and table names are a small fixed set, safe as label values
+    supabase_latency.observe(elapsed, target=target, method=method)
+    supabase_queries.inc(target=target, method=method, outcome='success' if ok else 'error')
+
+def init_app(app):
+    """Points the store at instance/metrics and records every request and Supabase query."""
+    global _store_dir
+    from flask import g, request
+    from .instrumentation import add_query_observer
+
+    _store_dir = os.path.join(app.instance_path, 'metrics')
+    os.makedirs(_store_dir, exist_ok=True)
+    compact()
+    add_query_observer(_observe_query)
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            # Unmatched URLs share one label so scanners can't blow up cardinality
+            endpoint = request.endpoint or 'unmatched'
+            http_latency.observe(time.perf_counter() - started, endpoint=endpoint, method=request.method)
+            http_requests.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+        return response
@@ -0,0 +1,172 @@
+import os
+import io
+import re
+import hmac
+import json
+import time
+import uuid
+import glob
+import random
+import hashlib
+import pstats
+import cProfile
+from flask import g, request
+from .instrumentation import current_query_stats
+
+# ==========================================
+# ON-DEMAND REQUEST PROFILING
+# ==========================================
+# Opt-in cProfile capture of single production requests. A request is
+# profiled when it carries a valid signature for its path, either in the
+# X-Profile header or the _profile query parameter, or when it falls into
+# the PROFILE_SAMPLE_RATE fraction of requests. Signatures look like
+# "<unix ts>:<hex hmac-sha256 of '<ts>:<path>'>" keyed with PROFILE_SECRET
+# and are accepted for PROFILE_TOKEN_TTL seconds (see sign_profile_request).
+#
+# Profiles go to instance/profiles/ as .prof files (pstats format) with a
+# .json file of route and timing metadata; the newest PROFILE_MAX_FILES are
+# kept. With neither a secret nor a sample rate configured no hooks are
+# registered at all.
+# Only the request thread is profiled; fan_out() queries show up as waits.
+
+PROFILE_SECRET = os.environ.get('PROFILE_SECRET', '')
+SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+TOKEN_TTL = int(os.environ.get('PROFILE_TOKEN_TTL', 300))
+MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', 200))
+
+SORT_KEYS = ('cumulative', 'tottime', 'calls')
+_NAME_RE = re.compile(r'^[\w.-]+$')
+_profile_dir = None
+
+
+def is_enabled():
+    return bool(PROFILE_SECRET) or SAMPLE_RATE > 0
+
+def sign_profile_request(path, timestamp=None):
+    """Signature that makes the next request to `path` profiled (for the X-Profile header)."""
+    timestamp = str(int(timestamp or time.time()))
+    digest = hmac.new(PROFILE_SECRET.encode(), f"{timestamp}:{path}".encode(), hashlib.sha256).hexdigest()
+    return f"{timestamp}:{digest}"
+
+def _signature_valid(token):
+    if not PROFILE_SECRET or not token or ':' not in token:
+        return False
+    timestamp = token.split(':', 1)[0]
+    if not timestamp.isdigit() or abs(time.time() - int(timestamp)) > TOKEN_TTL:
+        return False
+    return hmac.compare_digest(token, sign_profile_request(request.path, timestamp))
+
+def _trigger():
+    """Why this request should be profiled ('signed' or 'sampled'), or None."""
+    if _signature_valid(request.headers.get('X-Profile') or request.args.get('_profile')):
+        return 'signed'
+    if SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE:
+        return 'sampled'
+    return None
+
+# ==========================================
+# STORAGE
+# ==========================================
+
+def _save(profiler, meta):
+    os.makedirs(_profile_dir, exist_ok=True)
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{(meta['endpoint'] or 'unmatched').replace('.', '-')}-{uuid.uuid4().hex[:6]}"
+    profiler.dump_stats(os.path.join(_profile_dir, f"{name}.prof"))
+    with open(os.path.join(_profile_dir, f"{name}.json"), 'w') as f:
+        json.dump(meta, f)
+    _prune()
+
+def _prune():
+    metas = sorted(glob.glob(os.path.join(_profile_dir, '*.json')))
+    for path in metas[:-MAX_FILES] if len(metas) > MAX_FILES else []:
+        for stale in (path, path[:-5] + '.prof'):
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+
+def list_profiles():
+    """Metadata of the stored profiles, newest first."""
+    if not _profile_dir:
+        return []
+    profiles = []
+    for path in sorted(glob.glob(os.path.join(_profile_dir, '*.json')), reverse=True):
+        try:
+            with open(path) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            continue
+        meta['name'] = os.path.basename(path)[:-5]
+        profiles.append(meta)
+    return profiles
+
+def profile_path(name):
+    """Path of a stored .prof file, or None for unknown or malformed names."""
+    if not _profile_dir or not _NAME_RE.match(name):
+        return None
+    path = os.path.join(_profile_dir, f"{name}.prof")
+    return path if os.path.exists(path) else None
+
+def profile_report(name, sort='cumulative', limit=60):
+    """Text report of one profile (top `limit` functions by `sort`)."""
+    path = profile_path(name)
+    if path is None:
+        return None
+    if sort not in SORT_KEYS:
+        sort = 'cumulative'
+    out = io.StringIO()
+    pstats.Stats(path, stream=out).strip_dirs().sort_stats(sort).print_stats(limit)
+    return out.getvalue()
+
+# ==========================================
+# FLASK HOOKS
+# ==========================================
+
+def init_app(app):
+    global _profile_dir
+    _profile_dir = os.path.join(app.instance_path, 'profiles')
+    if not is_enabled():
+        return
+
+    @app.before_request
+    def start_profile():
+        trigger = _trigger()
+        if trigger is None:
+            return
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            return  # another profiler is already active in this thread
+        g.profiler = (profiler, trigger, time.perf_counter())
+
+    @app.after_request
+    def note_profile_status(response):
+        if 'profiler' in g:
+            g.profile_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def stop_profile(exc=None):
+        active = g.pop('profiler', None)
+        if active is None:
+            return
+        profiler, trigger, started = active
+        profiler.disable()
+        stats = current_query_stats()
+        try:
+            _save(profiler, {
+                'path': request.path,
+                'endpoint': request.endpoint,
+                'method': request.method,
+                'status': g.get('profile_status', 500 if exc else None),
+                'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+                'queries': stats.count if stats else None,
+                'query_ms': round(stats.total_ms, 1) if stats else None,
+                'error': str(exc) if exc else None,
+                'trigger': trigger,
+                'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'pid': os.getpid(),
+            })
+        except OSError as e:
+            print(f"Profiling Warning: Could not save profile: {e}")
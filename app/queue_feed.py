@@ -0,0 +1,211 @@
+import os
+import json
+import time
+import queue
+import threading
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from . import repository
+
+# ==========================================
+# LIVE VOLUNTEER QUEUE (Server-Sent Events)
+# ==========================================
+# Each worker process with at least one open /volunteer-queue/stream keeps
+# the escalation queue in memory and follows master_appointments through
+# the (updated_at, appointment_id) index: one small query every
+# QUEUE_POLL_SECONDS, or at once when this process changes an appointment
+# (poke). Only deltas go to the browsers:
+#   upsert  a case entered the queue or changed while in it
+#   remove  a case left the queue (completed, reassigned, ...)
+# A new connection gets a snapshot from memory; a reconnect with
+# Last-Event-ID is replayed from a short event buffer instead. The poller
+# stops when nobody has been listening for IDLE_SECONDS.
+#
+# Streams hold a worker thread each, so they need threaded workers
+# (gunicorn.conf.py runs gthread) and are capped per process below the
+# thread count: gunicorn.conf.py sets QUEUE_MAX_STREAMS for each worker it
+# forks. Left at 0 (a sync or async worker, the dev server) the stream is
+# off and the page falls back to its 60 s cache. Streams close after
+# QUEUE_STREAM_SECONDS; EventSource reconnects and resumes from the buffer.
+
+QUEUE_STATUSES = ('transferred', 'human_escalation')
+POLL_SECONDS = float(os.environ.get('QUEUE_POLL_SECONDS', 3))
+MAX_STREAMS = int(os.environ.get('QUEUE_MAX_STREAMS', 0))
+ENABLED = MAX_STREAMS > 0
+STREAM_SECONDS = int(os.environ.get('QUEUE_STREAM_SECONDS', 300))
+SETTLE_SECONDS = 5          # re-read window for writes that commit late
+HEARTBEAT_SECONDS = 15
+IDLE_SECONDS = 60
+PAGE_SIZE = 500
+REPLAY_SIZE = 500
+SUBSCRIBER_BACKLOG = 1000
+RECONNECT_MS = 3000
+
+_RESET = object()           # sent to a subscriber that fell too far behind
+
+
+def _parse_ts(value):
+    ts = datetime.fromisoformat(value)
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+def _sse(event, data, event_id=None):
+    head = f"id: {event_id}\n" if event_id else ''
+    return f"{head}event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class QueueFeed:
+    def __init__(self, statuses):
+        self.statuses = frozenset(statuses)
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._subscribers = set()
+        self._idle_since = time.time()
+        self._reset_state()
+
+    def _reset_state(self):
+        self._loaded = False
+        self._token = f"{os.getpid()}.{time.time_ns()}"
+        self._seq = 0
+        self._items = {}        # appointment_id -> QueueItem currently in the queue
+        self._seen = {}         # appointment_id -> (updated_at, parsed) inside the settle window
+        self._cursor = None
+        self._events = deque(maxlen=REPLAY_SIZE)
+
+    # --- Change feed ---
+    def poke(self):
+        """Called after this process changes an appointment: poll now instead of at the next tick."""
+        if self._thread:
+            self._wake.set()
+
+    def _ensure_started(self):
+        """Loads the queue and starts the poller; the caller holds _start_lock."""
+        if self._loaded:
+            return
+        items = repository.list_queue(tuple(self.statuses))
+        with self._lock:
+            self._reset_state()
+            self._cursor = datetime.now(timezone.utc)
+            for item in items:
+                self._items[item.appointment_id] = item
+                self._seen[item.appointment_id] = (item.updated_at, _parse_ts(item.updated_at))
+            self._loaded = True
+        if not self._thread:
+            self._thread = threading.Thread(target=self._run, name='queue-feed', daemon=True)
+            self._thread.start()
+        print(f"Queue Feed: Following {len(items)} queued cases.")
+
+    def _run(self):
+        while True:
+            self._wake.wait(POLL_SECONDS)
+            self._wake.clear()
+            with self._start_lock, self._lock:
+                if not self._subscribers and time.time() - self._idle_since > IDLE_SECONDS:
+                    self._reset_state()
+                    self._thread = None
+                    print("Queue Feed: No listeners, stopped.")
+                    return
+            try:
+                self._poll()
+            except Exception as e:
+                print(f"Queue Feed Warning: poll failed: {e}")
+
+    def _poll(self):
+        since = (self._cursor - timedelta(seconds=SETTLE_SECONDS)).isoformat()
+        after = None
+        while True:
+            items = repository.list_appointment_changes(since, after, PAGE_SIZE)
+            with self._lock:
+                for item in items:
+                    self._apply(item)
+            if len(items) < PAGE_SIZE:
+                break
+            after = (items[-1].updated_at, items[-1].appointment_id)
+        with self._lock:
+            horizon = self._cursor - timedelta(seconds=SETTLE_SECONDS)
+            self._seen = {key: seen for key, seen in self._seen.items() if seen[1] >= horizon}
+
+    def _apply(self, item):
+        key = item.appointment_id
+        if self._seen.get(key, (None,))[0] == item.updated_at:
+            return      # already sent (settle window overlap)
+        ts = _parse_ts(item.updated_at)
+        self._seen[key] = (item.updated_at, ts)
+        self._cursor = max(self._cursor, min(ts, datetime.now(timezone.utc)))
+        if item.status in self.statuses:
+            self._items[key] = item
+            self._publish({'op': 'upsert', 'item': item._asdict()})
+        elif self._items.pop(key, None):
+            self._publish({'op': 'remove', 'id': key})
+
+    def _publish(self, delta):
+        self._seq += 1
+        event_id = f"{self._token}:{self._seq}"
+        message = _sse('queue', delta, event_id)
+        self._events.append((self._seq, message))
+        for subscriber in self._subscribers:
+            try:
+                subscriber.put_nowait(message)
+            except queue.Full:
+                with subscriber.mutex:
+                    subscriber.queue.clear()
+                subscriber.put_nowait(_RESET)
+
+    # --- Subscribers ---
+    def _snapshot(self):
+        items = sorted(self._items.values(), key=lambda item: item.updated_at or '', reverse=True)
+        return _sse('snapshot', {'items': [item._asdict() for item in items]}, f"{self._token}:{self._seq}")
+
+    def _replay(self, last_event_id):
+        """Buffered messages after last_event_id, or None when it can't be resumed."""
+        token, _, seq = (last_event_id or '').rpartition(':')
+        if token != self._token or not seq.isdigit():
+            return None
+        seq = int(seq)
+        if self._events and seq < self._events[0][0] - 1:
+            return None
+        return [message for event_seq, message in self._events if event_seq > seq]
+
+    def subscribe(self, last_event_id=None):
+        """(subscriber, opening messages), or None when this process is at MAX_STREAMS."""
+        subscriber = queue.Queue(maxsize=SUBSCRIBER_BACKLOG)
+        with self._start_lock:
+            if len(self._subscribers) >= MAX_STREAMS:
+                return None
+            self._ensure_started()
+            with self._lock:
+                # Taken under the publish lock: nothing is missed or sent twice
+                opening = self._replay(last_event_id)
+                if opening is None:
+                    opening = [self._snapshot()]
+                self._subscribers.add(subscriber)
+        return subscriber, opening
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+            if not self._subscribers:
+                self._idle_since = time.time()
+
+    def stream(self, subscriber, opening):
+        """SSE text for one connection, closed after STREAM_SECONDS."""
+        try:
+            yield f"retry: {RECONNECT_MS}\n\n"
+            yield from opening
+            deadline = time.time() + STREAM_SECONDS
+            while (remaining := deadline - time.time()) > 0:
+                try:
+                    message = subscriber.get(timeout=min(HEARTBEAT_SECONDS, remaining))
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                if message is _RESET:
+                    with self._lock:
+                        message = self._snapshot()
+                yield message
+        finally:
+            self.unsubscribe(subscriber)
+
+
+queue_feed = QueueFeed(QUEUE_STATUSES)
@@ -0,0 +1,118 @@
+import os
+import time
+import threading
+from types import MappingProxyType
+from typing import NamedTuple
+from . import supabase
+from .caching import invalidate, LOCATIONS
+
+# ==========================================
+# REFERENCE DATA (states, LGAs, enumerations)
+# ==========================================
+# States and LGAs are loaded once per process into an immutable snapshot and
+# served from memory. seed_loc.py bumps REFERENCE_DATA_VERSION in app_settings
+# after reseeding; each process checks that single row at most once every
+# REFERENCE_CHECK_SECONDS and reloads when it has changed.
+# The enumerations mirror the CHECK constraints in schema.sql.
+
+LANGUAGES = ('English', 'Yoruba', 'Hausa', 'Igbo', 'Pidgin')
+SERVICE_TYPES = ('Antenatal Care', 'Postnatal Care', 'Childbirth Delivery', 'Immunization', 'Vaccination', 'Family Planning', 'General')
+APPOINTMENT_STATUSES = ('pending', 'confirmed', 'rescheduled', 'transferred', 'unreachable', 'calling', 'human_escalation', 'failed_escalation', 'completed')
+GENDERS = ('Male', 'Female')
+BLOOD_GROUPS = ('A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-')
+GENOTYPES = ('AA', 'AS', 'SS', 'AC', 'SC')
+ROLES = ('volunteer', 'local', 'state', 'national', 'supa_user')
+
+VERSION_SETTING_KEY = 'REFERENCE_DATA_VERSION'
+CHECK_INTERVAL = int(os.environ.get('REFERENCE_CHECK_SECONDS', 60))
+RETRY_SECONDS = 5
+
+
+class State(NamedTuple):
+    id: str
+    name: str
+
+
+class Lga(NamedTuple):
+    id: str
+    name: str
+    state_id: str
+
+
+class LocationSnapshot(NamedTuple):
+    version: str
+    states: tuple               # State, sorted by name
+    lgas_by_state: MappingProxyType   # state_id -> tuple of Lga, sorted by name
+    state_by_id: MappingProxyType
+    lga_by_id: MappingProxyType
+
+    def lgas_for_state(self, state_id):
+        return self.lgas_by_state.get(str(state_id), ())
+
+    def name_maps(self):
+        """(state name -> id, '<state_id>_<lga name>' -> id), lower-cased, for bulk uploads."""
+        state_map = {s.name.lower(): s.id for s in self.states}
+        lga_map = {f"{lga.state_id}_{lga.name.lower()}": lga.id for lga in self.lga_by_id.values()}
+        return state_map, lga_map
+
+
+EMPTY_SNAPSHOT = LocationSnapshot(None, (), MappingProxyType({}), MappingProxyType({}), MappingProxyType({}))
+
+
+class ReferenceDataService:
+    def __init__(self, check_interval):
+        self.check_interval = check_interval
+        self._snapshot = None
+        self._checked_at = 0
+        self._lock = threading.Lock()
+
+    def locations(self):
+        """The current snapshot; checks the version row at most once per interval."""
+        if time.time() - self._checked_at > self.check_interval:
+            with self._lock:
+                if time.time() - self._checked_at > self.check_interval:
+                    self._refresh()
+        return self._snapshot or EMPTY_SNAPSHOT
+
+    def _refresh(self):
+        try:
+            version = self._current_version()
+            if self._snapshot is None or version != self._snapshot.version:
+                reseeded = self._snapshot is not None
+                self._snapshot = self._load(version)
+                print(f"Reference data loaded (version {version}): {len(self._snapshot.states)} states, {len(self._snapshot.lga_by_id)} LGAs.")
+                if reseeded:
+                    # Cached pages built from the old locations must not survive a reseed
+                    invalidate(LOCATIONS)
+            self._checked_at = time.time()
+        except Exception as e:
+            print(f"Error loading reference data (keeping previous snapshot): {e}")
+            # Retry soon rather than after a full interval
+            self._checked_at = time.time() - self.check_interval + RETRY_SECONDS
+
+    def _current_version(self):
+        res = supabase.table('app_settings').select('setting_value').eq('setting_key', VERSION_SETTING_KEY).limit(1).execute()
+        return res.data[0]['setting_value'] if res.data else None
+
+    def _load(self, version):
+        states_res = supabase.table('states').select('id, name').order('name').execute()
+        lgas_res = supabase.table('lgas').select('id, name, state_id').order('name').execute()
+
+        states = tuple(State(s['id'], s['name']) for s in states_res.data or [])
+        lgas_by_state = {}
+        lga_by_id = {}
+        for row in lgas_res.data or []:
+            lga = Lga(row['id'], row['name'], row['state_id'])
+            lgas_by_state.setdefault(lga.state_id, []).append(lga)
+            lga_by_id[lga.id] = lga
+
+        return LocationSnapshot(
+            version=version,
+            states=states,
+            lgas_by_state=MappingProxyType({k: tuple(v) for k, v in lgas_by_state.items()}),
+            state_by_id=MappingProxyType({s.id: s for s in states}),
+            lga_by_id=MappingProxyType(lga_by_id),
+        )
+
+
+reference_data = ReferenceDataService(CHECK_INTERVAL)
@@ -0,0 +1,243 @@
+import os
+import heapq
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from supabase import create_client
+from .utils import keyset_after
+from .caching import invalidate, APPOINTMENTS
+
+# ==========================================
+# EVENT-DRIVEN REMINDER DISPATCHER
+# ==========================================
+# Keeps a min-heap of (reminder due time, appointment) for every confirmed,
+# upcoming appointment and fires each reminder on a worker pool when it is
+# due, instead of re-scanning a whole day window every hour.
+#
+# The heap is loaded once, then kept current incrementally:
+#   * delta pulls of rows whose updated_at moved past the last watermark
+#     (periodically, and whenever another worker touches the dirty marker),
+#     re-reading SETTLE_SECONDS behind it: updated_at is stamped when a
+#     transaction starts, so a slow one can commit behind the watermark;
+#   * direct notify() calls from schedule/edit views in the leader process.
+# It runs only in the scheduler leader (see app/scheduler.py).
+
+REMINDER_LEAD_HOURS = float(os.environ.get('REMINDER_LEAD_HOURS', 24))
+REMINDER_WORKERS = int(os.environ.get('REMINDER_WORKERS', 4))
+PAGE_SIZE = 1000
+MARKER_POLL_SECONDS = 1.0
+SETTLE_SECONDS = 5          # re-read window for writes that commit late
+
+def parse_timestamp(value):
+    """Parses a Supabase timestamp (naive values are treated as UTC) to epoch seconds."""
+    dt = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+class ReminderDispatcher:
+    def __init__(self, lead_seconds, workers):
+        self.lead_seconds = lead_seconds
+        self.workers = workers
+        self._heap = []       # (due_ts, appointment_id)
+        self._due = {}        # appointment_id -> due_ts of its live heap entry
+        self._cond = threading.Condition()
+        self._sync_lock = threading.Lock()
+        self._cursor = None   # epoch seconds of the newest updated_at applied
+        self._seen = {}       # appointment_id -> (updated_at, epoch) inside the settle window
+        self._marker_mtime = 0
+        self._marker_path = None
+        self._client = None
+        self._pool = None
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    # --- Loading ---
+    def _get_client(self):
+        if self._client is None:
+            self._client = create_client(os.environ.get("SUPABASE_URL"), os.environ.get("SUPABASE_KEY"))
+        return self._client
+
+    def _initial_load(self):
+        client = self._get_client()
+        # Take the watermark first so rows changed during the load are re-read by the next delta
+        latest = client.table('master_appointments').select('updated_at')\
+            .order('updated_at', desc=True).limit(1).execute().data
+        cursor = min(parse_timestamp(latest[0]['updated_at']), time.time()) if latest else time.time()
+
+        now_iso = datetime.now(timezone.utc).isoformat()
+        start = 0
+        while True:
+            rows = client.table('master_appointments')\
+                .select('appointment_id, status, appointment_datetime')\
+                .eq('status', 'confirmed')\
+                .gte('appointment_datetime', now_iso)\
+                .order('appointment_id')\
+                .range(start, start + PAGE_SIZE - 1)\
+                .execute().data or []
+            for row in rows:
+                self.schedule(row)
+            if len(rows) < PAGE_SIZE:
+                break
+            start += PAGE_SIZE
+        self._cursor, self._seen = cursor, {}
+
+    def _delta_load(self):
+        client = self._get_client()
+        since = datetime.fromtimestamp(self._cursor - SETTLE_SECONDS, timezone.utc).isoformat()
+        loaded, after = 0, None
+        while True:
+            query = client.table('master_appointments')\
+                .select('appointment_id, status, appointment_datetime, updated_at')\
+                .gte('updated_at', since)\
+                .order('updated_at').order('appointment_id')\
+                .limit(PAGE_SIZE)
+            if after:
+                query = keyset_after(query, 'updated_at', 'appointment_id', *after)
+            rows = query.execute().data or []
+            for row in rows:
+                loaded += self._apply(row)
+            if len(rows) < PAGE_SIZE:
+                break
+            after = (rows[-1]['updated_at'], rows[-1]['appointment_id'])
+        horizon = self._cursor - SETTLE_SECONDS
+        self._seen = {key: seen for key, seen in self._seen.items() if seen[1] >= horizon}
+        return loaded
+
+    def _apply(self, row):
+        """Schedules one changed row unless this version was already read in the settle window."""
+        key = row['appointment_id']
+        if self._seen.get(key, (None,))[0] == row['updated_at']:
+            return 0
+        ts = parse_timestamp(row['updated_at'])
+        self._seen[key] = (row['updated_at'], ts)
+        self._cursor = max(self._cursor, min(ts, time.time()))
+        self.schedule(row)
+        return 1
+
+    def sync(self, app):
+        """Scheduler job: starts the dispatcher on first call, then pulls deltas."""
+        with self._sync_lock:
+            if not self.running:
+                self._marker_path = marker_path(app)
+                self._initial_load()
+                self._start()
+                print(f"Reminders: Dispatcher started with {len(self._due)} pending reminders.")
+                return True
+            loaded = self._delta_load()
+            if loaded:
+                print(f"Reminders: Applied {loaded} changed appointments.")
+            return True
+
+    # --- Heap maintenance ---
+    def schedule(self, row):
+        """Adds, moves or cancels the reminder for one appointment row."""
+        appointment_id = row['appointment_id']
+        due = None
+        if row.get('status') == 'confirmed' and row.get('appointment_datetime'):
+            appointment_ts = parse_timestamp(row['appointment_datetime'])
+            if appointment_ts > time.time():
+                due = appointment_ts - self.lead_seconds
+
+        with self._cond:
+            if due is None:
+                # Lazy deletion: the stale heap entry is skipped when popped
+                self._due.pop(appointment_id, None)
+                return
+            if self._due.get(appointment_id) == due:
+                return
+            self._due[appointment_id] = due
+            heapq.heappush(self._heap, (due, appointment_id))
+            self._cond.notify()
+
+    def pending(self):
+        with self._cond:
+            return len(self._due)
+
+    # --- Dispatch ---
+    def _start(self):
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='reminder')
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _pop_due(self):
+        """Blocks until a reminder is due (or the marker poll interval passes)."""
+        with self._cond:
+            while self._heap:
+                due, appointment_id = self._heap[0]
+                if self._due.get(appointment_id) != due:
+                    heapq.heappop(self._heap)
+                    continue
+                wait = due - time.time()
+                if wait <= 0:
+                    heapq.heappop(self._heap)
+                    del self._due[appointment_id]
+                    return appointment_id
+                self._cond.wait(min(wait, MARKER_POLL_SECONDS))
+                return None
+            self._cond.wait(MARKER_POLL_SECONDS)
+            return None
+
+    def _run(self):
+        while True:
+            try:
+                appointment_id = self._pop_due()
+                if appointment_id:
+                    self._pool.submit(self._fire, appointment_id)
+                elif self._marker_changed():
+                    with self._sync_lock:
+                        self._delta_load()
+            except Exception as e:
+                print(f"Reminders Warning: {e}")
+                time.sleep(5)
+
+    def _fire(self, appointment_id):
+        try:
+            # Guard on status: a row changed since it was queued is left alone
+            res = self._get_client().table('master_appointments').update({
+                'status': 'calling',
+                'last_call_timestamp': datetime.now().isoformat(),
+            }).eq('appointment_id', appointment_id).eq('status', 'confirmed').execute()
+            if res.data:
+                invalidate(APPOINTMENTS)
+                print(f" -> Triggered reminder for appointment {appointment_id}")
+        except Exception as e:
+            print(f"Reminders Warning: Could not flag {appointment_id}: {e}")
+
+    def _marker_changed(self):
+        try:
+            mtime = os.stat(self._marker_path).st_mtime
+        except OSError:
+            return False
+        if mtime != self._marker_mtime:
+            self._marker_mtime = mtime
+            return True
+        return False
+
+
+reminder_dispatcher = ReminderDispatcher(REMINDER_LEAD_HOURS * 3600, REMINDER_WORKERS)
+
+def marker_path(app):
+    os.makedirs(app.instance_path, exist_ok=True)
+    return os.path.join(app.instance_path, 'reminders.dirty')
+
+def notify_appointment_changed(app, rows):
+    """
+    Called after an appointment is created or edited. Applied directly when
+    the dispatcher lives in this process, otherwise the leader is woken up
+    through the dirty marker and pulls the change by updated_at.
+    """
+    if reminder_dispatcher.running:
+        for row in rows or []:
+            reminder_dispatcher.schedule(row)
+        return
+    try:
+        with open(marker_path(app), 'a'):
+            os.utime(marker_path(app), None)
+    except OSError as e:
+        print(f"Reminders Warning: Could not touch marker: {e}")
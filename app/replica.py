@@ -0,0 +1,258 @@
+import os
+import time
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+from flask import request
+from .utils import keyset_after
+from .reference import reference_data
+from .caching import invalidate, REPLICA
+from . import supabase
+
+# ==========================================
+# LOCAL READ REPLICA (SQLite)
+# ==========================================
+# An optional copy of the columns the analytics views read from patients
+# and master_appointments, in one SQLite file (WAL) under instance/ shared
+# by every worker. The scheduler leader keeps it current with delta pulls
+# by (updated_at, id); the other workers only read. Aggregations run as
+# indexed GROUP BY queries locally instead of shipping every row from
+# Supabase. States and LGAs come from the in-memory reference data.
+#
+# READ_REPLICA=1 turns it on; REPLICA_ROUTES lists the endpoints that read
+# from it. A route falls back to Supabase while the replica is empty or more
+# than REPLICA_MAX_LAG seconds behind. Deletes are not visible to delta
+# pulls, so every REPLICA_RESYNC_SECONDS a full pass drops rows that are gone.
+
+ENABLED = os.environ.get('READ_REPLICA', '0').lower() in ('1', 'true', 'yes')
+ROUTES = frozenset(r.strip() for r in os.environ.get(
+    'REPLICA_ROUTES', 'api.dashboard_data,api.histogram_data,api.download_report').split(',') if r.strip())
+SYNC_INTERVAL = int(os.environ.get('REPLICA_SYNC_SECONDS', 15))
+MAX_LAG = int(os.environ.get('REPLICA_MAX_LAG', 300))
+RESYNC_SECONDS = int(os.environ.get('REPLICA_RESYNC_SECONDS', 86400))
+SETTLE_SECONDS = 5     # rows newer than this may belong to transactions still in flight
+PAGE_SIZE = 1000
+
+# table -> (primary key, replicated columns)
+TABLES = {
+    'patients': ('id', ('id', 'full_name', 'phone_number', 'emergency_contact_name', 'lga_id', 'updated_at')),
+    'master_appointments': ('appointment_id', ('appointment_id', 'patient_id', 'appointment_datetime', 'service_type', 'status', 'updated_at')),
+}
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS patients ("
+    " id TEXT PRIMARY KEY, full_name TEXT, phone_number TEXT, emergency_contact_name TEXT,"
+    " lga_id TEXT, updated_at TEXT, gen INTEGER NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS master_appointments ("
+    " appointment_id TEXT PRIMARY KEY, patient_id TEXT, appointment_datetime TEXT,"
+    " service_type TEXT, status TEXT, updated_at TEXT, gen INTEGER NOT NULL)",
+    # Covering indexes: each analytics query is answered from the index alone
+    "CREATE INDEX IF NOT EXISTS idx_patients_lga ON patients(lga_id)",
+    "CREATE INDEX IF NOT EXISTS idx_appt_datetime ON master_appointments(appointment_datetime, service_type, status, patient_id)",
+    "CREATE INDEX IF NOT EXISTS idx_appt_service ON master_appointments(service_type, status, appointment_datetime, patient_id)",
+    "CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value TEXT)",
+)
+
+
+def _utc(value):
+    """ISO timestamps (or dates) normalised to UTC, so they compare correctly as text."""
+    if not value:
+        return value
+    dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)   # like Postgres, whose session time zone is UTC
+    return dt.astimezone(timezone.utc).isoformat()
+
+
+class ReadReplica:
+    def __init__(self):
+        self.path = None
+        self._local = threading.local()
+
+    def init_app(self, app):
+        self.path = os.path.join(app.instance_path, 'replica', 'replica.sqlite3')
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        for statement in _SCHEMA:
+            conn.execute(statement)
+
+    # One connection per thread, never shared across a fork
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _get_state(self, key, default=None):
+        row = self._connect().execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    # --- Status ---
+    def status(self):
+        """Whether the replica is on, how far behind Supabase it is, and its row counts."""
+        if not ENABLED or not self.path:
+            return {'enabled': False}
+        synced_through = self._get_state('synced_through')
+        conn = self._connect()
+        return {
+            'enabled': True,
+            'routes': sorted(ROUTES),
+            'synced_through': synced_through,
+            'last_sync': self._get_state('last_sync'),
+            'last_full_sync': self._get_state('last_full_sync'),
+            'lag_seconds': round(self.lag(), 1) if synced_through else None,
+            'rows': {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in TABLES},
+        }
+
+    def lag(self):
+        """Seconds of changes the replica may be missing (inf before the first sync)."""
+        synced_through = self._get_state('synced_through')
+        if not synced_through:
+            return float('inf')
+        return (datetime.now(timezone.utc) - datetime.fromisoformat(synced_through)).total_seconds()
+
+    def use_for(self, endpoint=None):
+        """True if `endpoint` (default: the current one) should read from the replica."""
+        if not ENABLED or not self.path or (endpoint or request.endpoint) not in ROUTES:
+            return False
+        try:
+            return self.lag() <= MAX_LAG
+        except sqlite3.Error as e:
+            print(f"Replica Warning: {e}")
+            return False
+
+    # --- Sync (scheduler leader only) ---
+    def sync(self, app):
+        """Scheduler job: pulls rows changed since the last watermark into the replica."""
+        if not ENABLED:
+            return True
+        conn = self._connect()
+        cutoff = (datetime.now(timezone.utc) - timedelta(seconds=SETTLE_SECONDS)).isoformat()
+        last_full = float(self._get_state('last_full_sync_ts', 0))
+        full = time.time() - last_full > RESYNC_SECONDS
+        gen = int(self._get_state('gen', 0)) + (1 if full else 0)
+
+        changed = 0
+        for table, (pk, columns) in TABLES.items():
+            changed += self._pull(conn, table, pk, columns, cutoff, gen, full)
+        if full:
+            for table in TABLES:
+                changed += conn.execute(f"DELETE FROM {table} WHERE gen < ?", (gen,)).rowcount
+
+        state = {'synced_through': cutoff, 'last_sync': datetime.now(timezone.utc).isoformat(), 'gen': str(gen)}
+        if full:
+            state.update(last_full_sync=state['last_sync'], last_full_sync_ts=str(time.time()))
+        conn.executemany("INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)", state.items())
+        if changed:
+            # Cached responses built from the replica must follow it, not the primary's writes
+            invalidate(REPLICA)
+        if full or changed:
+            print(f"Replica: synced {changed} changes{' (full pass)' if full else ''}.")
+        return True
+
+    def _pull(self, conn, table, pk, columns, cutoff, gen, full):
+        watermark_key = f"watermark:{table}"
+        watermark = None if full else self._get_state(watermark_key)
+        watermark = tuple(watermark.split('|', 1)) if watermark else None
+        placeholders = ', '.join('?' * (len(columns) + 1))
+        insert = f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}, gen) VALUES ({placeholders})"
+        pulled = 0
+        while True:
+            query = supabase.table(table).select(', '.join(columns)).lt('updated_at', cutoff).order('updated_at').order(pk)
+            if watermark:
+                query = keyset_after(query, 'updated_at', pk, *watermark)
+            rows = query.limit(PAGE_SIZE).execute().data or []
+            if not rows:
+                return pulled
+            values = [tuple(_utc(row[c]) if c in ('updated_at', 'appointment_datetime') else row[c] for c in columns) + (gen,) for row in rows]
+            watermark = (rows[-1]['updated_at'], rows[-1][pk])
+            # One transaction per page: the rows and the watermark move together
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(insert, values)
+                conn.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)", (watermark_key, '|'.join(watermark)))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            pulled += len(rows)
+            if len(rows) < PAGE_SIZE:
+                return pulled
+
+    # --- Queries ---
+    def _appointment_filters(self, filters):
+        """WHERE clause and parameters for the filters shared by the analytics views."""
+        clauses, params = [], []
+        if filters.get('start'):
+            clauses.append("a.appointment_datetime >= ?")
+            params.append(_utc(filters['start']))
+        if filters.get('end'):
+            clauses.append("a.appointment_datetime <= ?" if filters.get('end_inclusive', True) else "a.appointment_datetime < ?")
+            params.append(_utc(filters['end']))
+        for column in ('service_type', 'status'):
+            if filters.get(column):
+                clauses.append(f"a.{column} = ?")
+                params.append(filters[column])
+        lga_ids = None
+        if filters.get('lga_id'):
+            lga_ids = [filters['lga_id']]
+        elif filters.get('state_id'):
+            lga_ids = [lga.id for lga in reference_data.locations().lgas_for_state(filters['state_id'])]
+        if lga_ids is not None:
+            clauses.append(f"p.lga_id IN ({', '.join('?' * len(lga_ids))})" if lga_ids else "0")
+            params.extend(lga_ids)
+        return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+    def appointments(self, start=None, end=None):
+        """Rows shaped like dashboard_data's Supabase query (service_type, status, appointment_datetime)."""
+        where, params = self._appointment_filters({'start': start, 'end': end})
+        cursor = self._connect().execute(
+            f"SELECT service_type, status, appointment_datetime FROM master_appointments a{where}", params)
+        return [{'service_type': s, 'status': st, 'appointment_datetime': dt} for s, st, dt in cursor]
+
+    def patients_by_state(self):
+        """{state name: patient count} for the dashboard map."""
+        locations = reference_data.locations()
+        counts = {}
+        for lga_id, count in self._connect().execute(
+                "SELECT lga_id, COUNT(*) FROM patients WHERE lga_id IS NOT NULL GROUP BY lga_id"):
+            lga = locations.lga_by_id.get(lga_id)
+            state = locations.state_by_id.get(lga.state_id) if lga else None
+            if state:
+                counts[state.name] = counts.get(state.name, 0) + count
+        return dict(sorted(counts.items(), key=lambda item: -item[1]))
+
+    def service_counts(self, filters):
+        """[(service_type, count)] by descending count, for histogram_data."""
+        where, params = self._appointment_filters(filters)
+        join = " JOIN patients p ON p.id = a.patient_id" if filters.get('lga_id') or filters.get('state_id') else ""
+        return self._connect().execute(
+            f"SELECT a.service_type, COUNT(*) AS n FROM master_appointments a{join}{where}"
+            f"{' AND' if where else ' WHERE'} a.service_type IS NOT NULL GROUP BY a.service_type ORDER BY n DESC", params).fetchall()
+
+    def iter_report_pages(self, filters, page_size=PAGE_SIZE):
+        """Same pages as reports.iter_report_pages, read from the replica."""
+        locations = reference_data.locations()
+        where, params = self._appointment_filters(dict(filters, end_inclusive=False))
+        cursor = self._connect().execute(
+            "SELECT a.appointment_datetime, a.service_type, a.status, p.full_name, p.phone_number,"
+            " p.lga_id, p.emergency_contact_name"
+            f" FROM master_appointments a LEFT JOIN patients p ON p.id = a.patient_id{where}"
+            " ORDER BY a.appointment_datetime, a.appointment_id", params)
+        while True:
+            rows = cursor.fetchmany(page_size)
+            if not rows:
+                return
+            page = []
+            for when, service, status, name, phone, lga_id, contact in rows:
+                lga = locations.lga_by_id.get(lga_id)
+                state = locations.state_by_id.get(lga.state_id) if lga else None
+                page.append((when, service, status, name or 'N/A', phone or 'N/A',
+                             state.name if state else 'N/A', lga.name if lga else 'N/A', contact or ''))
+            yield page
+
+
+read_replica = ReadReplica()
@@ -0,0 +1,142 @@
+import io
+import csv
+import tempfile
+from datetime import date, datetime, timedelta
+from .utils import keyset_after
+from . import supabase
+
+# ==========================================
+# APPOINTMENT REPORTS (CSV / XLSX / Parquet)
+# ==========================================
+# Rows are fetched in keyset pages and written as they arrive, so memory
+# stays bounded by one page (plus one Parquet row group) however large the
+# report. XLSX uses openpyxl's write-only mode; Parquet needs the optional
+# pyarrow package and dictionary-encodes the low-cardinality columns.
+
+PAGE_SIZE = 1000
+PARQUET_ROW_GROUP = 50000
+SPOOL_LIMIT = 8 * 1024 * 1024   # finished files above this spill to disk
+
+COLUMNS = ('Date', 'Service', 'Status', 'Patient Name', 'Phone', 'State', 'LGA', 'Emergency Contact')
+DICTIONARY_COLUMNS = ('Service', 'Status', 'State', 'LGA')
+
+REPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+_SELECT = ('appointment_id, appointment_datetime, service_type, status, '
+           'patients(full_name, phone_number, emergency_contact_name, lgas(name, states(name)))')
+
+
+def parse_filters(form):
+    """Report filters from the reports.html form; ValueError on a malformed date."""
+    filters = {}
+    if form.get('start_date'):
+        filters['start'] = date.fromisoformat(form['start_date']).isoformat()
+    if form.get('end_date'):
+        # Inclusive end date: everything before the following midnight
+        filters['end'] = (date.fromisoformat(form['end_date']) + timedelta(days=1)).isoformat()
+    for key in ('service_type', 'status'):
+        if form.get(key) and form[key] != 'all':
+            filters[key] = form[key]
+    return filters
+
+def _flatten(row):
+    pt = row.get('patients') or {}
+    loc = pt.get('lgas') or {}
+    state = loc.get('states') or {}
+    return (
+        row.get('appointment_datetime'),
+        row.get('service_type'),
+        row.get('status'),
+        pt.get('full_name', 'N/A'),
+        pt.get('phone_number', 'N/A'),
+        state.get('name', 'N/A'),
+        loc.get('name', 'N/A'),
+        pt.get('emergency_contact_name', ''),
+    )
+
+def iter_report_pages(filters):
+    """Flattened report rows (tuples in COLUMNS order), one list per keyset page."""
+    cursor = None
+    while True:
+        query = supabase.table('master_appointments').select(_SELECT)
+        if 'start' in filters:
+            query = query.gte('appointment_datetime', filters['start'])
+        if 'end' in filters:
+            query = query.lt('appointment_datetime', filters['end'])
+        if 'service_type' in filters:
+            query = query.eq('service_type', filters['service_type'])
+        if 'status' in filters:
+            query = query.eq('status', filters['status'])
+        if cursor:
+            query = keyset_after(query, 'appointment_datetime', 'appointment_id', *cursor)
+        rows = query.order('appointment_datetime').order('appointment_id').limit(PAGE_SIZE).execute().data or []
+        if rows:
+            yield [_flatten(row) for row in rows]
+        if len(rows) < PAGE_SIZE:
+            return
+        cursor = (rows[-1]['appointment_datetime'], rows[-1]['appointment_id'])
+
+# ==========================================
+# WRITERS (take an iterator of pages)
+# ==========================================
+
+def stream_csv(pages):
+    """CSV text, one chunk per page (sent while later pages are still being fetched)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for page in pages:
+        writer.writerows(page)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+def write_xlsx(pages):
+    """An .xlsx file object, written row by row with openpyxl's write-only workbook."""
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Appointments')
+    sheet.append(COLUMNS)
+    for page in pages:
+        for row in page:
+            sheet.append(row)
+    out = tempfile.SpooledTemporaryFile(max_size=SPOOL_LIMIT)
+    workbook.save(out)
+    out.seek(0)
+    return out
+
+def write_parquet(pages):
+    """A .parquet file object; raises ImportError when pyarrow is not installed."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ('Date', pa.timestamp('us', tz='UTC')),
+        *((name, pa.dictionary(pa.int32(), pa.string()) if name in DICTIONARY_COLUMNS else pa.string()) for name in COLUMNS[1:]),
+    ])
+    out = tempfile.SpooledTemporaryFile(max_size=SPOOL_LIMIT)
+    with pq.ParquetWriter(out, schema, compression='zstd') as writer:
+        batch = []
+
+        def flush():
+            columns = list(zip(*batch))
+            dates = [datetime.fromisoformat(value) if value else None for value in columns[0]]
+            arrays = [pa.array(dates, type=schema.field('Date').type)]
+            arrays += [pa.array(values, type=pa.string()).dictionary_encode() if name in DICTIONARY_COLUMNS else pa.array(values, type=pa.string())
+                       for name, values in zip(COLUMNS[1:], columns[1:])]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            batch.clear()
+
+        for page in pages:
+            batch.extend(page)
+            if len(batch) >= PARQUET_ROW_GROUP:
+                flush()
+        if batch:
+            flush()
+    out.seek(0)
+    return out
@@ -0,0 +1,281 @@
+from typing import NamedTuple
+from .utils import keyset_after, keyset_before, cursor_timestamp, cursor_id
+from . import supabase
+
+# ==========================================
+# DATA ACCESS (typed records, explicit columns)
+# ==========================================
+# One function per query shape used by the pages. Each selects only the
+# columns its page renders and returns NamedTuples, whose rows cost a
+# fraction of a dict's memory and can't grow stray keys. Joined names are
+# flattened onto the record (lga_name, state_name) instead of nested dicts.
+# Jinja reads record fields the same way it read dict keys.
+#
+# Background jobs and the analytics aggregations (kpis.py, reminders.py,
+# scheduler.py, reports.py, api.dashboard_data) already select explicit
+# columns and keep their own queries.
+
+
+def _lga(row):
+    return (row or {}).get('lgas') or {}
+
+def _state(row):
+    return _lga(row).get('states') or {}
+
+# --- Patients ---
+class PatientListItem(NamedTuple):
+    id: str
+    full_name: str
+    phone_number: str
+    lga_name: str
+    state_name: str
+
+
+class Patient(NamedTuple):
+    id: str
+    full_name: str
+    phone_number: str
+    lga_id: str
+    state_id: str
+    gender: str
+    age: int
+    blood_group: str
+    genotype: str
+    emergency_contact_name: str
+    emergency_contact_phone: str
+    spoken_languages: list
+
+
+class PatientSummary(NamedTuple):
+    id: str
+    full_name: str
+    phone_number: str
+
+
+def list_patients(page=1, per_page=20, search=None, client=None):
+    """(PatientListItems, total count) for one page, newest first."""
+    query = (client or supabase).table('patients').select(
+        'id, full_name, phone_number, lgas!inner(name, states!inner(name))', count='exact')
+    if search:
+        query = query.ilike('full_name', f'%{search}%')
+    start = (page - 1) * per_page
+    res = query.range(start, start + per_page - 1).order('created_at', desc=True).execute()
+    items = [PatientListItem(r['id'], r['full_name'], r['phone_number'], _lga(r).get('name'), _state(r).get('name'))
+             for r in res.data or []]
+    return items, res.count or 0
+
+def get_patient(patient_id, client=None):
+    """Full editable record (with the LGA's state) or None."""
+    res = (client or supabase).table('patients').select(
+        'id, full_name, phone_number, lga_id, gender, age, blood_group, genotype, '
+        'emergency_contact_name, emergency_contact_phone, spoken_languages, lgas(state_id)'
+    ).eq('id', str(patient_id)).maybe_single().execute()
+    r = res.data if res else None
+    if not r:
+        return None
+    return Patient(r['id'], r['full_name'], r['phone_number'], r['lga_id'], _lga(r).get('state_id'),
+                   r['gender'], r['age'], r['blood_group'], r['genotype'],
+                   r['emergency_contact_name'], r['emergency_contact_phone'], r['spoken_languages'])
+
+def get_patient_summary(patient_id, client=None):
+    res = (client or supabase).table('patients').select('id, full_name, phone_number').eq('id', str(patient_id)).maybe_single().execute()
+    return PatientSummary(**res.data) if res and res.data else None
+
+# --- Appointments ---
+class AppointmentListItem(NamedTuple):
+    appointment_id: str
+    appointment_datetime: str
+    service_type: str
+    status: str
+    patient_name: str
+    patient_phone: str
+    lga_name: str
+    state_name: str
+
+
+class Appointment(NamedTuple):
+    appointment_id: str
+    appointment_datetime: str
+    service_type: str
+    status: str
+    preferred_language: str
+    volunteer_notes: str
+    patient_name: str
+    patient_phone: str
+
+
+class QueueItem(NamedTuple):
+    appointment_id: str
+    appointment_datetime: str
+    service_type: str
+    status: str
+    preferred_language: str
+    last_call_timestamp: str
+    updated_at: str
+    volunteer_id: str
+    patient_name: str
+    patient_phone: str
+    lga_name: str
+
+
+def list_appointments(start_date=None, end_date=None, state_id=None, lga_id=None, search=None, client=None):
+    """AppointmentListItems matching the appointments page filters, by date."""
+    query = (client or supabase).table('master_appointments').select(
+        'appointment_id, appointment_datetime, service_type, status, '
+        'patients!inner(full_name, phone_number, lgas!inner(name, states!inner(name)))')
+    if start_date and end_date:
+        query = query.gte('appointment_datetime', start_date).lte('appointment_datetime', end_date)
+    if state_id:
+        query = query.eq('patients.lgas.state_id', state_id)
+    if lga_id:
+        query = query.eq('patients.lga_id', lga_id)
+    if search:
+        query = query.ilike('patients.full_name', f'%{search}%')
+    rows = query.order('appointment_datetime').execute().data or []
+    return [AppointmentListItem(r['appointment_id'], r['appointment_datetime'], r['service_type'], r['status'],
+                                r['patients']['full_name'], r['patients']['phone_number'],
+                                _lga(r['patients']).get('name'), _state(r['patients']).get('name'))
+            for r in rows]
+
+def get_appointment(appointment_id, client=None):
+    res = (client or supabase).table('master_appointments').select(
+        'appointment_id, appointment_datetime, service_type, status, preferred_language, volunteer_notes, '
+        'patients!inner(full_name, phone_number)'
+    ).eq('appointment_id', str(appointment_id)).maybe_single().execute()
+    r = res.data if res else None
+    if not r:
+        return None
+    return Appointment(r['appointment_id'], r['appointment_datetime'], r['service_type'], r['status'],
+                       r['preferred_language'], r['volunteer_notes'], r['patients']['full_name'], r['patients']['phone_number'])
+
+_QUEUE_COLUMNS = ('appointment_id, appointment_datetime, service_type, status, preferred_language, last_call_timestamp, '
+                  'updated_at, volunteer_id, patients!inner(full_name, phone_number, lgas!inner(name))')
+
+def _queue_item(r):
+    return QueueItem(r['appointment_id'], r['appointment_datetime'], r['service_type'], r['status'],
+                     r['preferred_language'], r['last_call_timestamp'], r['updated_at'], r['volunteer_id'],
+                     r['patients']['full_name'], r['patients']['phone_number'], _lga(r['patients']).get('name'))
+
+def list_queue(statuses, order='updated_at', limit=None, client=None):
+    """QueueItems in the given statuses, newest `order` timestamp first."""
+    query = (client or supabase).table('master_appointments').select(_QUEUE_COLUMNS).in_('status', list(statuses))
+    query = query.order(order, desc=True)
+    if limit:
+        query = query.limit(limit)
+    return [_queue_item(r) for r in query.execute().data or []]
+
+def list_appointment_changes(since, after=None, limit=500, client=None):
+    """
+    QueueItems (any status) updated at or after `since`, oldest first.
+    `after` is the (updated_at, appointment_id) of the previous page's last row.
+    """
+    query = (client or supabase).table('master_appointments').select(_QUEUE_COLUMNS).gte('updated_at', since)
+    if after:
+        query = keyset_after(query, 'updated_at', 'appointment_id', *after)
+    rows = query.order('updated_at').order('appointment_id').limit(limit).execute().data or []
+    return [_queue_item(r) for r in rows]
+
+# --- Volunteers ---
+class Volunteer(NamedTuple):
+    id: str
+    full_name: str
+    email: str
+    role: str
+
+
+def get_volunteer(volunteer_id, client=None):
+    res = (client or supabase).table('volunteers').select('id, full_name, email, role').eq('id', str(volunteer_id)).maybe_single().execute()
+    return Volunteer(**res.data) if res and res.data else None
+
+def list_volunteers(client=None):
+    return [Volunteer(**r) for r in (client or supabase).table('volunteers').select('id, full_name, email, role').order('full_name').execute().data or []]
+
+# --- Public content ---
+class Video(NamedTuple):
+    id: str
+    title: str
+    description: str
+    youtube_id: str
+    added_by_name: str = None
+
+
+class Donation(NamedTuple):
+    id: str
+    donor_name: str
+    amount: float
+    message: str
+    status: str
+    created_at: str
+
+    @property
+    def public_name(self):
+        return self.donor_name or 'Anonymous'
+
+
+class MonthTotal(NamedTuple):
+    month: str          # first day of the month
+    count: int
+    amount: float       # kobo
+
+
+class DonationTotals(NamedTuple):
+    count: int
+    amount: float
+    months: tuple       # MonthTotal, newest first
+
+
+_DONATION_COLUMNS = 'id, donor_name, amount, message, status, created_at'
+
+def list_active_videos(client=None):
+    rows = (client or supabase).table('public_videos').select('id, title, description, youtube_id')\
+        .eq('is_active', True).order('created_at', desc=True).execute().data or []
+    return [Video(**r) for r in rows]
+
+def list_videos(client=None):
+    """Every video with the name of the volunteer who added it (manage page)."""
+    rows = (client or supabase).table('public_videos').select('id, title, description, youtube_id, volunteers(full_name)')\
+        .order('created_at', desc=True).execute().data or []
+    return [Video(r['id'], r['title'], r['description'], r['youtube_id'], (r.get('volunteers') or {}).get('full_name')) for r in rows]
+
+def list_donations(status=None, before=None, limit=50, client=None):
+    """
+    One page of donations, newest first, optionally only those with `status`.
+    `before` is the cursor of the previous page (a malformed one is ignored);
+    returns (donations, next cursor or None).
+    """
+    query = (client or supabase).table('public_donations').select(_DONATION_COLUMNS)
+    if status:
+        query = query.eq('status', status)
+    cursor = _parse_donation_cursor(before) if before else None
+    if cursor:
+        query = keyset_before(query, 'created_at', 'id', *cursor)
+    # One extra row tells whether there is a next page
+    rows = query.order('created_at', desc=True).order('id', desc=True).limit(limit + 1).execute().data or []
+    donations = [Donation(**r) for r in rows[:limit]]
+    next_cursor = f"{donations[-1].created_at}|{donations[-1].id}" if len(rows) > limit else None
+    return donations, next_cursor
+
+def _parse_donation_cursor(before):
+    """(created_at, id) from a '<ISO timestamp>|<UUID>' cursor, or None; it goes into an or=() filter."""
+    created_at, _, donation_id = before.partition('|')
+    try:
+        return cursor_timestamp(created_at), cursor_id(donation_id)
+    except ValueError:
+        return None
+
+def get_donation_totals(client=None):
+    """Successful donations per month and overall, from the trigger-maintained donation_totals table."""
+    rows = (client or supabase).table('donation_totals').select('month, donation_count, amount_total')\
+        .order('month', desc=True).execute().data or []
+    months = tuple(MonthTotal(r['month'], r['donation_count'], float(r['amount_total'])) for r in rows)
+    return DonationTotals(sum(m.count for m in months), sum(m.amount for m in months), months)
+
+# --- Settings ---
+def get_settings(client=None):
+    """{setting_key: setting_value} for every app setting."""
+    rows = (client or supabase).table('app_settings').select('setting_key, setting_value').execute().data or []
+    return {r['setting_key']: r['setting_value'] for r in rows}
+
+def get_setting(key, default=None, client=None):
+    rows = (client or supabase).table('app_settings').select('setting_value').eq('setting_key', key).limit(1).execute().data
+    return rows[0]['setting_value'] if rows else default
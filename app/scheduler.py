@@ -1,76 +1,131 @@
 import threading
 import time
-from datetime import datetime, timedelta
-# Import create_client here, but don't initialize a global client
-from supabase import create_client
+import json
+from datetime import datetime
 import os # Import os to get environment variables
+from .metrics import job_runs, job_duration
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: every process considers itself leader
+    fcntl = None
+
+# ==========================================
+# SINGLE-LEADER JOB SCHEDULER
+# ==========================================
+# Every gunicorn worker calls start_scheduler(), but only the worker holding
+# the host-wide file lock runs jobs. The others keep retrying the lock, so a
+# new leader takes over if the current one dies.
+
+_jobs = {}
+_leader_fd = None
+_scheduler_started = False
+_start_lock = threading.Lock()
+
+LEADER_RETRY_SECONDS = 30
+MAX_IDLE_SECONDS = 30
+
+def register_job(name, func, interval, initial_delay=0):
+    """
+    Registers a periodic job. `func` receives the Flask app and should return
+    False when it gave up (exceptions are also recorded as failures).
+    """
+    _jobs[name] = {
+        'func': func,
+        'interval': interval,
+        'initial_delay': initial_delay,
+        'next_run': None,
+    }
 
 def start_scheduler(app):
-    """Starts the background thread."""
+    """Starts the background thread (once per process)."""
+    global _scheduler_started
+    with _start_lock:
+        if _scheduler_started:
+            return
+        _scheduler_started = True
     thread = threading.Thread(target=run_schedule, args=(app,))
     thread.daemon = True
     thread.start()
 
+def _runtime_path(app, *parts):
+    path = os.path.join(app.instance_path, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+def _acquire_leadership(app):
+    """Returns an open lock file descriptor if this process is now the leader."""
+    if fcntl is None:
+        return -1
+    fd = os.open(_runtime_path(app, 'locks', 'scheduler.lock'), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return None
+    os.ftruncate(fd, 0)
+    os.write(fd, str(os.getpid()).encode())
+    return fd
+
+def _write_status(app, status):
+    path = _runtime_path(app, 'scheduler_status.json')
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(status, f)
+    os.replace(tmp_path, path)
+
+def get_job_status(app):
+    """Last run time, duration and outcome of each job, as written by the leader."""
+    try:
+        with open(_runtime_path(app, 'scheduler_status.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _run_job(app, name, job):
+    started = time.time()
+    try:
+        with app.app_context():
+            result = job['func'](app)
+        outcome = 'failed' if result is False else 'success'
+        error = None
+    except Exception as e:
+        outcome, error = 'error', str(e)
+        print(f"Scheduler: Job '{name}' raised: {e}")
+    job_runs.inc(job=name, outcome=outcome)
+    job_duration.observe(time.time() - started, job=name)
+    return {
+        'last_run': datetime.fromtimestamp(started).isoformat(),
+        'duration_seconds': round(time.time() - started, 3),
+        'outcome': outcome,
+        'error': error,
+        'leader_pid': os.getpid(),
+    }
+
+def is_leader():
+    """True in the one process per host that runs the scheduled jobs."""
+    return _leader_fd is not None
+
 def run_schedule(app):
+    global _leader_fd
     print("--- Background Scheduler Started ---")
+    while _leader_fd is None:
+        _leader_fd = _acquire_leadership(app)
+        if _leader_fd is None:
+            time.sleep(LEADER_RETRY_SECONDS)
+
+    print(f"Scheduler: Process {os.getpid()} elected job leader.")
+    status = get_job_status(app)
+    now = time.time()
+    for job in _jobs.values():
+        job['next_run'] = now + job['initial_delay']
+
     while True:
-        with app.app_context():
-            # Call the function that handles connection logic and retries
-            check_upcoming_reminders()
-        # Check every hour (3600 seconds)
-        time.sleep(3600)
-
-def check_upcoming_reminders(max_retries=3):
-    """Finds confirmed appointments for tomorrow and flags them for a call, with retries."""
-    
-    url = os.environ.get("SUPABASE_URL")
-    key = os.environ.get("SUPABASE_KEY")
-    
-    if not url or not key:
-        print("Scheduler: Missing Supabase credentials. Skipping reminders.")
-        return
-
-    for attempt in range(max_retries):
-        try:
-            # FIX: Create a dedicated connection for this task to avoid WinError 10054
-            local_supabase = create_client(url, key)
-            
-            # Logic: Find appointments scheduled for 'Tomorrow'
-            now = datetime.now()
-            tomorrow_start = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0)
-            tomorrow_end = (now + timedelta(days=1)).replace(hour=23, minute=59, second=59)
-
-            # Fetch confirmed appointments
-            # Use the local_supabase client here
-            res = local_supabase.table('master_appointments')\
-                .select('appointment_id, status, patients(full_name, phone_number)')\
-                .eq('status', 'confirmed')\
-                .gte('appointment_datetime', tomorrow_start.isoformat())\
-                .lte('appointment_datetime', tomorrow_end.isoformat())\
-                .execute()
-            
-            appointments = res.data or []
-            
-            if appointments:
-                print(f"Scheduler: Found {len(appointments)} reminders to send.")
-                for appt in appointments:
-                    # Update status to 'calling' using the local client
-                    local_supabase.table('master_appointments').update({
-                        'status': 'calling',
-                        'last_call_timestamp': datetime.now().isoformat()
-                    }).eq('appointment_id', appt['appointment_id']).execute()
-                    
-                    print(f" -> Triggered reminder for {appt['patients']['full_name']}")
-            else:
-                print("Scheduler: No appointments pending reminders for tomorrow.")
-            
-            return # Success! Exit the function.
-
-        except Exception as e:
-            print(f"Scheduler Warning (Attempt {attempt+1}/{max_retries}): {e}")
-            time.sleep(5) # Wait 5 seconds before retrying
-    
-    print("!!! ERROR in Scheduler: Failed to check reminders after multiple attempts. !!!")
-
-# Note: No 'supabase' import needed at the top of the file anymore.
-# The previous global import caused the crash.
\ No newline at end of file
+        for name, job in _jobs.items():
+            if time.time() >= job['next_run']:
+                status[name] = _run_job(app, name, job)
+                job['next_run'] = time.time() + job['interval']
+                _write_status(app, status)
+
+        next_due = min((job['next_run'] for job in _jobs.values()), default=time.time() + MAX_IDLE_SECONDS)
+        time.sleep(min(MAX_IDLE_SECONDS, max(1, next_due - time.time())))
@@ -0,0 +1,166 @@
+import os
+import time
+import threading
+from types import MappingProxyType
+from typing import NamedTuple
+from . import repository, supabase
+from .caching import invalidate, SETTINGS
+
+# ==========================================
+# APP SETTINGS (versioned snapshot)
+# ==========================================
+# All rows of app_settings are loaded once per process into an immutable
+# snapshot carrying the SETTINGS_VERSION row. Saving goes through the
+# save_app_settings RPC: one call upserts every changed key and bumps the
+# version atomically. Other workers notice the new version through
+# instance/settings.version: one stat() per read, the file is only opened
+# when its mtime moves. Saves from other hosts (or edits in the Supabase
+# dashboard) are found by the scheduler leader's single-row version check
+# every SETTINGS_CHECK_SECONDS, which republishes the file for this host.
+# Requests never wait on that check; only a (re)load queries Supabase, and
+# a failed one is retried after RETRY_SECONDS, not on every request.
+# A reload builds a complete new snapshot and swaps it in, so readers never
+# see a half-applied save.
+
+VERSION_KEY = 'SETTINGS_VERSION'
+CHECK_INTERVAL = int(os.environ.get('SETTINGS_CHECK_SECONDS', 30))
+RETRY_SECONDS = 5
+TRUE_VALUES = ('true', '1', 'yes', 'on')
+
+
+class SettingsSnapshot(NamedTuple):
+    version: int
+    values: MappingProxyType
+
+    def get(self, key, default=None):
+        return self.values.get(key, default)
+
+    def flag(self, key, default=False):
+        value = self.values.get(key)
+        return default if value is None else value.strip().lower() in TRUE_VALUES
+
+
+EMPTY_SETTINGS = SettingsSnapshot(None, MappingProxyType({}))
+
+
+def _parse_version(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+class SettingsService:
+    def __init__(self, check_interval):
+        self.check_interval = check_interval
+        self._snapshot = None
+        self._checked_at = 0
+        self._file_mtime = None
+        self._version_path = None
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self._version_path = os.path.join(app.instance_path, 'settings.version')
+        os.makedirs(app.instance_path, exist_ok=True)
+
+    def on_change(self, func):
+        """Registers func(old snapshot, new snapshot), called in each process after a reload."""
+        self._listeners.append(func)
+        return func
+
+    # --- Reads ---
+    def current(self):
+        """The current snapshot; cheap enough to call on every request (one stat())."""
+        if self._snapshot is None:
+            if self._load_due():
+                with self._lock:
+                    if self._snapshot is None and self._load_due():
+                        self._reload()
+        elif self._file_version_changed():
+            with self._lock:
+                self._reload()
+        return self._snapshot or EMPTY_SETTINGS
+
+    def _load_due(self):
+        return time.time() - self._checked_at > self.check_interval
+
+    def get(self, key, default=None):
+        return self.current().get(key, default)
+
+    def flag(self, key, default=False):
+        return self.current().flag(key, default)
+
+    def _file_version_changed(self):
+        if not self._version_path:
+            return False
+        try:
+            mtime = os.stat(self._version_path).st_mtime
+        except OSError:
+            return False
+        if mtime == self._file_mtime:
+            return False
+        self._file_mtime = mtime
+        try:
+            with open(self._version_path) as f:
+                return _parse_version(f.read()) != self._snapshot.version
+        except OSError:
+            return False
+
+    def check_version(self, app):
+        """Scheduler job: reloads after saves made elsewhere and tells this host's workers."""
+        version = _parse_version(repository.get_setting(VERSION_KEY))
+        loaded = self.current().version
+        if version == loaded:
+            return True
+        with self._lock:
+            self._reload()
+        if self._snapshot is None or self._snapshot.version == loaded:
+            return False    # reload failed; the next run tries again
+        self._publish(self._snapshot.version)
+        return True
+
+    def _reload(self):
+        try:
+            values = repository.get_settings()
+        except Exception as e:
+            print(f"Error loading settings (keeping previous snapshot): {e}")
+            self._checked_at = time.time() - self.check_interval + RETRY_SECONDS
+            return
+        old = self._snapshot or EMPTY_SETTINGS
+        self._snapshot = SettingsSnapshot(_parse_version(values.get(VERSION_KEY)), MappingProxyType(values))
+        self._checked_at = time.time()
+        if old.version != self._snapshot.version:
+            print(f"Settings loaded (version {self._snapshot.version}).")
+            for listener in self._listeners:
+                try:
+                    listener(old, self._snapshot)
+                except Exception as e:
+                    print(f"Settings Warning: change listener failed: {e}")
+
+    # --- Writes ---
+    def save(self, values):
+        """Saves the keys whose value differs from the snapshot in one call; returns the changed keys."""
+        current = self.current()
+        changed = {key: value for key, value in values.items() if key != VERSION_KEY and current.get(key) != value}
+        if not changed:
+            return []
+        version = supabase.rpc('save_app_settings', {'p_settings': changed}).execute().data
+        with self._lock:
+            self._reload()
+        self._publish(version)
+        invalidate(SETTINGS)
+        return sorted(changed)
+
+    def _publish(self, version):
+        """Tells the other workers on this host about the new version."""
+        if not self._version_path:
+            return
+        tmp_path = f"{self._version_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(str(version))
+        os.replace(tmp_path, self._version_path)
+        self._file_mtime = os.stat(self._version_path).st_mtime
+
+
+app_settings = SettingsService(CHECK_INTERVAL)
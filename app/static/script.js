@@ -4,6 +4,7 @@ document.addEventListener('DOMContentLoaded', function() {
     if (document.getElementById('send-button')) setupChatbot();
     if (document.getElementById('kpi-patients-registered')) initializePublicKpis();
     if (document.getElementById('notesModal')) setupVolunteerQueueModal();
+    if (document.getElementById('queue-table')) setupLiveQueue();
     if (document.getElementById('state')) setupLocationDropdowns();
     if (document.getElementById('state-filter')) setupSupaUserLocationFilter();
 
@@ -251,6 +252,77 @@ function setupVolunteerQueueModal() {
     window.onclick = function(event) { if (event.target == modal) modal.style.display = 'none'; };
 }
 
+// Live queue: the server sends a snapshot, then only cases entering ('upsert') or leaving ('remove') the queue
+function setupLiveQueue() {
+    const table = document.getElementById('queue-table');
+    const body = document.getElementById('queue-body');
+    const empty = document.getElementById('queue-empty');
+    const liveStatus = document.getElementById('queue-live-status');
+    if (!window.EventSource || !table.dataset.streamUrl) return;
+
+    const label = (text) => { text = (text || '').replace(/_/g, ' '); return text.charAt(0).toUpperCase() + text.slice(1).toLowerCase(); };
+    const cell = (text, className) => {
+        const td = document.createElement('td');
+        td.textContent = text || '';
+        if (className) td.className = className;
+        return td;
+    };
+    const refreshEmpty = () => {
+        const hasRows = body.rows.length > 0;
+        table.style.display = hasRows ? '' : 'none';
+        empty.style.display = hasRows ? 'none' : '';
+    };
+    const buildRow = (item) => {
+        const tr = document.createElement('tr');
+        tr.dataset.id = item.appointment_id;
+        tr.append(
+            cell(item.patient_name), cell(item.patient_phone), cell(item.lga_name), cell(item.service_type),
+            cell(item.preferred_language), cell(label(item.status), `status-${item.status}`),
+            cell((item.updated_at || '').slice(0, 16).replace('T', ' '))
+        );
+        const assigned = cell(!item.volunteer_id ? 'Unassigned' : item.volunteer_id === table.dataset.userId ? 'You' : 'Another volunteer');
+        if (item.volunteer_id && item.volunteer_id === table.dataset.userId) assigned.style.fontWeight = 'bold';
+        tr.appendChild(assigned);
+        const action = document.createElement('td');
+        const button = document.createElement('button');
+        button.type = 'button'; button.className = 'btn small-btn'; button.textContent = 'Complete';
+        button.addEventListener('click', () => window.openModal(item.appointment_id));
+        action.appendChild(button);
+        tr.appendChild(action);
+        return tr;
+    };
+    const findRow = (id) => body.querySelector(`tr[data-id="${CSS.escape(id)}"]`);
+
+    const onSnapshot = (e) => {
+        body.replaceChildren(...JSON.parse(e.data).items.map(buildRow));
+        refreshEmpty();
+    };
+    const onDelta = (e) => {
+        const delta = JSON.parse(e.data);
+        if (delta.op === 'upsert') {
+            const existing = findRow(delta.item.appointment_id);
+            if (existing) existing.remove();
+            body.prepend(buildRow(delta.item));   // newest change first, like the server order
+        } else if (delta.op === 'remove') {
+            const existing = findRow(delta.id);
+            if (existing) existing.remove();
+        }
+        refreshEmpty();
+    };
+    const connect = () => {
+        const source = new EventSource(table.dataset.streamUrl);
+        source.addEventListener('snapshot', onSnapshot);
+        source.addEventListener('queue', onDelta);
+        source.onopen = () => { if (liveStatus) liveStatus.textContent = 'Live.'; };
+        source.onerror = () => {
+            if (liveStatus) liveStatus.textContent = 'Reconnecting...';
+            // A 503 (server at its stream cap) closes the source for good: try again later
+            if (source.readyState === EventSource.CLOSED) setTimeout(connect, 15000);
+        };
+    };
+    connect();
+}
+
 function setupLocationDropdowns() {
     const stateDropdown = document.getElementById('state');
     const lgaDropdown = document.getElementById('lga');
@@ -0,0 +1,198 @@
+import os
+import time
+import threading
+from functools import wraps
+from flask import request, jsonify, current_app
+from . import cache
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines
+    fcntl = None
+
+# ==========================================
+# ADMISSION CONTROL FOR PUBLIC, EXPENSIVE ENDPOINTS
+# ==========================================
+# Two layers protect the gunicorn workers from a burst on /chatbot:
+#   1. A per-client token bucket (fast 429 for clients that send too much).
+#   2. A host-wide semaphore that caps in-flight model calls, with a small,
+#      bounded wait queue (fast 503 "busy" when it is full).
+# Gunicorn sync workers only serve one request each, so the semaphore has to
+# be shared across processes; it uses one lock file per slot.
+
+def _env_float(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+def client_key():
+    """
+    Client identifier. remote_addr is the peer address, or the client address
+    taken from the trusted X-Forwarded-For hops when ProxyFix is enabled
+    (TRUSTED_PROXY_HOPS in create_app); the raw header is client-controlled.
+    """
+    return request.remote_addr or 'unknown'
+
+
+class TokenBucket:
+    """
+    Per-client token bucket. State lives in the Flask cache so that it is
+    shared by every worker when a shared cache backend is configured. The
+    read-modify-write is serialised by a host-wide lock file, so workers on
+    one host can't both spend the same token. Separate hosts sharing a
+    cache are not serialised and may over-admit by up to one burst each.
+    """
+    def __init__(self, name, rate, burst):
+        self.name = name
+        self.rate = rate      # tokens added per second
+        self.burst = burst    # bucket capacity
+        self._lock = threading.Lock()
+        self._lock_path = None
+
+    def consume(self, key, tokens=1):
+        """Returns (allowed, retry_after_seconds)."""
+        with self._lock:
+            if fcntl is None:
+                return self._consume(key, tokens)
+            fd = os.open(self._path(), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                return self._consume(key, tokens)
+            finally:
+                os.close(fd)  # releases the flock
+
+    def _path(self):
+        if self._lock_path is None:
+            lock_dir = os.path.join(current_app.instance_path, 'locks')
+            os.makedirs(lock_dir, exist_ok=True)
+            self._lock_path = os.path.join(lock_dir, f"ratelimit-{self.name}.lock")
+        return self._lock_path
+
+    def _consume(self, key, tokens):
+        cache_key = f"ratelimit:{self.name}:{key}"
+        now = time.time()
+        state = cache.get(cache_key)
+        if state:
+            level, last = state
+            level = min(self.burst, level + (now - last) * self.rate)
+        else:
+            level = self.burst
+
+        if level >= tokens:
+            cache.set(cache_key, (level - tokens, now), timeout=self._ttl())
+            return True, 0
+
+        cache.set(cache_key, (level, now), timeout=self._ttl())
+        retry_after = (tokens - level) / self.rate if self.rate > 0 else 60
+        return False, max(1, int(retry_after + 0.999))
+
+    def _ttl(self):
+        # An idle bucket refills completely after burst/rate seconds.
+        return int(self.burst / self.rate) + 1 if self.rate > 0 else 3600
+
+
+class ConcurrencyLimiter:
+    """
+    Caps concurrent holders across all worker processes on this host.
+    Callers wait at most `queue_timeout` seconds, and at most `max_queue`
+    callers (per process) may wait at once; everyone else is refused.
+    """
+    def __init__(self, name, max_inflight, max_queue, queue_timeout):
+        self.name = name
+        self.max_inflight = max(1, int(max_inflight))
+        self.max_queue = max(0, int(max_queue))
+        self.queue_timeout = queue_timeout
+        self._waiting = 0
+        self._lock = threading.Lock()
+        self._local = threading.BoundedSemaphore(self.max_inflight)  # fallback without fcntl
+        self._lock_dir = None
+
+    def _slot_path(self, slot):
+        if self._lock_dir is None:
+            self._lock_dir = os.path.join(current_app.instance_path, 'locks')
+            os.makedirs(self._lock_dir, exist_ok=True)
+        return os.path.join(self._lock_dir, f"{self.name}-slot-{slot}.lock")
+
+    def _try_acquire_slot(self):
+        for slot in range(self.max_inflight):
+            fd = os.open(self._slot_path(slot), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except OSError:
+                os.close(fd)
+        return None
+
+    def acquire(self):
+        """Returns a release token, or None if the caller should be turned away."""
+        if fcntl is None:
+            return self._local if self._local.acquire(timeout=self.queue_timeout) else None
+
+        fd = self._try_acquire_slot()
+        if fd is not None:
+            return fd
+
+        with self._lock:
+            if self._waiting >= self.max_queue:
+                return None
+            self._waiting += 1
+        try:
+            deadline = time.monotonic() + self.queue_timeout
+            while time.monotonic() < deadline:
+                time.sleep(0.05)
+                fd = self._try_acquire_slot()
+                if fd is not None:
+                    return fd
+            return None
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+    def release(self, token):
+        if token is self._local:
+            self._local.release()
+            return
+        try:
+            fcntl.flock(token, fcntl.LOCK_UN)
+        finally:
+            os.close(token)
+
+
+chatbot_bucket = TokenBucket(
+    'chatbot',
+    rate=_env_float('CHATBOT_RATE_PER_MINUTE', 10) / 60.0,
+    burst=_env_float('CHATBOT_BURST', 5),
+)
+chatbot_limiter = ConcurrencyLimiter(
+    'chatbot',
+    max_inflight=_env_float('CHATBOT_MAX_INFLIGHT', 2),
+    max_queue=_env_float('CHATBOT_MAX_QUEUE', 4),
+    queue_timeout=_env_float('CHATBOT_QUEUE_TIMEOUT', 2.0),
+)
+
+
+def admission_control(bucket, limiter):
+    """Decorator that rate limits per client and caps concurrent executions."""
+    def wrapper(fn):
+        @wraps(fn)
+        def decorated_view(*args, **kwargs):
+            allowed, retry_after = bucket.consume(client_key())
+            if not allowed:
+                resp = jsonify({'response': 'You are sending messages too quickly. Please wait a moment and try again.', 'source': 'Rate Limit'})
+                resp.status_code = 429
+                resp.headers['Retry-After'] = str(retry_after)
+                return resp
+
+            token = limiter.acquire()
+            if token is None:
+                resp = jsonify({'response': 'Safemama AI is busy helping other mothers right now. Please try again shortly.', 'source': 'Busy'})
+                resp.status_code = 503
+                resp.headers['Retry-After'] = '5'
+                return resp
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                limiter.release(token)
+        return decorated_view
+    return wrapper
@@ -1,4 +1,6 @@
 import os
+import uuid
+from datetime import datetime, timezone
 from functools import wraps
 from flask import abort, current_app
 from flask_login import current_user
@@ -15,6 +17,35 @@ def role_required(*roles):
         return decorated_view
     return wrapper
 
+def cursor_timestamp(value):
+    """
+    Normalises a client-supplied ISO 8601 cursor timestamp (naive means UTC)
+    before it goes into a filter; raises ValueError for anything else.
+    """
+    ts = datetime.fromisoformat(value)
+    return (ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)).isoformat()
+
+def cursor_id(value):
+    """Normalises a client-supplied UUID cursor id; raises ValueError for anything else."""
+    return str(uuid.UUID(value))
+
+def keyset_after(query, ts_column, pk_column, ts_value, pk_value):
+    """
+    Restricts a query ordered by (ts_column, pk_column) to rows strictly after
+    the given watermark. Rows sharing a timestamp are not skipped at page edges.
+    """
+    return query.or_(
+        f'{ts_column}.gt."{ts_value}",'
+        f'and({ts_column}.eq."{ts_value}",{pk_column}.gt.{pk_value})'
+    )
+
+def keyset_before(query, ts_column, pk_column, ts_value, pk_value):
+    """keyset_after for queries ordered by (ts_column, pk_column) descending."""
+    return query.or_(
+        f'{ts_column}.lt."{ts_value}",'
+        f'and({ts_column}.eq."{ts_value}",{pk_column}.lt.{pk_value})'
+    )
+
 def get_supabase_client():
     """
     Returns a fresh Supabase client using current app config.
@@ -24,35 +55,3 @@ def get_supabase_client():
     url = current_app.config.get("SUPABASE_URL") or os.environ.get("SUPABASE_URL")
     key = current_app.config.get("SUPABASE_KEY") or os.environ.get("SUPABASE_KEY")
     return create_client(url, key)
-
-def reload_app_settings(app):
-    """
-    Fetches configuration from 'app_settings' table and updates 
-    Flask app config and OS environment variables at runtime.
-    """
-    print("--- Attempting to Reload Real-Time Settings ---")
-    try:
-        # Use environment variables to establish the initial connection
-        url = os.environ.get("SUPABASE_URL")
-        key = os.environ.get("SUPABASE_KEY")
-        client = create_client(url, key)
-        
-        response = client.table('app_settings').select('setting_key, setting_value').execute()
-        
-        if response.data:
-            count = 0
-            for setting in response.data:
-                key = setting['setting_key']
-                val = setting['setting_value']
-                
-                # Update Flask Config and OS Environ
-                app.config[key] = val
-                os.environ[key] = val
-                count += 1
-                
-            print(f"Successfully reloaded {count} settings.")
-            return True
-        return False
-    except Exception as e:
-        print(f"CRITICAL ERROR reloading settings: {e}")
-        return False
\ No newline at end of file
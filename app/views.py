@@ -1,57 +1,67 @@
 import re
 import os
 import math
+import time
+import requests
 import pandas as pd
-from flask import Blueprint, render_template, request, flash, redirect, url_for, current_app
+from flask import Blueprint, render_template, request, flash, redirect, url_for, current_app, abort, send_file
 from flask_login import login_required, current_user
-from supabase import create_client 
-from .utils import role_required, reload_app_settings
-from . import supabase, cache
+from .utils import role_required
+from .reminders import notify_appointment_changed
+from .concurrency import fan_out
+from .settings import app_settings
+from .queue_feed import queue_feed, QUEUE_STATUSES, ENABLED as LIVE_QUEUE
+from .reference import reference_data, LANGUAGES, SERVICE_TYPES, APPOINTMENT_STATUSES, ROLES
+from .caching import public_page, skip_page_cache, user_scoped_key, tagged, invalidate
+from .caching import APPOINTMENTS, PATIENTS, LOCATIONS, SETTINGS, VIDEOS, DONATIONS, VOLUNTEERS
+from .kpis import adjust_stat, kpi_snapshot, PATIENTS_REGISTERED
+from .metrics import bulk_upload_rows, bulk_upload_throughput, external_call
+from .profiling import is_enabled as profiling_enabled, list_profiles, profile_path, profile_report
+from .dedup import find_duplicates, stage_upload, load_staged, discard_staged, apply_decisions, ACTIONS as DEDUP_ACTIONS
+from . import repository, supabase, cache
 
 views_bp = Blueprint('views', __name__)
 
+DONATIONS_PER_PAGE = 50
+
 # --- Helper Functions ---
+PAYSTACK_REFERENCE = re.compile(r'^[A-Za-z0-9._=-]{1,100}$')
+
+def paystack_payment_succeeded(reference):
+    """
+    True once per reference that Paystack confirms as a successful payment.
+    Needs PAYSTACK_SECRET_KEY; without it nothing is confirmed.
+    """
+    secret = os.environ.get("PAYSTACK_SECRET_KEY")
+    if not secret or not reference or not PAYSTACK_REFERENCE.match(reference):
+        return False
+    # Only the first visit with a reference is checked; reloads and replays are free
+    if not cache.add(f"paystack:ref:{reference}", True, timeout=86400):
+        return False
+    try:
+        with external_call('paystack', 'verify'):
+            response = requests.get(f"https://api.paystack.co/transaction/verify/{reference}",
+                                    headers={'Authorization': f'Bearer {secret}'}, timeout=5)
+            response.raise_for_status()
+        return (response.json().get('data') or {}).get('status') == 'success'
+    except Exception as e:
+        print(f"Paystack Verify Error: {e}")
+        return False
+
 def clean_input(text):
     """Removes HTML tags and trims whitespace to prevent XSS."""
     if not isinstance(text, str): return text
     return re.sub(re.compile('<.*?>'), '', text).strip()
 
-def get_high_privilege_key():
-    return os.environ.get("SUPABASE_SERVICE_ROLE_KEY") or os.environ.get("SUPABASE_KEY")
-
 def get_live_kpis():
-    """
-    FIXED: Fetches KPIs using a fresh, dedicated connection to prevent WinError 10054.
-    """
-    try:
-        url = os.environ.get("SUPABASE_URL")
-        key = get_high_privilege_key() 
-        
-        if not url or not key:
-            print("Error: KPIs missing Supabase credentials.")
-            return {'patients_registered': 0, 'appointments_confirmed': 0, 'states_covered': 0}
-
-        local_supabase = create_client(url, key)
-        
-        res = local_supabase.table('public_stats').select('stat_key, stat_value').execute()
-        kpis = {item['stat_key']: item['stat_value'] for item in res.data}
-        return kpis
-    except Exception as e:
-        print(f"Error fetching live KPIs: {e}")
-        return {'patients_registered': 0, 'appointments_confirmed': 0, 'states_covered': 0}
+    """KPIs for the homepage, served from the process-wide snapshot (never blocks on Supabase once warm)."""
+    kpis, _ = kpi_snapshot.get()
+    return kpis
 
 
 def get_location_map():
-    """Helper to map names to IDs for bulk upload."""
-    try:
-        states_res = supabase.table('states').select('id, name').execute()
-        lgas_res = supabase.table('lgas').select('id, name, state_id').execute()
-        state_map = {s['name'].lower(): s['id'] for s in states_res.data}
-        lga_map = {f"{lga['state_id']}_{lga['name'].lower()}": lga['id'] for lga in lgas_res.data}
-        return state_map, lga_map
-    except Exception as e:
-        print(f"Error fetching location map: {e}")
-        return {}, {}
+    """Helper to map names to IDs for bulk upload (from the in-memory reference data)."""
+    return reference_data.locations().name_maps()
 
 def get_pagination(total_count, current_page, per_page=20):
     total_pages = math.ceil(total_count / per_page)
@@ -66,16 +76,19 @@ def get_pagination(total_count, current_page, per_page=20):
 
 # --- PUBLIC ROUTES ---
 @views_bp.route('/')
+@public_page('home', variant=lambda: kpi_snapshot.get()[1])
 def home():
     return render_template('index.html', kpis=get_live_kpis())
 
 @views_bp.route('/testimonials')
+@public_page('testimonials', tags=(VIDEOS,))
 def testimonials():
     active_videos = []
     try:
-        active_videos = supabase.table('public_videos').select('*').eq('is_active', True).order('created_at', desc=True).execute().data
+        active_videos = repository.list_active_videos()
     except Exception as e:
         print(f"Error loading public testimonials: {e}") 
+        skip_page_cache()
     return render_template('testimonials.html', videos=active_videos)
 
 @views_bp.route('/chatbot')
@@ -83,48 +96,55 @@ def chatbot():
     return render_template('chatbot.html')
 
 @views_bp.route('/donate')
+@public_page('donate', tags=(SETTINGS,))
 def donate():
     pk = os.environ.get("PAYSTACK_PUBLIC_KEY") or "pk_test_xxxxxxxx" 
     return render_template('donate.html', paystack_public_key=pk)
 
 @views_bp.route('/donor-wall')
+# Donations are inserted by the Paystack webhook, outside this app: keep the page short-lived
+@public_page('donor_wall', tags=(DONATIONS, SETTINGS), timeout=60)
 def donor_wall():
-    donations = []
+    if paystack_payment_succeeded(request.args.get('ref')):
+        # Returning from a confirmed Paystack payment: the donation lists and totals have changed
+        invalidate(DONATIONS)
+    donations, next_cursor = [], None
     total_donations = 0
     show_total = False
     try:
-        # Fetching only successful donations for the public wall
-        res = supabase.table('public_donations').select('*').eq('status', 'success').order('created_at', desc=True).execute()
-        donations = res.data
+        # One page of donations and the running totals, fetched in parallel
+        results = fan_out(
+            donations=lambda: repository.list_donations(status='success', before=request.args.get('before'), limit=DONATIONS_PER_PAGE),
+            totals=repository.get_donation_totals,
+        )
+        donations, next_cursor = results['donations']
         
-        settings_res = supabase.table('app_settings').select('setting_value').eq('setting_key', 'DISPLAY_TOTAL_DONATIONS').execute()
-        if settings_res.data and settings_res.data[0]['setting_value'].lower() == 'true':
+        if app_settings.flag('DISPLAY_TOTAL_DONATIONS'):
             show_total = True
             # Amounts are stored in kobo/cents, divide by 100 for NGN/USD
-            total_donations = sum(float(d['amount']) / 100 for d in donations)
+            total_donations = results['totals'].amount / 100
     except Exception as e:
         print(f"Error loading donor wall: {e}")
-    return render_template('donor_wall.html', donations=donations, total_donations=total_donations, show_total=show_total)
+        skip_page_cache()
+    return render_template('donor_wall.html', donations=donations, next_cursor=next_cursor, total_donations=total_donations, show_total=show_total)
 
 # --- DASHBOARD & ANALYTICS ---
 @views_bp.route('/dashboard')
 @login_required
-@cache.cached(timeout=300)
+# Short TTL: the AI caller writes (failed) escalations outside the app, so no invalidate() fires for them
+@cache.cached(timeout=60, make_cache_key=tagged(user_scoped_key, APPOINTMENTS, PATIENTS, LOCATIONS))
 def dashboard():
     failed_escalations, sub_locations, all_states = [], [], []
     try:
         # Fetch Failed Escalations
-        query = supabase.table('master_appointments').select('*, patients!inner(full_name, phone_number, lgas!inner(name))').eq('status', 'failed_escalation')
-        res_escalations = query.limit(10).order('last_call_timestamp', desc=True).execute()
-        failed_escalations = res_escalations.data
+        failed_escalations = repository.list_queue(('failed_escalation',), order='last_call_timestamp', limit=10)
 
-        # Fetch Filters based on Role
+        # Filters based on Role (reference data, no queries)
+        locations = reference_data.locations()
         if hasattr(current_user, 'role') and current_user.role == 'state' and hasattr(current_user, 'state_id'):
-            res_lgas = supabase.table('lgas').select('id, name').eq('state_id', current_user.state_id).order('name').execute()
-            sub_locations = res_lgas.data
+            sub_locations = locations.lgas_for_state(current_user.state_id)
         if hasattr(current_user, 'role') and current_user.role == 'supa_user':
-            res_states = supabase.table('states').select('id, name').order('name').execute()
-            all_states = res_states.data
+            all_states = locations.states
     except Exception as e:
         flash(f"An error occurred while fetching dashboard data: {e}", "error")
     return render_template('dashboard.html', failed_escalations=failed_escalations, sub_locations=sub_locations, all_states=all_states)
@@ -136,22 +156,12 @@ def patients():
     page = request.args.get('page', 1, type=int)
     search_query = request.args.get('q', '').strip()
     per_page = 20
-    start = (page - 1) * per_page
-    end = start + per_page - 1 
     
     patients_list = []
     total_count = 0
     
     try:
-        if search_query:
-            query = supabase.table('patients').select('*, lgas!inner(name, states!inner(name))', count='exact').ilike('full_name', f'%{search_query}%')
-        else:
-            query = supabase.table('patients').select('*, lgas!inner(name, states!inner(name))', count='exact')
-            
-        res = query.range(start, end).order('created_at', desc=True).execute()
-        patients_list = res.data
-        total_count = res.count
-        
+        patients_list, total_count = repository.list_patients(page, per_page, search_query)
     except Exception as e:
         flash(f"Error fetching patients: {e}", "error")
 
@@ -168,10 +178,7 @@ def register_patient():
         
         if not re.match(r'^(0[7-9][0-1]\d{8})$', phone):
             flash("Invalid Phone Number. Must be 11 digits starting with 07/08/09.", "error")
-            states = supabase.table('states').select('*').order('name').execute().data or []
-            languages = ['English', 'Yoruba', 'Hausa', 'Igbo', 'Pidgin']
-            service_types = ['Antenatal Care', 'Postnatal Care', 'Childbirth Delivery', 'Immunization', 'Vaccination', 'Family Planning', 'General']
-            return render_template('register_patient.html', states=states, languages=languages, service_types=service_types)
+            return render_template('register_patient.html', states=reference_data.locations().states, languages=LANGUAGES, service_types=SERVICE_TYPES)
 
         try:
             data = {
@@ -187,6 +194,8 @@ def register_patient():
                 'registered_by': current_user.id 
             }
             supabase.table('patients').insert(data).execute()
+            adjust_stat(PATIENTS_REGISTERED, 1)
+            invalidate(PATIENTS)
             flash('Patient registered successfully.', 'success')
             return redirect(url_for('views.patients'))
         except Exception as e:
@@ -195,14 +204,10 @@ def register_patient():
             else:
                 flash(f'Error registering patient: {e}', 'error')
     
-    states = []
-    try:
-        states = supabase.table('states').select('*').order('name').execute().data
-    except Exception as e:
-        flash(f"Could not load states: {e}", "error")
-    languages = ['English', 'Yoruba', 'Hausa', 'Igbo', 'Pidgin']
-    service_types = ['Antenatal Care', 'Postnatal Care', 'Childbirth Delivery', 'Immunization', 'Vaccination', 'Family Planning', 'General']
-    return render_template('register_patient.html', states=states, languages=languages, service_types=service_types)
+    states = reference_data.locations().states
+    if not states:
+        flash("Could not load states. Please try again shortly.", "error")
+    return render_template('register_patient.html', states=states, languages=LANGUAGES, service_types=SERVICE_TYPES)
 
 @views_bp.route('/edit-patient/<uuid:patient_id>', methods=['GET', 'POST'])
 @login_required
@@ -219,9 +224,10 @@ def edit_patient(patient_id):
                 'emergency_contact_name': clean_input(request.form.get('emergency_contact_name')),
                 'emergency_contact_phone': request.form.get('emergency_contact_phone'),
                 'lga_id': request.form.get('lga_id') or None,
-                'spoken_languages': request.form.getlist('spoken_languages')
+                'spoken_languages': request.form.getlist('spoken_languages'),
             }
             supabase.table('patients').update(data).eq('id', str(patient_id)).execute()
+            invalidate(PATIENTS)
             flash('Patient details updated.', 'success')
             return redirect(url_for('views.patients'))
         except Exception as e:
@@ -229,25 +235,20 @@ def edit_patient(patient_id):
     
     # GET Logic
     try:
-        # Fetch patient with location details (Join with LGAs to get State ID)
-        res = supabase.table('patients').select('*, lgas(id, name, state_id)').eq('id', str(patient_id)).single().execute()
-        patient = res.data
+        # Fetch patient with the state of their LGA
+        patient = repository.get_patient(patient_id)
         if not patient:
             flash("Patient not found.", "error")
             return redirect(url_for('views.patients'))
 
-        # Fetch States for dropdown
-        states = supabase.table('states').select('id, name').order('name').execute().data or []
+        # States and the LGAs of the patient's state come from the reference data
+        locations = reference_data.locations()
+        states = locations.states
+        current_state_lgas = ()
+        patient_state_id = patient.state_id
         
-        # Fetch LGAs for the current state (if patient has a location set)
-        current_state_lgas = []
-        patient_state_id = None
-        
-        if patient.get('lgas'):
-            patient_state_id = patient['lgas']['state_id']
-            # Fetch valid LGAs for this state
-            lga_res = supabase.table('lgas').select('id, name').eq('state_id', patient_state_id).order('name').execute()
-            current_state_lgas = lga_res.data
+        if patient_state_id:
+            current_state_lgas = locations.lgas_for_state(patient_state_id)
             
     except Exception as e:
         flash(f"Error fetching data: {e}", "error")
@@ -258,7 +259,7 @@ def edit_patient(patient_id):
                            states=states, 
                            current_state_lgas=current_state_lgas,
                            patient_state_id=patient_state_id,
-                           languages=['English', 'Yoruba', 'Hausa', 'Igbo', 'Pidgin'])
+                           languages=LANGUAGES)
 
 @views_bp.route('/bulk-upload', methods=['GET', 'POST'])
 @login_required
@@ -276,9 +277,11 @@ def bulk_upload():
                 flash('Invalid file type. Please upload CSV or XLSX.', 'error')
                 return redirect(request.url)
             
+            started = time.perf_counter()
             state_map, lga_map = get_location_map()
             required_columns = ['Patient Name', 'Patient Phone', 'State', 'LGA']
             valid_patients = []
+            lines = []          # file line of each valid row, for the duplicate review
             failed_rows = []
             
             for index, row in df.iterrows():
@@ -313,39 +316,94 @@ def bulk_upload():
                     'genotype': row.get('Genotype'),
                     'registered_by': current_user.id 
                 })
+                lines.append(index + 2)
             
-            if valid_patients:
-                supabase.table('patients').insert(valid_patients).execute()
-                flash(f'Successfully uploaded {len(valid_patients)} patients.', 'success')
-            if failed_rows:
-                flash(f'Upload completed with {len(failed_rows)} errors.', 'error')
-                for error in failed_rows[:10]: flash(error, 'error_detail')
-            
+            # Probable duplicates are reviewed before anything is written
+            matches = find_duplicates(valid_patients)
+            if matches:
+                token = stage_upload(valid_patients, lines, matches, failed_rows, current_user.id)
+                return render_template('bulk_upload_review.html', token=token, rows=valid_patients, lines=lines, matches=matches,
+                                       failed_count=len(failed_rows), actions=DEDUP_ACTIONS)
+
+            commit_bulk_upload(valid_patients, [], failed_rows)
+            bulk_upload_throughput.observe(len(df) / max(time.perf_counter() - started, 1e-6))
             return redirect(url_for('views.patients'))
         except Exception as e:
             flash(f'Critical Upload Error: {e}', 'error')
             return redirect(request.url)
     return render_template('bulk_upload.html')
 
+@views_bp.route('/bulk-upload/review/<token>', methods=['POST'])
+@login_required
+def bulk_upload_review(token):
+    staged = load_staged(token, current_user.id)
+    if staged is None:
+        flash('This upload review has expired. Please upload the file again.', 'error')
+        return redirect(url_for('views.bulk_upload'))
+    if request.form.get('action') == 'cancel':
+        discard_staged(token, current_user.id)
+        flash('Upload cancelled. No patients were added.', 'success')
+        return redirect(url_for('views.bulk_upload'))
+
+    rows, lines, matches, failed_rows = staged
+    decisions = {match.row: request.form.get(f'decision_{match.row}', match.default_action) for match in matches}
+    try:
+        to_insert, merges = apply_decisions(rows, matches, decisions, lines)
+    except ValueError as e:
+        # Conflicting choices: show the review again with them, the staged upload is kept
+        flash(str(e), 'error')
+        return render_template('bulk_upload_review.html', token=token, rows=rows, lines=lines, matches=matches,
+                               failed_count=len(failed_rows), actions=DEDUP_ACTIONS, decisions=decisions)
+    try:
+        commit_bulk_upload(to_insert, merges, failed_rows, skipped=sum(1 for decision in decisions.values() if decision == 'skip'))
+        discard_staged(token, current_user.id)
+        return redirect(url_for('views.patients'))
+    except Exception as e:
+        flash(f'Critical Upload Error: {e}', 'error')
+        return redirect(url_for('views.bulk_upload'))
+
+def commit_bulk_upload(rows, merges, failed_rows, skipped=0):
+    """Inserts the new patients, fills in merged records and flashes the outcome."""
+    if rows:
+        supabase.table('patients').insert(rows).execute()
+        adjust_stat(PATIENTS_REGISTERED, len(rows))
+    # Merges differ per patient, so each is its own (rare, user-confirmed) update
+    for patient_id, update in merges:
+        supabase.table('patients').update(update).eq('id', patient_id).execute()
+    if rows or merges:
+        invalidate(PATIENTS)
+        flash(f'Successfully uploaded {len(rows)} patients.' + (f' Updated {len(merges)} existing records.' if merges else ''), 'success')
+    if skipped:
+        flash(f'Skipped {skipped} duplicate rows.', 'success')
+    bulk_upload_rows.inc(len(rows), outcome='valid')
+    bulk_upload_rows.inc(len(merges), outcome='merged')
+    bulk_upload_rows.inc(skipped, outcome='duplicate')
+    bulk_upload_rows.inc(len(failed_rows), outcome='failed')
+    if failed_rows:
+        flash(f'Upload completed with {len(failed_rows)} errors.', 'error')
+        for error in failed_rows[:10]: flash(error, 'error_detail')
+
 # --- APPOINTMENTS & OPERATIONS ---
 @views_bp.route('/schedule-appointment/<uuid:patient_id>', methods=['GET', 'POST'])
 @login_required
 def schedule_appointment(patient_id):
     if request.method == 'POST':
         try:
-            supabase.table('master_appointments').insert({
+            res = supabase.table('master_appointments').insert({
                 'patient_id': str(patient_id), 
                 'appointment_datetime': request.form.get('appointment_datetime'), 
                 'service_type': request.form.get('service_type'), 
                 'preferred_language': request.form.get('preferred_language')
             }).execute()
+            notify_appointment_changed(current_app, res.data)
+            invalidate(APPOINTMENTS)
             flash('Appointment scheduled successfully.', 'success')
             return redirect(url_for('views.patients'))
         except Exception as e:
             flash(f'Error scheduling appointment: {e}', 'error')
     
-    patient = supabase.table('patients').select('*').eq('id', str(patient_id)).single().execute().data
-    return render_template('schedule_appointment.html', patient=patient)
+    patient = repository.get_patient_summary(patient_id)
+    return render_template('schedule_appointment.html', patient=patient, service_types=SERVICE_TYPES, languages=LANGUAGES)
 
 @views_bp.route('/appointments', methods=['GET', 'POST'])
 @login_required
@@ -359,27 +417,12 @@ def appointments():
     end_date = request.form.get('end_date') or request.args.get('end_date')
     
     try:
-        query = supabase.table('master_appointments').select('*, patients!inner(full_name, phone_number, lgas!inner(name, states!inner(name)))')
-        
-        if start_date and end_date:
-            query = query.gte('appointment_datetime', start_date).lte('appointment_datetime', end_date)
-            
-        if form_data.get('state_id'): query = query.eq('patients.lgas.state_id', form_data.get('state_id'))
-        if form_data.get('lga_id'): query = query.eq('patients.lga_id', form_data.get('lga_id'))
-        
-        if search_query:
-            query = query.ilike('patients.full_name', f'%{search_query}%')
-
-        appointment_list = query.order('appointment_datetime').execute().data
+        appointment_list = repository.list_appointments(start_date, end_date, form_data.get('state_id'),
+                                                        form_data.get('lga_id'), search_query)
     except Exception as e:
         flash(f"Error fetching appointments: {e}", "error")
 
-    states = []
-    try:
-        states = supabase.table('states').select('id, name').order('name').execute().data
-    except: pass
-    
-    return render_template('appointments.html', appointments=appointment_list, form_data=form_data, states=states, search_query=search_query) 
+    return render_template('appointments.html', appointments=appointment_list, form_data=form_data, states=reference_data.locations().states, search_query=search_query) 
 
 @views_bp.route('/edit-appointment/<uuid:appointment_id>', methods=['GET', 'POST'])
 @login_required
@@ -388,13 +431,16 @@ def edit_appointment(appointment_id):
     appointment_id_str = str(appointment_id)
     if request.method == 'POST':
         try:
-            supabase.table('master_appointments').update({
+            res = supabase.table('master_appointments').update({
                 'status': request.form.get('status'),
                 'service_type': request.form.get('service_type'),
                 'preferred_language': request.form.get('preferred_language'),
                 'volunteer_notes': clean_input(request.form.get('volunteer_notes')),
-                'volunteer_id': current_user.id 
+                'volunteer_id': current_user.id,
             }).eq('appointment_id', appointment_id_str).execute()
+            notify_appointment_changed(current_app, res.data)
+            invalidate(APPOINTMENTS)
+            queue_feed.poke()
             flash('Appointment updated.', 'success')
             return redirect(url_for('views.appointments'))
         except Exception as e:
@@ -402,21 +448,22 @@ def edit_appointment(appointment_id):
             return redirect(url_for('views.edit_appointment', appointment_id=appointment_id))
 
     try:
-        appt = supabase.table('master_appointments').select('*, patients!inner(full_name, phone_number)').eq('appointment_id', appointment_id_str).single().execute().data
+        appt = repository.get_appointment(appointment_id_str)
     except: appt = None
     
-    return render_template('edit_appointment.html', appointment=appt, statuses=['pending', 'confirmed', 'rescheduled', 'transferred', 'unreachable', 'calling', 'human_escalation', 'failed_escalation', 'completed'], service_types=['Antenatal Care', 'Postnatal Care', 'Childbirth Delivery', 'Immunization', 'Vaccination', 'Family Planning', 'General'], languages=['English', 'Yoruba', 'Hausa', 'Igbo', 'Pidgin'])
+    return render_template('edit_appointment.html', appointment=appt, statuses=APPOINTMENT_STATUSES, service_types=SERVICE_TYPES, languages=LANGUAGES)
 
 @views_bp.route('/volunteer-queue')
 @login_required
-@cache.cached(timeout=60)
+# Short TTL for the same reason as the dashboard; the live stream keeps an open page current
+@cache.cached(timeout=60, make_cache_key=tagged(user_scoped_key, APPOINTMENTS, PATIENTS))
 def volunteer_queue():
     patients = []
     try:
-        patients = supabase.table('master_appointments').select('*, patients!inner(full_name, phone_number, lgas!inner(name))').in_('status', ['transferred', 'human_escalation']).order('updated_at', desc=True).execute().data
+        patients = repository.list_queue(QUEUE_STATUSES)
     except Exception as e:
         flash(f"Error: {e}", "error")
-    return render_template('volunteer_queue.html', patients=patients)
+    return render_template('volunteer_queue.html', patients=patients, live_queue=LIVE_QUEUE)
 
 # --- ADMIN ROUTES ---
 
@@ -424,16 +471,39 @@ def volunteer_queue():
 @login_required
 @role_required('supa_user')
 def admin_donations():
-    """Shows all donation records for administrative review (Supa User Only)."""
-    donations = []
+    """Shows donation records (every status) a page at a time, with running totals (Supa User Only)."""
+    donations, next_cursor, totals = [], None, None
     try:
-        # Fetch ALL donations, regardless of status
-        res = supabase.table('public_donations').select('*').order('created_at', desc=True).execute()
-        donations = res.data
+        results = fan_out(
+            donations=lambda: repository.list_donations(before=request.args.get('before'), limit=DONATIONS_PER_PAGE),
+            totals=repository.get_donation_totals,
+        )
+        donations, next_cursor = results['donations']
+        totals = results['totals']
     except Exception as e:
         flash(f"Error fetching donation records: {e}", "error")
 
-    return render_template('admin_donations.html', donations=donations)
+    return render_template('admin_donations.html', donations=donations, next_cursor=next_cursor, totals=totals)
+
+@views_bp.route('/admin/profiles')
+@login_required
+@role_required('supa_user')
+def admin_profiles():
+    """Lists captured request profiles (Supa User Only)."""
+    return render_template('profiles.html', profiles=list_profiles(), enabled=profiling_enabled())
+
+@views_bp.route('/admin/profiles/<name>')
+@login_required
+@role_required('supa_user')
+def admin_profile_detail(name):
+    """Text report of one profile, or the raw .prof file with ?download=1."""
+    if request.args.get('download'):
+        path = profile_path(name)
+        if path is None: abort(404)
+        return send_file(path, as_attachment=True, download_name=f"{name}.prof")
+    report = profile_report(name, sort=request.args.get('sort', 'cumulative'))
+    if report is None: abort(404)
+    return render_template('profiles.html', report=report, name=name, enabled=profiling_enabled())
 
 @views_bp.route('/manage-videos', methods=['GET', 'POST'])
 @login_required
@@ -450,12 +520,13 @@ def manage_videos():
                 'youtube_id': youtube_id,
                 'added_by': current_user.id
             }).execute()
+            invalidate(VIDEOS)
             flash('Video added successfully.', 'success')
         except Exception as e:
             flash(f'Error adding video: {e}', 'error')
         return redirect(url_for('views.manage_videos'))
     
-    videos = supabase.table('public_videos').select('*, volunteers(full_name)').order('created_at', desc=True).execute().data
+    videos = repository.list_videos()
     return render_template('manage_videos.html', videos=videos)
 
 @views_bp.route('/settings', methods=['GET', 'POST'])
@@ -464,18 +535,19 @@ def manage_videos():
 def settings():
     if request.method == 'POST':
         try:
-            for key, value in request.form.items():
-                supabase.table('app_settings').update({'setting_value': value}).eq('setting_key', key).execute()
-            # reload_app_settings(current_app)
-            flash('Settings updated and applied instantly!', 'success')
+            # One batched save; every worker picks up the new version
+            changed = app_settings.save(request.form.to_dict())
+            if changed:
+                flash(f"Updated {', '.join(changed)}. Changes apply to all workers within seconds.", 'success')
+            else:
+                flash('No settings changed.', 'success')
         except Exception as e:
             flash(f'Error updating settings: {e}', 'error')
         return redirect(url_for('views.settings'))
     
     settings = {}
     try:
-        res = supabase.table('app_settings').select('*').execute()
-        settings = {item['setting_key']: item['stat_value'] if 'stat_value' in item else item['setting_value'] for item in res.data}
+        settings = app_settings.current().values
     except Exception as e:
         flash(f"Error fetching settings: {e}", "error")
     return render_template('settings.html', settings=settings)
@@ -488,6 +560,7 @@ def promote_user():
         user_id, new_role = request.form.get('user_id'), request.form.get('new_role')
         try:
             supabase.table('volunteers').update({'role': new_role}).eq('id', user_id).execute()
+            invalidate(VOLUNTEERS)
             flash('User role updated successfully.', 'success')
         except Exception as e:
             flash(f'Error updating role: {e}', 'error')
@@ -495,13 +568,11 @@ def promote_user():
     
     volunteers = []
     try:
-        res = supabase.table('volunteers').select('*').order('full_name').execute()
-        volunteers = res.data
+        volunteers = repository.list_volunteers()
     except Exception as e:
         flash(f"Error fetching volunteers: {e}", "error")
         
-    promote_options = ['volunteer', 'local', 'state', 'national', 'supa_user']
-    return render_template('promote_user.html', volunteers=volunteers, promote_options=promote_options)
+    return render_template('promote_user.html', volunteers=volunteers, promote_options=ROLES)
 
 @views_bp.route('/reports')
 @login_required
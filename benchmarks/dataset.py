@@ -0,0 +1,144 @@
+"""
+Synthetic, reproducible data for the fake Supabase: states and LGAs from
+location.json, volunteers (one supa_user), patients, appointments spread
+around today, RAG documents, videos, donations, settings and KPI counters.
+"""
+import os
+import json
+import uuid
+import random
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVICE_TYPES = ('Antenatal Care', 'Postnatal Care', 'Childbirth Delivery', 'Immunization', 'Vaccination', 'Family Planning', 'General')
+STATUSES = ('pending', 'confirmed', 'rescheduled', 'transferred', 'unreachable', 'calling', 'human_escalation', 'completed')
+LANGUAGES = ('English', 'Yoruba', 'Hausa', 'Igbo', 'Pidgin')
+FIRST_NAMES = ('Amina', 'Ngozi', 'Funke', 'Halima', 'Chioma', 'Bisi', 'Zainab', 'Ifeoma', 'Kemi', 'Aisha', 'Blessing', 'Grace')
+LAST_NAMES = ('Bello', 'Okafor', 'Adeyemi', 'Musa', 'Eze', 'Ogunleye', 'Ibrahim', 'Nwosu', 'Abubakar', 'Olawale')
+
+ADMIN_ID = '00000000-0000-0000-0000-000000000001'
+
+
+def _uuid(rng):
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+def _iso(dt):
+    return dt.isoformat()
+
+def load_locations():
+    """[(state name, [lga names])] from location.json, title-cased like seed_loc.py."""
+    with open(os.path.join(ROOT, 'location.json')) as f:
+        data = json.load(f)
+    return [(entry['state'].title(), [lga.title() for lga in entry['localGovt']]) for entry in data['locations']]
+
+def random_phone(rng):
+    return f"0{rng.choice('789')}{rng.choice('01')}{rng.randint(10000000, 99999999)}"
+
+def build_dataset(patients=2000, appointments=5000, documents=50, seed=42):
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+
+    states, lgas = [], []
+    for state_name, lga_names in load_locations():
+        state_id = _uuid(rng)
+        states.append({'id': state_id, 'name': state_name})
+        lgas.extend({'id': _uuid(rng), 'name': name, 'state_id': state_id} for name in lga_names)
+
+    volunteers = [{
+        'id': ADMIN_ID, 'full_name': 'Benchmark Admin', 'email': 'admin@example.org', 'role': 'supa_user',
+        'state_id': None, 'lga_id': None, 'spoken_languages': ['English'], 'phone_number': random_phone(rng),
+        'created_at': _iso(now), 'updated_at': _iso(now),
+    }]
+    for i in range(50):
+        lga = rng.choice(lgas)
+        volunteers.append({
+            'id': _uuid(rng), 'full_name': f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            'email': f"volunteer{i}@example.org", 'role': rng.choice(('volunteer', 'local', 'state')),
+            'state_id': lga['state_id'], 'lga_id': lga['id'],
+            'spoken_languages': rng.sample(LANGUAGES, rng.randint(1, 3)), 'phone_number': random_phone(rng),
+            'created_at': _iso(now), 'updated_at': _iso(now),
+        })
+
+    patient_rows = []
+    for _ in range(patients):
+        created = now - timedelta(days=rng.randint(0, 365), seconds=rng.randint(0, 86400))
+        patient_rows.append({
+            'id': _uuid(rng), 'full_name': f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            'phone_number': random_phone(rng), 'lga_id': rng.choice(lgas)['id'],
+            'gender': 'Female', 'age': rng.randint(16, 45),
+            'blood_group': rng.choice(('A+', 'B+', 'O+', 'O-', 'AB+')), 'genotype': rng.choice(('AA', 'AS', 'SS')),
+            'emergency_contact_name': rng.choice(FIRST_NAMES), 'emergency_contact_phone': random_phone(rng),
+            'spoken_languages': [rng.choice(LANGUAGES)], 'registered_by': ADMIN_ID,
+            'created_at': _iso(created), 'updated_at': _iso(created),
+        })
+
+    appointment_rows = []
+    tomorrow = (now + timedelta(days=1)).replace(hour=9, minute=0, second=0, microsecond=0)
+    for i in range(appointments if patient_rows else 0):
+        # Every 50th appointment is a confirmed one tomorrow, for the reminder sweep
+        due_tomorrow = i % 50 == 0
+        when = tomorrow + timedelta(minutes=rng.randint(0, 480)) if due_tomorrow else now + timedelta(days=rng.uniform(-60, 30))
+        appointment_rows.append({
+            'appointment_id': _uuid(rng), 'patient_id': rng.choice(patient_rows)['id'],
+            'appointment_datetime': _iso(when), 'service_type': rng.choice(SERVICE_TYPES),
+            'preferred_language': rng.choice(LANGUAGES), 'status': 'confirmed' if due_tomorrow else rng.choice(STATUSES),
+            'handled_by_ai': True, 'volunteer_id': None, 'volunteer_notes': None,
+            'patient_call_attempts': 0, 'last_call_timestamp': None,
+            'created_at': _iso(when - timedelta(days=7)), 'updated_at': _iso(when - timedelta(days=7)),
+        })
+
+    document_rows = [{
+        'id': _uuid(rng),
+        'content': f"Guidance note {i}: attend antenatal visits, take folic acid and report danger signs early.",
+        'metadata': {'source': f"Maternal Health Handbook p.{i + 1}"},
+    } for i in range(documents)]
+
+    donation_rows = [{'id': _uuid(rng), 'donor_name': rng.choice(FIRST_NAMES), 'amount': rng.randint(1, 500) * 10000,
+                      'message': 'Keep it up', 'status': rng.choice(('success', 'pending', 'failed')),
+                      'created_at': _iso(now - timedelta(days=i))} for i in range(100)]
+    # What the track_donation_totals trigger maintains in the real database
+    donation_totals = {}
+    for row in donation_rows:
+        if row['status'] == 'success':
+            month = row['created_at'][:7] + '-01'
+            totals = donation_totals.setdefault(month, {'month': month, 'donation_count': 0, 'amount_total': 0})
+            totals['donation_count'] += 1
+            totals['amount_total'] += row['amount']
+
+    confirmed = sum(1 for row in appointment_rows if row['status'] == 'confirmed')
+    return {
+        'states': states,
+        'lgas': lgas,
+        'volunteers': volunteers,
+        'patients': patient_rows,
+        'master_appointments': appointment_rows,
+        'documents': document_rows,
+        'public_videos': [{'id': _uuid(rng), 'title': f"Story {i}", 'description': 'A mother shares her story.',
+                           'youtube_id': f"vid{i:08d}", 'is_active': True, 'added_by': ADMIN_ID,
+                           'created_at': _iso(now)} for i in range(6)],
+        'public_donations': donation_rows,
+        'donation_totals': list(donation_totals.values()),
+        'public_stats': [
+            {'stat_key': 'patients_registered', 'stat_value': len(patient_rows)},
+            {'stat_key': 'appointments_confirmed', 'stat_value': confirmed},
+            {'stat_key': 'states_covered', 'stat_value': len(states)},
+        ],
+        'app_settings': [
+            {'setting_key': 'REFERENCE_DATA_VERSION', 'setting_value': '1'},
+            {'setting_key': 'SETTINGS_VERSION', 'setting_value': '1'},
+            {'setting_key': 'DISPLAY_TOTAL_DONATIONS', 'setting_value': 'true'},
+            {'setting_key': 'GEMINI_API_KEY', 'setting_value': ''},
+        ],
+    }
+
+def bulk_upload_csv(rows, seed=7):
+    """CSV text in the bulk upload template's format, with valid locations."""
+    rng = random.Random(seed)
+    locations = load_locations()
+    lines = ['Patient Name,Patient Phone,State,LGA,Gender,Age,Blood Group,Genotype']
+    for _ in range(rows):
+        state, lga_names = rng.choice(locations)
+        lines.append(f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)},{random_phone(rng)},{state},{rng.choice(lga_names)},"
+                     f"Female,{rng.randint(16, 45)},O+,AA")
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,451 @@
+"""
+In-memory stand-in for the Supabase REST API (PostgREST), for benchmarks.
+
+Implements the subset of PostgREST the app uses: column selection with
+many-to-one and one-to-many embeds (including !inner joins and filters on
+embedded columns), eq/neq/gt/gte/lt/lte/like/ilike/in/is filters with not.
+and nested or=/and= groups, order, limit/offset, exact counts, HEAD, single
+objects, insert/upsert/update/delete with return=representation, and the
+increment_public_stat, save_app_settings and match_documents RPCs.
+
+Every request is counted, so a benchmark can report Supabase round trips.
+"""
+import re
+import json
+import uuid
+import random
+import logging
+import threading
+from datetime import datetime, timezone
+from urllib.parse import parse_qsl
+from werkzeug.serving import make_server
+from werkzeug.wrappers import Request, Response
+
+PRIMARY_KEYS = {
+    'master_appointments': 'appointment_id',
+    'public_stats': 'stat_key',
+    'app_settings': 'setting_key',
+}
+
+# (table, embedded table) -> foreign key column on `table` (many-to-one)
+FOREIGN_KEYS = {
+    ('master_appointments', 'patients'): 'patient_id',
+    ('master_appointments', 'volunteers'): 'volunteer_id',
+    ('patients', 'lgas'): 'lga_id',
+    ('patients', 'volunteers'): 'registered_by',
+    ('lgas', 'states'): 'state_id',
+    ('volunteers', 'lgas'): 'lga_id',
+    ('volunteers', 'states'): 'state_id',
+    ('public_videos', 'volunteers'): 'added_by',
+}
+
+DEFAULTS = {
+    'master_appointments': {'status': 'pending', 'preferred_language': 'English', 'handled_by_ai': True, 'patient_call_attempts': 0},
+    'public_videos': {'is_active': True},
+}
+TIMESTAMPED = {'patients', 'master_appointments', 'volunteers', 'public_videos', 'public_donations'}
+
+
+def now_iso():
+    return datetime.now(timezone.utc).isoformat()
+
+def primary_key(table):
+    return PRIMARY_KEYS.get(table, 'id')
+
+
+class ApiError(Exception):
+    def __init__(self, status, code, message, details=None):
+        super().__init__(message)
+        self.status, self.code, self.message, self.details = status, code, message, details
+
+# ==========================================
+# PARSING
+# ==========================================
+
+def split_top_level(text, sep=','):
+    """Splits on `sep` outside parentheses and double quotes."""
+    parts, depth, quoted, current = [], 0, False, []
+    for ch in text:
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch == '(':
+            depth += 1
+        elif not quoted and ch == ')':
+            depth -= 1
+        if ch == sep and depth == 0 and not quoted:
+            parts.append(''.join(current))
+            current = []
+        else:
+            current.append(ch)
+    if current:
+        parts.append(''.join(current))
+    return [part.strip() for part in parts if part.strip()]
+
+def parse_select(text):
+    """'*, lgas!inner(name, states(name))' -> (columns, {relation: (inner, sub_select)})."""
+    columns, embeds = [], {}
+    for item in split_top_level(text or '*'):
+        match = re.match(r'^(?:(\w+):)?([\w]+)(?:!(\w+))?\((.*)\)$', item, re.S)
+        if match:
+            alias, relation, hint, inner = match.groups()
+            embeds[alias or relation] = (relation, hint == 'inner', parse_select(inner))
+        else:
+            alias, _, column = item.rpartition(':') if ':' in item and '::' not in item else ('', '', item)
+            columns.append((alias or column.split('::')[0], column.split('::')[0]))
+    return columns, embeds
+
+def _unquote(value):
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return value[1:-1]
+    return value
+
+def parse_condition(column, expression):
+    """('status', 'not.in.(a,b)') -> predicate on one value."""
+    negate = expression.startswith('not.')
+    if negate:
+        expression = expression[4:]
+    op, _, raw = expression.partition('.')
+    if op == 'in':
+        values = [_unquote(v) for v in split_top_level(raw.strip()[1:-1])]
+        test = lambda v: v is not None and _text(v) in values
+    elif op == 'is':
+        expected = {'null': None, 'true': True, 'false': False}.get(raw.lower())
+        test = lambda v: v is expected
+    elif op in ('like', 'ilike'):
+        pattern = re.escape(_unquote(raw)).replace(r'\*', '.*').replace('%', '.*').replace('_', '.')
+        regex = re.compile(f'^{pattern}$', re.I if op == 'ilike' else 0)
+        test = lambda v: v is not None and bool(regex.match(str(v)))
+    elif op in ('eq', 'neq', 'gt', 'gte', 'lt', 'lte'):
+        raw = _unquote(raw)
+        test = lambda v: v is not None and _compare(op, v, raw)
+    else:
+        raise ApiError(400, 'PGRST100', f'Unsupported operator: {op}')
+    return (lambda v: not test(v)) if negate else test
+
+def _text(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+def _compare(op, value, raw):
+    if isinstance(value, bool):
+        left, right = value, raw.lower() == 'true'
+    elif isinstance(value, (int, float)):
+        try:
+            left, right = float(value), float(raw)
+        except ValueError:
+            left, right = str(value), raw
+    else:
+        left, right = str(value), raw
+    return {
+        'eq': left == right, 'neq': left != right,
+        'gt': left > right, 'gte': left >= right,
+        'lt': left < right, 'lte': left <= right,
+    }[op]
+
+def parse_logic(kind, body):
+    """('or', '(a.gt.1,and(b.eq.2,c.lt.3))') -> predicate on a row (for or=/and= params)."""
+    tests = []
+    for part in split_top_level(body[1:-1]):
+        match = re.match(r'^(not\.)?(or|and)(\(.*\))$', part, re.S)
+        if match:
+            inner = parse_logic(match.group(2), match.group(3))
+            tests.append((lambda t: lambda row: not t(row))(inner) if match.group(1) else inner)
+        else:
+            column, _, condition = part.partition('.')
+            predicate = parse_condition(column, condition)
+            tests.append(lambda row, c=column, p=predicate: p(row.get(c)))
+    combine = any if kind == 'or' else all
+    return lambda row: combine(test(row) for test in tests)
+
+# ==========================================
+# DATABASE
+# ==========================================
+
+class FakeDatabase:
+    def __init__(self, tables=None):
+        self.tables = {name: list(rows) for name, rows in (tables or {}).items()}
+        self.lock = threading.RLock()
+        self.request_count = 0
+        self.rag_hit_rate = 0.5
+        self._indexes = {}
+
+    def reset_request_count(self):
+        with self.lock:
+            count, self.request_count = self.request_count, 0
+        return count
+
+    def rows(self, table):
+        if table not in self.tables:
+            raise ApiError(404, '42P01', f'relation "public.{table}" does not exist')
+        return self.tables[table]
+
+    def by_key(self, table, column):
+        """{value: row} index on a column, rebuilt after writes."""
+        key = (table, column)
+        index = self._indexes.get(key)
+        if index is None:
+            index = self._indexes[key] = {row.get(column): row for row in self.rows(table)}
+        return index
+
+    def grouped(self, table, column):
+        key = (table, column, 'many')
+        index = self._indexes.get(key)
+        if index is None:
+            index = {}
+            for row in self.rows(table):
+                index.setdefault(row.get(column), []).append(row)
+            self._indexes[key] = index
+        return index
+
+    def changed(self):
+        self._indexes = {}
+
+    # --- Reads ---
+    def select(self, table, params):
+        """`params` is a list of (key, value) pairs: a column may be filtered twice."""
+        options = {key: value for key, value in params if key in ('select', 'order', 'limit', 'offset')}
+        columns, embeds = parse_select(options.get('select', '*'))
+        order = options.get('order')
+        limit = options.get('limit')
+        offset = int(options.get('offset') or 0)
+        filters, nested = self._split_filters([(k, v) for k, v in params if k not in options])
+
+        rows = [row for row in self.rows(table) if all(test(row) for test in filters)]
+        shaped = []
+        for row in rows:
+            out = self._shape(table, row, columns, embeds, nested)
+            if out is not None:
+                shaped.append((row, out))
+
+        if order:
+            for term in reversed(order.split(',')):
+                parts = term.split('.')
+                column, desc = parts[0], 'desc' in parts[1:]
+                shaped.sort(key=lambda pair: _sort_key(pair[0].get(column)), reverse=desc)
+
+        total = len(shaped)
+        page = shaped[offset:offset + int(limit)] if limit is not None else shaped[offset:]
+        return [out for _, out in page], total, offset
+
+    def _split_filters(self, params):
+        """Top-level row predicates, and {relation: params} for embedded filters."""
+        filters, nested = [], {}
+        for key, value in params:
+            if key in ('or', 'and'):
+                filters.append(parse_logic(key, value))
+            elif key in ('columns', 'on_conflict'):
+                continue
+            elif '.' in key:
+                relation, _, rest = key.partition('.')
+                nested.setdefault(relation, []).append((rest, value))
+            else:
+                predicate = parse_condition(key, value)
+                filters.append(lambda row, c=key, p=predicate: p(row.get(c)))
+        return filters, nested
+
+    def _shape(self, table, row, columns, embeds, nested):
+        """Projects a row and resolves its embeds; None when an !inner embed is empty."""
+        out = {}
+        for alias, column in columns:
+            if column == '*':
+                out.update(row)
+            else:
+                out[alias] = row.get(column)
+        for alias, (relation, inner, (sub_columns, sub_embeds)) in embeds.items():
+            sub_filters, sub_nested = self._split_filters(nested.get(alias, []))
+            if (table, relation) in FOREIGN_KEYS:
+                target = self.by_key(relation, primary_key(relation)).get(row.get(FOREIGN_KEYS[(table, relation)]))
+                value = None
+                if target is not None and all(test(target) for test in sub_filters):
+                    value = self._shape(relation, target, sub_columns, sub_embeds, sub_nested)
+                if value is None and inner:
+                    return None
+                out[alias] = value
+            elif (relation, table) in FOREIGN_KEYS:
+                children = self.grouped(relation, FOREIGN_KEYS[(relation, table)]).get(row.get(primary_key(table)), [])
+                values = []
+                for child in children:
+                    if all(test(child) for test in sub_filters):
+                        shaped = self._shape(relation, child, sub_columns, sub_embeds, sub_nested)
+                        if shaped is not None:
+                            values.append(shaped)
+                if inner and not values:
+                    return None
+                out[alias] = values
+            else:
+                raise ApiError(400, 'PGRST200', f"Could not find a relationship between '{table}' and '{relation}'")
+        return out
+
+    # --- Writes ---
+    def insert(self, table, payload, upsert=False, on_conflict=None):
+        rows = payload if isinstance(payload, list) else [payload]
+        pk = on_conflict or primary_key(table)
+        stored = []
+        with self.lock:
+            existing = self.by_key(table, pk) if upsert else {}
+            for row in rows:
+                row = dict(row)
+                if upsert and row.get(pk) in existing:
+                    target = existing[row[pk]]
+                    target.update(row)
+                    stored.append(dict(target))
+                    continue
+                for column, value in DEFAULTS.get(table, {}).items():
+                    row.setdefault(column, value)
+                row.setdefault(primary_key(table), str(uuid.uuid4()))
+                if table in TIMESTAMPED:
+                    row.setdefault('created_at', now_iso())
+                    row.setdefault('updated_at', row['created_at'])
+                self.rows(table).append(row)
+                existing[row.get(pk)] = row
+                self._track_confirmed(table, None, row)
+                stored.append(dict(row))
+            self.changed()
+        return stored
+
+    def update(self, table, params, values):
+        filters, _ = self._split_filters(params)
+        updated = []
+        with self.lock:
+            for row in self.rows(table):
+                if all(test(row) for test in filters):
+                    old = dict(row)
+                    row.update({k: (now_iso() if v == 'now()' else v) for k, v in values.items()})
+                    self._track_confirmed(table, old, row)
+                    if table in TIMESTAMPED:
+                        row['updated_at'] = now_iso()   # touch_updated_at trigger
+                    updated.append(dict(row))
+            self.changed()
+        return updated
+
+    def delete(self, table, params):
+        filters, _ = self._split_filters(params)
+        with self.lock:
+            keep, removed = [], []
+            for row in self.rows(table):
+                (removed if all(test(row) for test in filters) else keep).append(row)
+            self.tables[table] = keep
+            for row in removed:
+                self._track_confirmed(table, row, None)
+            self.changed()
+        return removed
+
+    def _track_confirmed(self, table, old, new):
+        """The track_confirmed_appointments trigger."""
+        if table != 'master_appointments':
+            return
+        delta = ((new or {}).get('status') == 'confirmed') - ((old or {}).get('status') == 'confirmed')
+        if delta:
+            self.rpc('increment_public_stat', {'p_stat_key': 'appointments_confirmed', 'p_delta': delta})
+
+    # --- RPC ---
+    def rpc(self, name, args):
+        if name == 'increment_public_stat':
+            with self.lock:
+                for row in self.rows('public_stats'):
+                    if row['stat_key'] == args.get('p_stat_key'):
+                        row['stat_value'] = max(row['stat_value'] + int(args.get('p_delta', 0)), 0)
+                        return row['stat_value']
+            return None
+        if name == 'save_app_settings':
+            with self.lock:
+                settings = {row['setting_key']: row for row in self.rows('app_settings')}
+                for key, value in (args.get('p_settings') or {}).items():
+                    if key in settings:
+                        settings[key]['setting_value'] = str(value)
+                    else:
+                        self.rows('app_settings').append({'setting_key': key, 'setting_value': str(value)})
+                version = settings.get('SETTINGS_VERSION')
+                if version is None:
+                    version = {'setting_key': 'SETTINGS_VERSION', 'setting_value': '0'}
+                    self.rows('app_settings').append(version)
+                version['setting_value'] = str(int(version['setting_value']) + 1)
+                self.changed()
+                return int(version['setting_value'])
+        if name == 'match_documents':
+            if random.random() >= self.rag_hit_rate:
+                return []
+            documents = self.rows('documents')[:int(args.get('match_count', 3))]
+            return [{'id': d['id'], 'content': d['content'], 'metadata': d['metadata'], 'similarity': 0.8} for d in documents]
+        raise ApiError(404, 'PGRST202', f'Could not find the function public.{name}')
+
+
+def _sort_key(value):
+    # NULLs sort last ascending, like PostgreSQL
+    return (value is None, value if value is not None else 0) if not isinstance(value, str) else (False, value)
+
+# ==========================================
+# HTTP
+# ==========================================
+
+def make_wsgi_app(db):
+    def app(environ, start_response):
+        request = Request(environ)
+        with db.lock:
+            db.request_count += 1
+        try:
+            response = _handle(db, request)
+        except ApiError as e:
+            response = Response(json.dumps({'code': e.code, 'message': e.message, 'details': e.details, 'hint': None}),
+                                status=e.status, mimetype='application/json')
+        return response(environ, start_response)
+    return app
+
+def _handle(db, request):
+    path = request.path
+    if not path.startswith('/rest/v1/'):
+        raise ApiError(404, 'PGRST000', f'Unknown path {path}')
+    target = path[len('/rest/v1/'):]
+    params = parse_qsl(request.query_string.decode(), keep_blank_values=True)
+    prefer = request.headers.get('Prefer', '')
+    body = request.get_data()
+    payload = json.loads(body) if body else {}
+
+    if target.startswith('rpc/'):
+        args = payload if request.method == 'POST' else dict(params)
+        return _json(db.rpc(target[4:], args))
+
+    if request.method in ('GET', 'HEAD'):
+        with db.lock:
+            rows, total, offset = db.select(target, params)
+        headers = {}
+        if 'count=' in prefer:
+            headers['Content-Range'] = f"{offset}-{offset + len(rows) - 1}/{total}" if rows else f"*/{total}"
+        if 'vnd.pgrst.object' in request.headers.get('Accept', ''):
+            if len(rows) != 1:
+                raise ApiError(406, 'PGRST116', 'JSON object requested, multiple (or no) rows returned',
+                               f'The result contains {len(rows)} rows')
+            rows = rows[0]
+        if request.method == 'HEAD':
+            return Response(status=200, headers=headers)
+        return _json(rows, headers=headers)
+
+    if request.method == 'POST':
+        stored = db.insert(target, payload, upsert='merge-duplicates' in prefer, on_conflict=dict(params).get('on_conflict'))
+        return _json(stored if 'return=minimal' not in prefer else [], status=201)
+    if request.method == 'PATCH':
+        return _json(db.update(target, params, payload))
+    if request.method == 'DELETE':
+        return _json(db.delete(target, params))
+    raise ApiError(405, 'PGRST000', f'Method {request.method} not allowed')
+
+def _json(data, status=200, headers=None):
+    return Response(json.dumps(data, default=str), status=status, headers=headers or {}, mimetype='application/json')
+
+
+class FakeSupabaseServer:
+    """Serves a FakeDatabase on 127.0.0.1 in a background thread."""
+    def __init__(self, db, port=0):
+        self.db = db
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)   # no access log per query
+        self._server = make_server('127.0.0.1', port, make_wsgi_app(db), threaded=True)
+        self.url = f"http://127.0.0.1:{self._server.server_port}"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
@@ -0,0 +1,293 @@
+"""
+Endpoint benchmarks against an in-process fake Supabase.
+
+    python benchmarks/run.py --patients 5000 --appointments 20000 --concurrency 4 --requests 200
+    python benchmarks/run.py --scenarios dashboard_data,patients --compare benchmarks/results/<earlier>.json
+
+Starts the fake PostgREST server (benchmarks/fake_postgrest.py) seeded with
+synthetic data, points the app at it, stubs Gemini and Google search with
+the given latency, and drives each scenario through the Flask test client
+from --concurrency threads. Per scenario it records throughput, latency
+percentiles, Supabase round trips and the process's peak RSS, and writes
+everything as JSON to --output (default benchmarks/results/<timestamp>.json).
+
+Query counts come from the fake server and include any background job the
+app's scheduler happens to run during the scenario.
+"""
+import os
+import sys
+import io
+import json
+import time
+import random
+import argparse
+import platform
+import resource
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from fake_postgrest import FakeDatabase, FakeSupabaseServer, now_iso
+from dataset import build_dataset, bulk_upload_csv, ADMIN_ID
+import stubs
+
+SCENARIOS = ('dashboard_data', 'histogram_data', 'patients', 'appointments', 'bulk_upload',
+             'download_report', 'handle_chatbot', 'scheduler')
+CHAT_QUESTIONS = ('Hello there', 'What should I eat during pregnancy?', 'When should I get a tetanus shot?',
+                  'Is swelling of the feet normal?')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--patients', type=int, default=2000)
+    parser.add_argument('--appointments', type=int, default=5000)
+    parser.add_argument('--documents', type=int, default=50)
+    parser.add_argument('--bulk-rows', type=int, default=500, help='rows per bulk upload file')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=100, help='requests per scenario')
+    parser.add_argument('--warmup', type=int, default=3, help='untimed requests per scenario')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--gemini-latency-ms', type=float, default=300)
+    parser.add_argument('--search-latency-ms', type=float, default=200)
+    parser.add_argument('--rag-hit-rate', type=float, default=0.5)
+    parser.add_argument('--cache', choices=('null', 'sqlite'), default='null',
+                        help="'null' measures the uncached code paths; 'sqlite' the production cache")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output')
+    parser.add_argument('--compare', help='earlier result file to compare against')
+    return parser.parse_args()
+
+
+def configure_environment(args, server_url):
+    """Must run before the app is imported: the app reads its config from the environment."""
+    os.environ.update({
+        'SUPABASE_URL': server_url,
+        'SUPABASE_KEY': 'benchmark-key',
+        'FLASK_SECRET_KEY': 'benchmark-secret',
+        'GEMINI_API_KEY': 'benchmark',
+        'GOOGLE_SEARCH_API_KEY': 'benchmark',
+        'GOOGLE_SEARCH_CX': 'benchmark',
+        # The chatbot's admission control would otherwise reject most benchmark requests
+        'CHATBOT_RATE_PER_MINUTE': '1000000',
+        'CHATBOT_BURST': '1000000',
+        'CHATBOT_MAX_INFLIGHT': str(max(args.concurrency, 1)),
+        'CHATBOT_MAX_QUEUE': str(max(args.concurrency, 1)),
+        'SLOW_QUERY_MS': '1000000',
+    })
+    if args.cache == 'null':
+        os.environ['CACHE_TYPE'] = 'NullCache'
+    os.environ.pop('SUPABASE_SERVICE_ROLE_KEY', None)
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def peak_rss_mb():
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# ==========================================
+# SCENARIOS
+# ==========================================
+
+def build_scenarios(app, db, args):
+    csv_body = bulk_upload_csv(args.bulk_rows, seed=args.seed).encode()
+    from app.kpis import reconcile_stats
+    from app.reminders import ReminderDispatcher, REMINDER_WORKERS
+    from app.assignment import AssignmentIndex, ASSIGNABLE_ROLES, ESCALATION_STATUSES
+
+    # The leader's jobs, on private instances so the app's own scheduler
+    # thread doesn't share their state. A 48h lead makes the dataset's
+    # appointments due tomorrow fire on each run, whatever the time of day.
+    dispatcher = ReminderDispatcher(48 * 3600, REMINDER_WORKERS)
+    dispatcher._initial_load()
+    assigner = AssignmentIndex(ASSIGNABLE_ROLES)
+
+    # Appointments the reminders flag and escalations the assignment picks up; put back before every run
+    window = [row for row in db.tables['master_appointments'] if row['status'] == 'confirmed']
+    escalated = [row for row in db.tables['master_appointments'] if row['status'] in ESCALATION_STATUSES]
+
+    def dashboard_data(client):
+        return client.get('/dashboard-data').status_code
+
+    def histogram_data(client):
+        return client.get('/histogram-data', query_string={'status': random.choice(('all', 'confirmed', 'pending'))}).status_code
+
+    def patients(client):
+        return client.get('/patients', query_string={'page': random.randint(1, 5)}).status_code
+
+    def appointments(client):
+        return client.get('/appointments').status_code
+
+    def bulk_upload(client):
+        data = {'file': (io.BytesIO(csv_body), 'patients.csv')}
+        return client.post('/bulk-upload', data=data, content_type='multipart/form-data').status_code
+
+    def download_report(client):
+        return client.post('/download-report').status_code
+
+    def handle_chatbot(client):
+        return client.post('/chatbot', json={'message': random.choice(CHAT_QUESTIONS), 'history': []}).status_code
+
+    def scheduler(client):
+        with db.lock:
+            stamp = now_iso()
+            for row in window:
+                row['status'], row['updated_at'] = 'confirmed', stamp
+            for row in escalated:
+                row['volunteer_id'] = None
+            db.changed()
+        # reminder_sync: pull the changed rows, then fire what is due (as the dispatcher thread does)
+        with dispatcher._sync_lock:
+            dispatcher._delta_load()
+        now = time.time()
+        with dispatcher._cond:
+            due = [appointment_id for appointment_id, at in dispatcher._due.items() if at <= now]
+            for appointment_id in due:
+                del dispatcher._due[appointment_id]
+        for appointment_id in due:
+            dispatcher._fire(appointment_id)
+        ok = assigner.assign_pending(app) is not False and reconcile_stats(app) is not False
+        return 200 if ok else 500
+
+    return {name: func for name, func in locals().items() if name in SCENARIOS}
+
+
+def logged_in_client(app):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = ADMIN_ID
+        session['_fresh'] = True
+    return client
+
+def run_scenario(app, db, name, func, args):
+    concurrency = 1 if name == 'scheduler' else args.concurrency
+    local = threading.local()
+
+    def client():
+        if not hasattr(local, 'client'):
+            local.client = logged_in_client(app)
+        return local.client
+
+    def one_request(_):
+        started = time.perf_counter()
+        try:
+            status = func(client())
+        except Exception as e:
+            print(f"  {name}: {e}")
+            status = 599
+        return time.perf_counter() - started, status
+
+    for _ in range(args.warmup):
+        one_request(None)
+
+    db.reset_request_count()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one_request, range(args.requests)))
+    elapsed = time.perf_counter() - started
+    queries = db.reset_request_count()
+
+    latencies = sorted(latency * 1000 for latency, _ in results)
+    errors = sum(1 for _, status in results if status >= 400)
+    return {
+        'requests': len(results),
+        'concurrency': concurrency,
+        'errors': errors,
+        'duration_s': round(elapsed, 3),
+        'throughput_rps': round(len(results) / elapsed, 2) if elapsed else None,
+        'latency_ms': {
+            'mean': round(sum(latencies) / len(latencies), 2) if latencies else None,
+            'p50': round(percentile(latencies, 0.50), 2) if latencies else None,
+            'p95': round(percentile(latencies, 0.95), 2) if latencies else None,
+            'p99': round(percentile(latencies, 0.99), 2) if latencies else None,
+            'max': round(latencies[-1], 2) if latencies else None,
+        },
+        'queries_total': queries,
+        'queries_per_request': round(queries / len(results), 2) if results else None,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+# ==========================================
+# REPORTING
+# ==========================================
+
+def print_summary(results, baseline=None):
+    header = f"{'scenario':<16} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'q/req':>7} {'errors':>7} {'rss MB':>8}"
+    print(header)
+    print('-' * len(header))
+    for name, r in results.items():
+        lat = r['latency_ms']
+        line = f"{name:<16} {r['throughput_rps']:>9} {lat['p50']:>9} {lat['p95']:>9} {lat['p99']:>9} {r['queries_per_request']:>7} {r['errors']:>7} {r['peak_rss_mb']:>8}"
+        old = (baseline or {}).get(name)
+        if old and old['latency_ms']['p95'] and old['throughput_rps']:
+            p95_change = (lat['p95'] - old['latency_ms']['p95']) / old['latency_ms']['p95'] * 100
+            rps_change = (r['throughput_rps'] - old['throughput_rps']) / old['throughput_rps'] * 100
+            line += f"   p95 {p95_change:+.1f}%  rps {rps_change:+.1f}%"
+        print(line)
+
+
+def main():
+    args = parse_args()
+    names = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        sys.exit(f"Unknown scenarios: {', '.join(sorted(unknown))} (choose from {', '.join(SCENARIOS)})")
+
+    random.seed(args.seed)
+    print(f"Seeding fake Supabase: {args.patients} patients, {args.appointments} appointments...")
+    db = FakeDatabase(build_dataset(args.patients, args.appointments, args.documents, seed=args.seed))
+    db.rag_hit_rate = args.rag_hit_rate
+    server = FakeSupabaseServer(db).start()
+
+    configure_environment(args, server.url)
+    stubs.install(args.gemini_latency_ms / 1000, args.search_latency_ms / 1000)
+    from app import create_app
+    app = create_app()
+    scenarios = build_scenarios(app, db, args)
+
+    results = {}
+    for name in names:
+        print(f"Running {name}...")
+        results[name] = run_scenario(app, db, name, scenarios[name], args)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f).get('scenarios')
+    print()
+    print_summary(results, baseline)
+
+    output = args.output or os.path.join(BENCH_DIR, 'results', f"{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({
+            'meta': {
+                'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'git_revision': git_revision(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'args': vars(args),
+            },
+            'scenarios': results,
+        }, f, indent=2)
+    print(f"\nResults written to {output}")
+    server.stop()
+    sys.stdout.flush()
+    # The app's scheduler and flusher threads are daemons; don't wait for them
+    os._exit(0)
+
+
+if __name__ == '__main__':
+    main()
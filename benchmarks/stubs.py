@@ -0,0 +1,55 @@
+"""
+Stand-ins for Gemini and Google Custom Search with a configurable latency,
+so the chatbot can be benchmarked without network access or API quota.
+"""
+import time
+import requests
+import google.generativeai as genai
+
+_real_requests_get = requests.get
+
+
+class _Reply:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubModel:
+    """Replaces genai.GenerativeModel; intent checks answer 'No' unless the prompt is a greeting."""
+    latency = 0.0
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def generate_content(self, prompt, *args, **kwargs):
+        time.sleep(self.latency)
+        if 'a greeting? Yes/No' in prompt:
+            return _Reply('Yes' if prompt.lower().startswith("is 'hello") else 'No')
+        return _Reply('Attend all antenatal visits and see a health worker if you notice danger signs.')
+
+
+class _SearchResponse:
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {'items': [{'title': f'Result {i}', 'snippet': 'Antenatal care saves lives.'} for i in range(3)]}
+
+
+def install(gemini_latency=0.0, search_latency=0.0):
+    """Patches genai and requests.get (Google search URLs only) for this process."""
+    StubModel.latency = gemini_latency
+
+    def embed_content(*args, **kwargs):
+        time.sleep(gemini_latency)
+        return {'embedding': [0.01] * 768}
+
+    def requests_get(url, *args, **kwargs):
+        if 'googleapis.com/customsearch' in url:
+            time.sleep(search_latency)
+            return _SearchResponse()
+        return _real_requests_get(url, *args, **kwargs)
+
+    genai.GenerativeModel = StubModel
+    genai.embed_content = embed_content
+    requests.get = requests_get
@@ -0,0 +1,21 @@
+import os
+
+# ==========================================
+# GUNICORN SETTINGS (read by `gunicorn run:app` from the project root)
+# ==========================================
+# Threaded workers: an open live volunteer queue (/api/volunteer-queue/stream)
+# holds one thread for up to QUEUE_STREAM_SECONDS. A sync worker would be
+# pinned by it and killed by the request timeout; a gthread worker keeps
+# serving on its other threads, and its timeout only watches the main loop.
+
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 16))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+
+
+def post_fork(server, worker):
+    """Caps the worker's queue streams below its thread count (half by default); 0 turns them off."""
+    cfg = worker.cfg
+    slots = cfg.threads - 1 if cfg.worker_class_str in ('sync', 'gthread') else 0
+    wanted = int(os.environ.get('QUEUE_MAX_STREAMS', cfg.threads // 2))
+    os.environ['QUEUE_MAX_STREAMS'] = str(max(min(wanted, slots), 0))
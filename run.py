@@ -2,13 +2,18 @@ import os
 from app import create_app
 
 # Create the application instance
-# This 'app' variable is what Gunicorn looks for by default
+# This 'app' variable is what Gunicorn looks for by default.
+# Run `gunicorn run:app` from this directory so gunicorn.conf.py is picked up:
+# it selects threaded (gthread) workers, GUNICORN_THREADS threads each, and caps
+# the live volunteer queue streams below that (QUEUE_MAX_STREAMS, half by
+# default). Don't combine it with --preload; the cap is set per forked worker.
 app = create_app()
 
 if __name__ == '__main__':
     """
     This block only runs if you execute 'python run.py' directly.
     In production, this should NOT be used. Use Gunicorn instead.
+    The live volunteer queue is off here unless QUEUE_MAX_STREAMS is set.
     """
     # Fetch configuration from Environment Variables (safer than hardcoding)
     port = int(os.environ.get("PORT", 5000))
@@ -19,6 +24,6 @@ if __name__ == '__main__':
     if not debug_mode:
         print("WARNING: You are running Flask with the built-in server in production mode.")
         print("For production, please use a WSGI server like Gunicorn.")
-        print("Command: gunicorn run:app")
+        print("Command: gunicorn run:app  (settings in gunicorn.conf.py)")
     
     app.run(host='0.0.0.0', port=port, debug=debug_mode)
\ No newline at end of file
@@ -75,6 +75,28 @@ CREATE TABLE master_appointments (
 CREATE INDEX idx_appt_date ON master_appointments(appointment_datetime);
 CREATE INDEX idx_appt_status ON master_appointments(status);
 
+-- Delta export and the reminder dispatcher page through (updated_at, id)
+CREATE INDEX idx_patients_updated ON patients(updated_at, id);
+CREATE INDEX idx_appt_updated ON master_appointments(updated_at, appointment_id);
+
+-- Stamps updated_at with the database clock on every update, so no write path (and no app host's clock) can hide a change from delta readers
+CREATE OR REPLACE FUNCTION touch_updated_at()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  NEW.updated_at = now();
+  RETURN NEW;
+END;
+$$;
+
+CREATE TRIGGER patients_touch_updated_at BEFORE UPDATE ON patients
+FOR EACH ROW EXECUTE FUNCTION touch_updated_at();
+CREATE TRIGGER appointments_touch_updated_at BEFORE UPDATE ON master_appointments
+FOR EACH ROW EXECUTE FUNCTION touch_updated_at();
+CREATE TRIGGER volunteers_touch_updated_at BEFORE UPDATE ON volunteers
+FOR EACH ROW EXECUTE FUNCTION touch_updated_at();
+
 -- ==========================================
 -- 6. AI KNOWLEDGE BASE (Chatbot RAG)
 -- ==========================================
@@ -135,16 +157,114 @@ CREATE TABLE public_donations (
     created_at TIMESTAMPTZ DEFAULT now()
 );
 
+CREATE INDEX idx_donations_created ON public_donations(created_at DESC, id DESC);
+CREATE INDEX idx_donations_status_created ON public_donations(status, created_at DESC, id DESC);
+
+-- Successful donations per month, kept current by the trigger below (Used by the donor wall and admin donations)
+CREATE TABLE donation_totals (
+    month DATE PRIMARY KEY, -- first day of the month (UTC)
+    donation_count BIGINT NOT NULL DEFAULT 0,
+    amount_total NUMERIC NOT NULL DEFAULT 0
+);
+
+CREATE OR REPLACE FUNCTION track_donation_totals()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  -- Take back the old row's contribution and add the new one's; only successful donations count
+  IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.status = 'success' THEN
+    UPDATE donation_totals
+    SET donation_count = donation_count - 1, amount_total = amount_total - OLD.amount
+    WHERE month = date_trunc('month', OLD.created_at AT TIME ZONE 'UTC')::date;
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.status = 'success' THEN
+    INSERT INTO donation_totals (month, donation_count, amount_total)
+    VALUES (date_trunc('month', NEW.created_at AT TIME ZONE 'UTC')::date, 1, NEW.amount)
+    ON CONFLICT (month) DO UPDATE
+    SET donation_count = donation_totals.donation_count + 1,
+        amount_total = donation_totals.amount_total + EXCLUDED.amount_total;
+  END IF;
+  RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER public_donations_totals AFTER INSERT OR UPDATE OR DELETE ON public_donations
+FOR EACH ROW EXECUTE FUNCTION track_donation_totals();
+
+-- Backfill from the donations that predate the trigger; safe to re-run (recomputes every month)
+INSERT INTO donation_totals (month, donation_count, amount_total)
+SELECT date_trunc('month', created_at AT TIME ZONE 'UTC')::date, count(*), sum(amount)
+FROM public_donations
+WHERE status = 'success'
+GROUP BY 1
+ON CONFLICT (month) DO UPDATE
+SET donation_count = EXCLUDED.donation_count,
+    amount_total = EXCLUDED.amount_total;
+
 CREATE TABLE public_stats ( 
     stat_key TEXT PRIMARY KEY, 
     stat_value BIGINT NOT NULL 
 );
 
+-- Atomic delta for a KPI counter (Used by app/kpis.py on every write that moves a KPI)
+CREATE OR REPLACE FUNCTION increment_public_stat (
+  p_stat_key TEXT,
+  p_delta BIGINT
+)
+RETURNS BIGINT
+LANGUAGE sql
+AS $$
+  UPDATE public_stats
+  SET stat_value = GREATEST(stat_value + p_delta, 0)
+  WHERE stat_key = p_stat_key
+  RETURNING stat_value;
+$$;
+
+-- Keeps appointments_confirmed in step with master_appointments.status, whoever
+-- writes the row (the app, the reminder caller's outcomes, the dashboard)
+CREATE OR REPLACE FUNCTION track_confirmed_appointments()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  delta BIGINT := 0;
+BEGIN
+  IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.status = 'confirmed' THEN
+    delta := delta - 1;
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.status = 'confirmed' THEN
+    delta := delta + 1;
+  END IF;
+  IF delta <> 0 THEN
+    PERFORM increment_public_stat('appointments_confirmed', delta);
+  END IF;
+  RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER master_appointments_confirmed_count AFTER INSERT OR UPDATE OF status OR DELETE ON master_appointments
+FOR EACH ROW EXECUTE FUNCTION track_confirmed_appointments();
+
 CREATE TABLE app_settings ( 
     setting_key TEXT PRIMARY KEY, 
     setting_value TEXT NOT NULL 
 );
 
+-- Saves a batch of settings ({key: value}) and bumps SETTINGS_VERSION in one
+-- statement, so app workers see either none or all of the change.
+CREATE OR REPLACE FUNCTION save_app_settings (p_settings JSONB)
+RETURNS BIGINT LANGUAGE sql AS $$
+  WITH saved AS (
+    INSERT INTO app_settings (setting_key, setting_value)
+    SELECT key, value FROM jsonb_each_text(p_settings) WHERE key <> 'SETTINGS_VERSION'
+    ON CONFLICT (setting_key) DO UPDATE SET setting_value = EXCLUDED.setting_value
+  )
+  INSERT INTO app_settings (setting_key, setting_value) VALUES ('SETTINGS_VERSION', '1')
+  ON CONFLICT (setting_key) DO UPDATE SET setting_value = (app_settings.setting_value::BIGINT + 1)::TEXT
+  RETURNING setting_value::BIGINT;
+$$;
+
 -- ==========================================
 -- 8. ROW LEVEL SECURITY (RLS) POLICIES
 -- ==========================================
@@ -208,7 +328,9 @@ FOR INSERT WITH CHECK (
 -- ==========================================
 INSERT INTO app_settings (setting_key, setting_value) VALUES 
 ('GEMINI_API_KEY', ''),
-('DISPLAY_TOTAL_DONATIONS', 'true');
+('DISPLAY_TOTAL_DONATIONS', 'true'),
+('REFERENCE_DATA_VERSION', '0'), -- Bumped by seed_loc.py so app workers reload states/LGAs
+('SETTINGS_VERSION', '0'); -- Bumped by save_app_settings so app workers reload settings
 
 INSERT INTO public_stats (stat_key, stat_value) VALUES 
 ('appointments_confirmed', 0),
@@ -1,56 +1,276 @@
-import csv
+"""
+Offline validator for bulk patient upload files (CSV or XLSX).
+
+    python scripts/validate_bulk.py district.csv --output report.json
+    python scripts/validate_bulk.py district.xlsx --workers 8 --summary
+
+Streams the file in chunks and validates them on a process pool, so files
+of millions of rows run in seconds with flat memory use. Checks every rule
+the server applies in bulk_upload and the CHECK constraints in schema.sql:
+required columns, phone format, state/LGA against location.json, gender,
+age (whole number > 0), blood group and genotype.
+
+Writes a JSON report (stdout, or --output) with per-rule counts and the
+first --max-errors errors. Exit status: 0 clean, 1 invalid rows, 2 the file
+could not be validated (unreadable, missing columns).
+"""
+import io
+import os
+import re
 import sys
+import csv
+import json
+import time
+import argparse
+from collections import deque, Counter
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Mirrors app/views.py bulk_upload and the CHECK constraints in schema.sql
+REQUIRED_COLUMNS = ('Patient Name', 'Patient Phone', 'State', 'LGA')
+GENDERS = frozenset(('Male', 'Female'))
+BLOOD_GROUPS = frozenset(('A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-'))
+GENOTYPES = frozenset(('AA', 'AS', 'SS', 'AC', 'SC'))
+PHONE_RE = re.compile(r'^0[7-9][0-1]\d{8}$')
+
+_locations = None   # per worker process: (states, 'state|lga' keys), lower-cased
+
+
+def load_locations(path):
+    """State names and 'state|lga' keys from location.json, lower-cased like the server's lookup."""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    states, lgas = set(), set()
+    for entry in data['locations']:
+        state = entry['state'].strip().lower()
+        states.add(state)
+        lgas.update(f"{state}|{lga.strip().lower()}" for lga in entry['localGovt'])
+    return frozenset(states), frozenset(lgas)
+
+def _init_worker(locations):
+    global _locations
+    _locations = locations
+
+# ==========================================
+# RULES
+# ==========================================
+
+def normalize_phone(value):
+    """Same normalisation as the server: 10 digits without the leading 0 get it back."""
+    phone = value.strip()
+    if phone.endswith('.0'):   # numeric spreadsheet cells
+        phone = phone[:-2]
+    if len(phone) == 10 and not phone.startswith('0'):
+        phone = '0' + phone
+    return phone
+
+def _is_positive_int(value):
+    try:
+        number = float(value)
+    except ValueError:
+        return False
+    return number.is_integer() and number > 0
+
+def validate_chunk(job):
+    """
+    Validates (first line number, header, rows); returns (row count, invalid rows, errors).
+    CSV chunks arrive as raw text and are parsed here, off the reading process.
+    """
+    first_line, header, rows = job
+    if isinstance(rows, str):
+        rows = csv.reader(io.StringIO(rows))
+    states, lgas = _locations
+    index = {name: i for i, name in enumerate(header)}
+    width = len(header)
+    name_i, phone_i, state_i, lga_i = (index[name] for name in REQUIRED_COLUMNS)
+    # Optional columns: (column, index, allowed values or None for age, rule)
+    optional = [(name, index[name], allowed, rule) for name, allowed, rule in (
+        ('Gender', GENDERS, 'invalid_gender'),
+        ('Age', None, 'invalid_age'),
+        ('Blood Group', BLOOD_GROUPS, 'invalid_blood_group'),
+        ('Genotype', GENOTYPES, 'invalid_genotype'),
+    ) if name in index]
+    errors = []
+    invalid_rows = 0
+    row_count = 0
 
-REQUIRED = ['Patient Name','Patient Phone','State','LGA']
+    for offset, row in enumerate(rows):
+        if not any(row):
+            continue   # blank lines are skipped by the upload too
+        if len(row) < width:
+            row = row + [''] * (width - len(row))
+        line = first_line + offset
+        row_count += 1
+        row_errors = []
 
-csv_path = '..\\bulk.csv' if __name__ == '__main__' else 'bulk.csv'
-# Adjust path to run from project root when executed via terminal
-csv_path = 'bulk.csv'
+        name, phone, state, lga = row[name_i].strip(), row[phone_i].strip(), row[state_i].strip(), row[lga_i].strip()
+        if not (name and phone and state and lga):
+            row_errors.extend((line, column, 'missing_value', '')
+                              for column, value in zip(REQUIRED_COLUMNS, (name, phone, state, lga)) if not value)
+        else:
+            if not PHONE_RE.match(normalize_phone(phone)):
+                row_errors.append((line, 'Patient Phone', 'invalid_phone', phone))
+            state_key = state.lower()
+            if state_key not in states:
+                row_errors.append((line, 'State', 'unknown_state', state))
+            elif f"{state_key}|{lga.lower()}" not in lgas:
+                row_errors.append((line, 'LGA', 'unknown_lga', lga))
 
-missing_column_rows = []
-invalid_phone_rows = []
-rows = []
+        for column, i, allowed, rule in optional:
+            value = row[i].strip()
+            if value and not (value in allowed if allowed is not None else _is_positive_int(value)):
+                row_errors.append((line, column, rule, value))
 
-with open(csv_path, newline='', encoding='utf-8') as f:
-    reader = csv.DictReader(f)
-    headers = reader.fieldnames or []
-    for col in REQUIRED:
-        if col not in headers:
-            print(f"ERROR: Missing required column: {col}")
-            sys.exit(2)
+        if row_errors:
+            invalid_rows += 1
+            errors.extend(row_errors)
+    return row_count, invalid_rows, errors
 
-    for i, row in enumerate(reader, start=2):
-        rows.append((i, row))
+# ==========================================
+# READERS (yield header, then (chunk, record count) pairs)
+# ==========================================
 
-for lineno, row in rows:
-    missing = [c for c in REQUIRED if not row.get(c) or str(row.get(c)).strip()=='']
+def _cell_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def iter_csv(path, chunk_size):
+    """
+    Chunks of raw CSV text. Only quote parity is tracked here, so a chunk
+    never ends inside a quoted field; the workers do the actual parsing.
+    """
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        yield next(csv.reader(f), [])
+        lines, records, in_quotes = [], 0, False
+        for line in f:
+            lines.append(line)
+            if line.count('"') % 2:
+                in_quotes = not in_quotes
+            if not in_quotes:
+                records += 1
+                if records >= chunk_size:
+                    yield ''.join(lines), records
+                    lines, records = [], 0
+        if lines:
+            yield ''.join(lines), records
+
+def iter_xlsx(path, chunk_size):
+    from openpyxl import load_workbook
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        yield [_cell_text(value).strip() for value in next(rows, ())]
+        chunk = []
+        for values in rows:
+            chunk.append([_cell_text(value) for value in values])
+            if len(chunk) >= chunk_size:
+                yield chunk, len(chunk)
+                chunk = []
+        if chunk:
+            yield chunk, len(chunk)
+    finally:
+        workbook.close()
+
+def iter_jobs(path, chunk_size):
+    reader = iter_xlsx if path.lower().endswith(('.xlsx', '.xlsm')) else iter_csv
+    chunks = reader(path, chunk_size)
+    header = [name.strip() for name in next(chunks)]
+    missing = [name for name in REQUIRED_COLUMNS if name not in header]
     if missing:
-        missing_column_rows.append((lineno, missing))
-        continue
-
-    phone = str(row['Patient Phone']).strip()
-    phone_digits = ''.join(ch for ch in phone if ch.isdigit())
-    if len(phone_digits) == 10 and not phone_digits.startswith('0'):
-        phone_digits = '0' + phone_digits
-    # now expect 11 digits starting with 0
-    if not (len(phone_digits) == 11 and phone_digits.startswith('0')):
-        invalid_phone_rows.append((lineno, row['Patient Phone']))
-
-print('Bulk CSV Validation Report')
-print('--------------------------')
-print(f'Total rows processed: {len(rows)}')
-print(f'Rows with missing required columns: {len(missing_column_rows)}')
-if missing_column_rows:
-    for ln, miss in missing_column_rows:
-        print(f'  Line {ln}: missing {miss}')
-print(f'Rows with invalid phone: {len(invalid_phone_rows)}')
-if invalid_phone_rows:
-    for ln, ph in invalid_phone_rows:
-        print(f'  Line {ln}: phone value "{ph}"')
-
-if not missing_column_rows and not invalid_phone_rows:
-    print('\nSanity check passed: CSV looks good for upload.')
-    sys.exit(0)
-else:
-    print('\nSanity check found issues. Fix the rows above before uploading.')
-    sys.exit(1)
+        raise ValueError(f"Missing required column(s): {', '.join(missing)}")
+    yield header
+    line = 2   # line 1 is the header
+    for chunk, records in chunks:
+        yield (line, header, chunk)
+        line += records
+
+# ==========================================
+# DRIVER
+# ==========================================
+
+def validate_file(path, locations, workers, chunk_size, max_errors):
+    started = time.time()
+    jobs = iter_jobs(path, chunk_size)
+    next(jobs)   # header check
+    totals = {'rows': 0, 'invalid_rows': 0}
+    by_rule = Counter()
+    errors = []
+
+    def collect(result):
+        rows, invalid_rows, chunk_errors = result
+        totals['rows'] += rows
+        totals['invalid_rows'] += invalid_rows
+        by_rule.update(rule for _, _, rule, _ in chunk_errors)
+        for line, column, rule, value in chunk_errors[:max(0, max_errors - len(errors))]:
+            errors.append({'line': line, 'column': column, 'rule': rule, 'value': value})
+
+    if workers <= 1:
+        _init_worker(locations)
+        for job in jobs:
+            collect(validate_chunk(job))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(locations,)) as pool:
+            # Bounded read-ahead: memory stays flat however large the file is
+            pending = deque()
+            for job in jobs:
+                pending.append(pool.submit(validate_chunk, job))
+                if len(pending) >= workers * 2:
+                    collect(pending.popleft().result())
+            while pending:
+                collect(pending.popleft().result())
+
+    return {
+        'file': os.path.abspath(path),
+        'rows': totals['rows'],
+        'valid_rows': totals['rows'] - totals['invalid_rows'],
+        'invalid_rows': totals['invalid_rows'],
+        'errors_by_rule': dict(by_rule.most_common()),
+        'errors': errors,
+        'errors_truncated': sum(by_rule.values()) > len(errors),
+        'elapsed_seconds': round(time.time() - started, 3),
+    }
+
+def print_summary(report, stream=sys.stderr):
+    print('Bulk Upload Validation Report', file=stream)
+    print('-----------------------------', file=stream)
+    print(f"Rows: {report['rows']}  valid: {report['valid_rows']}  invalid: {report['invalid_rows']}  ({report['elapsed_seconds']}s)", file=stream)
+    for rule, count in report['errors_by_rule'].items():
+        print(f"  {rule}: {count}", file=stream)
+    for error in report['errors'][:20]:
+        print(f"  Line {error['line']}: {error['column']} {error['rule']} ({error['value']!r})", file=stream)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Validate a bulk patient upload file before uploading it.')
+    parser.add_argument('path', nargs='?', default='bulk.csv', help='CSV or XLSX file (default: bulk.csv)')
+    parser.add_argument('--locations', default=os.path.join(ROOT, 'location.json'), help='states/LGAs file')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk-size', type=int, default=20000, help='rows per work unit')
+    parser.add_argument('--max-errors', type=int, default=1000, help='errors listed in the report (all are counted)')
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    parser.add_argument('--summary', action='store_true', help='also print a human-readable summary to stderr')
+    args = parser.parse_args(argv)
+
+    try:
+        report = validate_file(args.path, load_locations(args.locations), args.workers, args.chunk_size, args.max_errors)
+    except Exception as e:
+        json.dump({'file': os.path.abspath(args.path), 'fatal_error': str(e)}, sys.stdout)
+        print()
+        return 2
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    if args.summary:
+        print_summary(report)
+    return 0 if report['invalid_rows'] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,5 +1,6 @@
 import os
 import json
+import time
 from supabase import create_client, Client
 from dotenv import load_dotenv
 
@@ -39,5 +40,10 @@ def seed_locations():
         except Exception as e:
             print(f"Could not process {state_name}: {e}")
 
+    # Bump the reference data version so running app workers reload states/LGAs
+    version = str(int(time.time()))
+    supabase.table('app_settings').upsert({'setting_key': 'REFERENCE_DATA_VERSION', 'setting_value': version}).execute()
+    print(f"Reference data version set to {version}.")
+
 if __name__ == '__main__':
     seed_locations()
\ No newline at end of file